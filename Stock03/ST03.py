@@ -1,57 +1,138 @@
+import time
+STARTED = time.perf_counter()  # 啟動計時的起點（在匯入其他模組之前）
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import yfinance as yf
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import importlib.util
 import os
-import json
+import sqlite3
 import webbrowser
 from datetime import datetime
-import threading
-from functools import lru_cache
-
-CONFIG_FILE = "portfolio_config.json"
-REFRESH_INTERVAL = 50000  # 50秒刷新一次
+import argparse
+
+from alerts import ALERT_KINDS, AlertEngine, AlertRule, append_alert_log
+from coordination import SharedFeed
+from quote_engine import RefreshWorker, fetch_bars, has_bars, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from quote_feeds import DaemonFeed, PollingFeed, ReplayFeed, TickBuffer, TickRecorder, YahooStreamFeed
+from quote_journal import JournalFeed, QuoteJournal, is_journal
+from quote_service import (DAEMON_ADDRESS, QUOTE_BATCH_SIZE, QUOTE_CACHE_SIZE, QUOTE_CSV, QUOTE_SERVER_URL,
+                           HEDGE_REQUESTS, create_engine, create_router, parse_address)
+from refresh_bus import RefreshBus
+from refresh_scheduler import RefreshScheduler
+from telemetry import PROFILE_FILE, Profiler, StartupTimer, Telemetry, format_stats
+from symbol_index import (BUNDLED_FILE as SYMBOL_BUNDLED_FILE, CACHE_FILE as SYMBOL_CACHE_FILE,
+                          SymbolIndex, append_cache, cache_is_stale, parse_symbols, refresh_cache)
+from view_model import INDICATOR_COLUMNS, RowModel, TreeRows, VirtualRows, format_indicators, format_totals
+from workspace_store import LEGACY_CONFIG_FILE, WorkspaceStore
+
+ALERT_RULES_FILE = "alert_rules.json"  # 警示規則
+ALERT_LOG_FILE = "alerts.log"  # 警示觸發紀錄
+REFRESH_TICK = 1000  # 每秒檢查一次排程，實際頻率依各交易所盤別決定
+UI_POLL_INTERVAL = 16  # 約60fps從結果佇列取出背景抓取結果
+PREFETCH_HIDDEN_TABS = False  # 刷新時是否以低優先順序預先抓取隱藏分頁
+STATE_LABELS = {"REGULAR": "盤中", "PRE": "盤前", "POST": "盤後", "CLOSED": "休市"}
+FEED_MODE = "poll"  # 報價來源：poll（yfinance 輪詢）/ stream（Yahoo 串流）/ daemon（共用常駐程式）/ replay（離線重播檔案）
+STREAM_MAX_FPS = 10  # 推播 tick 合併後每秒最多重繪幾次
+SNAPSHOT_MIN_INTERVAL = 30  # 快取報價最短寫入間隔（秒），避免串流模式頻繁寫檔
+BAR_REFRESH_INTERVAL = 300  # 顯示指標欄位時，每幾秒重新抓取當日分K
+BAR_INTERVAL = "5m"  # 當日分K的週期
+INDICATOR_MIN_INTERVAL = 1.0  # 指標最短重算間隔（秒）
+VIRTUAL_LIST_THRESHOLD = 300  # 超過此檔數的分頁以虛擬清單顯示，只建立可視範圍的列
+VIRTUAL_OVERSCAN = 5  # 虛擬清單在可視範圍外多建立的列數
+SCREENER_UNIVERSES = {"台股上市": ".TW", "台股上櫃": ".TWO", "美股": ""}  # 篩選分頁可選的市場（依代碼後綴）
+STATS_INTERVAL = 1000  # 效能統計面板的更新間隔（毫秒）
+FIRST_PAINT_TARGET = 0.5  # 啟動到第一次繪製的目標秒數，超過時印出警告（--startup-report 以此為結束碼）
+STARTUP_REPORT_TIMEOUT = 30  # --startup-report 最多等待第一批報價幾秒
+POSITIONS_MIN_INTERVAL = 1.0  # 持股合計最短重算間隔（秒）
+WORKSPACE_SYNC_INTERVAL = 2000  # 每隔多久檢查其他視窗是否改過工作區（毫秒）
+REPLAY_STATUS_INTERVAL = 500  # 重播時狀態列顯示日誌時間的更新間隔（毫秒）
+REPLAY_SPEEDS = {"1×": 1.0, "10×": 10.0, "最快": 0.0}
+
+
+def load_data_stack():
+    """在背景執行緒匯入 NumPy 與 yfinance（連帶 pandas），回傳 K 線存放、走勢圖快取與持股的類別"""
+    import yfinance  # noqa: F401  先匯入，第一次抓取就不必等待
+    from bar_store import BarStore
+    from positions import PositionBook
+    from sparkline import SparklineCache
+    return BarStore, SparklineCache, PositionBook
 
 class PortfolioTab(ttk.Frame):
-    def __init__(self, master, filename, pane_side, main_app):  # 正确定义4个参数
+    def __init__(self, master, filename, pane_side, main_app, stocks=(),
+                 sort_column="change_percent", sort_reverse=True):
         super().__init__(master)
-        # 新增缓存相关属性
-        self.cache_valid = False
-        self.cached_items = []
-        
         self.main_app = main_app  # 新增主應用程式引用
-        self.filename = filename
+        self.filename = filename  # 分頁在工作區中的代號（沿用舊版的檔名）
         self.pane_side = pane_side
         self.stocks = []
+        self.model = RowModel()  # 每檔的數值與顯示字串，只在主執行緒更新
+        self.materialized = False  # 第一次被選取前只是空的佔位框架
+        self.virtual = False  # 建立元件時依檔數決定是否使用虛擬清單
+        self.totals_text = ""  # 持股合計，建立元件前先記著
         
-        self.create_widgets()
-        self.create_context_menu()
-        self.load_stocks()
-
-        # 预设排序设置
-        self.sort_column = "change_percent"
-        self.sort_reverse = True
-        self.refresh_data()  # 首次加载时应用排序
+        self.load_stocks(stocks)
+        if main_app.positions:
+            main_app.positions.set_tab(filename, pane_side)
 
+        # 排序設定隨工作區保存（數據由主程式的報價引擎統一抓取後套用）
+        self.sort_column = sort_column
+        self.sort_reverse = sort_reverse
 
-   
+    def materialize(self):
+        """第一次被選取時才建立 Treeview 等元件"""
+        if self.materialized:
+            return
+        self.materialized = True
+        self.virtual = len(self.stocks) >= VIRTUAL_LIST_THRESHOLD
+        self.create_widgets()
+        self.create_context_menu()
+        self.show_totals(self.totals_text)
+        self.render()
 
     def create_widgets(self):
-        columns = ("symbol", "price", "change_percent")
+        columns = ("symbol", "price", "change_percent") + INDICATOR_COLUMNS
         self.tree = ttk.Treeview(
             self, columns=columns, show="headings",
             selectmode="browse", style="Custom.Treeview"
         )
         
-        col_widths = [67, 58, 70]  # 調整後寬度
-        headers = ["股票代碼", "新價格", "漲跌幅"]  # 簡化後標題
+        col_widths = [67, 58, 70, 60, 100, 62, 62, 40]  # 調整後寬度
+        headers = ["股票代碼", "新價格", "漲跌幅", "VWAP", "日區間", "5日%", "20日%", "RSI"]  # 簡化後標題
         
         for col, width, header in zip(columns, col_widths, headers):
             self.tree.heading(col, text=header, 
                             command=lambda c=col: self.treeview_sort_column(c))
             self.tree.column(col, width=width, anchor=tk.CENTER)
+        self.update_sort_headings()
+        # Treeview 只有 #0 欄能放圖片，走勢圖只能在最左邊
+        self.tree.heading("#0", text="走勢")
+        self.summary = ttk.Label(self, anchor=tk.W, font=('微軟正黑體', 9))  # 持股合計，有持股才顯示
 
-        vsb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=vsb.set)
+        # 顏色標籤只在建立元件時設定一次
+        self.tree.tag_configure('neutral', foreground='white')
+        self.tree.tag_configure('rise', foreground='#33FF77')  #green
+        self.tree.tag_configure('fall', foreground='#FF1919')  #red
+        self.tree.tag_configure('stale', font=('微軟正黑體', 13, 'italic'))  # 快照舊數據以斜體顯示
+        self.show_indicator_columns(self.main_app.show_indicators.get())
+        self.show_sparkline_column(self.main_app.show_sparklines.get())
+
+        if self.virtual:
+            # 捲軸改由虛擬清單控制，Treeview 只放可視範圍的列
+            vsb = ttk.Scrollbar(self, orient="vertical", command=self.on_virtual_scroll)
+            self.tree_rows = VirtualRows(self.tree, vsb, overscan=VIRTUAL_OVERSCAN)
+            self.row_height = int(ttk.Style().lookup("Custom.Treeview", "rowheight") or 24)
+            self.tree.bind("<Configure>", self.on_virtual_resize)
+            self.tree.bind("<MouseWheel>", lambda e: self.virtual_scroll(-3 if e.delta > 0 else 3))
+            self.tree.bind("<Button-4>", lambda e: self.virtual_scroll(-3))
+            self.tree.bind("<Button-5>", lambda e: self.virtual_scroll(3))
+            self.tree.bind("<Prior>", lambda e: self.virtual_scroll(-self.tree_rows.visible))
+            self.tree.bind("<Next>", lambda e: self.virtual_scroll(self.tree_rows.visible))
+            self.tree.bind("<Up>", lambda e: self.virtual_step(-1))
+            self.tree.bind("<Down>", lambda e: self.virtual_step(1))
+            self.tree.bind("<<TreeviewSelect>>", self.on_virtual_select)
+        else:
+            vsb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+            self.tree.configure(yscrollcommand=vsb.set)
+            self.tree_rows = TreeRows(self.tree)  # 股票代碼即列的 iid
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
         vsb.pack(side=tk.RIGHT, fill=tk.Y)
@@ -69,16 +150,71 @@ class PortfolioTab(ttk.Frame):
             command=self.move_to_other_pane
         )
         self.context_menu.add_command(label="複製股票代碼", command=self.copy_symbol)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="新增警示...", command=self.add_alert)
+        self.context_menu.add_command(label="清除此股警示", command=self.clear_alerts)
+        self.context_menu.add_command(label="設定持股...", command=self.edit_position)
+        self.context_menu.add_separator()
+        self.context_menu.add_checkbutton(label="顯示指標欄位", variable=self.main_app.show_indicators,
+                                          command=self.main_app.toggle_indicators)
+        self.context_menu.add_checkbutton(label="顯示走勢圖", variable=self.main_app.show_sparklines,
+                                          command=self.main_app.toggle_sparklines)
         self.tree.bind("<Button-3>", self.show_context_menu)
 
+    def show_totals(self, text):
+        """持股合計的摘要列；沒有持股時隱藏"""
+        self.totals_text = text
+        if not self.materialized:
+            return
+        if text:
+            self.summary.config(text=text)
+            if not self.summary.winfo_manager():
+                self.summary.pack(side=tk.BOTTOM, fill=tk.X, before=self.tree)
+        else:
+            self.summary.pack_forget()
+
+    def show_indicator_columns(self, show):
+        """指標欄位一直存在，只切換是否顯示"""
+        self.tree["displaycolumns"] = self.tree["columns"] if show else ("symbol", "price", "change_percent")
+
+    def show_sparkline_column(self, show):
+        sparklines = self.main_app.sparklines
+        show = show and sparklines is not None  # 走勢圖模組在背景載入完成前不顯示
+        if show:
+            self.tree.column("#0", width=sparklines.width + 12, stretch=False)
+        self.tree["show"] = ("tree", "headings") if show else "headings"
+
+    def on_virtual_scroll(self, action, value, unit=None):
+        """捲軸的 moveto/scroll 指令"""
+        if action == "moveto":
+            self.tree_rows.scroll_to(float(value))
+        else:
+            self.tree_rows.scroll(int(value) * (self.tree_rows.visible if unit == "pages" else 1))
+        self.main_app.mark_dirty(self)
+
+    def virtual_scroll(self, rows):
+        self.tree_rows.scroll(rows)
+        self.main_app.mark_dirty(self)
+        return "break"
+
+    def virtual_step(self, step):
+        self.tree_rows.step_selection(step)
+        self.main_app.mark_dirty(self)
+        return "break"
+
+    def on_virtual_select(self, event):
+        if selected := self.tree.selection():
+            self.tree_rows.selected = selected[0]
+
+    def on_virtual_resize(self, event):
+        if self.tree_rows.resize(event.height, self.row_height):
+            self.main_app.mark_dirty(self)
+
     def move_to_other_pane(self):
-        selected = self.tree.selection()
-        if not selected:
+        symbol = self.selected_symbol()
+        if not symbol:
             return
         
-        symbol_item = self.tree.item(selected[0])
-        symbol = symbol_item['values'][0]
-        
         # 獲取目標窗格
         target_side = "right" if self.pane_side == "left" else "left"
         target_tab = self.main_app.get_current_tab(target_side)
@@ -95,18 +231,23 @@ class PortfolioTab(ttk.Frame):
         try:
             # 從當前分頁移除
             self.stocks.remove(symbol)
-            self.save_stocks()
-            self.refresh_data()
+            self.stocks_changed()
             
             # 添加到目標分頁
             target_tab.stocks.append(symbol)
-            target_tab.save_stocks()
+            target_tab.stocks_changed()
             target_tab.refresh_data()
+            self.main_app.move_position(self, target_tab, symbol)
             
             self.main_app.status.config(text=f"已移動 {symbol} 到{target_side}窗格")
         except Exception as e:
             messagebox.showerror("錯誤", f"移動失敗: {str(e)}")
 
+    def selected_symbol(self):
+        """選取列的 iid 就是股票代碼（避免 values 把數字代碼轉成整數）"""
+        selected = self.tree.selection()
+        return selected[0] if selected else None
+
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
         if item:
@@ -117,237 +258,523 @@ class PortfolioTab(ttk.Frame):
                 self.context_menu.grab_release()
 
     def open_yahoo_finance(self):
-        selected = self.tree.selection()
-        if not selected:
+        symbol = self.selected_symbol()
+        if not symbol:
             return
-        symbol = self.tree.item(selected[0])['values'][0]
         try:
             webbrowser.open_new_tab(f"https://finance.yahoo.com/chart/{symbol}")
         except Exception as e:
             messagebox.showerror("錯誤", f"無法開啟網頁：{str(e)}")
 
     def copy_symbol(self):
-        selected = self.tree.selection()
-        if selected:
-            symbol = self.tree.item(selected[0])['values'][0]
+        symbol = self.selected_symbol()
+        if symbol:
             self.clipboard_clear()
             self.clipboard_append(symbol)
 
+    def add_alert(self):
+        symbol = self.selected_symbol()
+        if not symbol:
+            return
+        if rule := AlertDialog(self, symbol, self.filename).result:
+            self.main_app.add_alert_rule(rule)
+
+    def clear_alerts(self):
+        if symbol := self.selected_symbol():
+            self.main_app.clear_alert_rules(symbol)
+
+    def edit_position(self):
+        symbol = self.selected_symbol()
+        if not symbol:
+            return
+        positions = self.main_app.positions
+        if positions is None:
+            messagebox.showinfo("提示", "持股模組載入中，請稍後再試")
+            return
+        result = PositionDialog(self, symbol, positions.get(self.filename, symbol)).result
+        if result is not None:
+            self.main_app.set_position(self, symbol, *result)
+
     def treeview_sort_column(self, col):
-        # 排序时标记缓存失效
-        self.cache_valid = False
         if self.sort_column == col:
             self.sort_reverse = not self.sort_reverse
         else:
             self.sort_column = col
             self.sort_reverse = False
-            
+        self.update_sort_headings()
+        self.main_app.store.set_sort(self.filename, self.sort_column, self.sort_reverse)
+        
+        # 索引已依數值排好，只需重新排列不必重新抓取
+        if self.virtual:
+            self.tree_rows.offset = 0  # 換排序後回到頂端
+        self.main_app.mark_dirty(self)
+
+    def update_sort_headings(self):
+        """排序欄位的標題加上箭頭"""
         for c in self.tree["columns"]:
             heading_text = self.tree.heading(c)["text"]
-            if c == col:
+            if c == self.sort_column:
                 arrow = " ↓" if self.sort_reverse else " ↑"
                 self.tree.heading(c, text=heading_text.split(" ↑")[0].split(" ↓")[0] + arrow)
             else:
                 self.tree.heading(c, text=heading_text.split(" ↑")[0].split(" ↓")[0])
-        
-        self.refresh_data()
-   
 
-    def load_stocks(self):
-        self.stocks = []
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, "r") as f:
-                    self.stocks = [line.strip() for line in f if line.strip()]
-            except Exception as e:
-                messagebox.showerror("錯誤", f"讀取失敗：{str(e)}")
+    def load_stocks(self, stocks):
+        self.stocks = list(stocks)
+        self.model.set_symbols(self.stocks)
+        self.main_app.alerts.set_tab_symbols(self.filename, self.stocks)
 
     def save_stocks(self):
-        try:
-            with open(self.filename, "w") as f:
-                f.write("\n".join(self.stocks))
-        except Exception as e:
-            messagebox.showerror("錯誤", f"保存失敗：{str(e)}")
+        """交給工作區在背景合併寫入，不在 UI 執行緒寫檔"""
+        self.main_app.store.set_symbols(self.filename, self.stocks)
+
+    def stocks_changed(self):
+        """股票清單變動後：存檔、同步資料模型並標記重繪"""
+        self.save_stocks()
+        self.model.set_symbols(self.stocks)
+        self.main_app.alerts.set_tab_symbols(self.filename, self.stocks)
+        self.main_app.mark_dirty(self)
 
     def delete_stock(self):
         try:
-            selected = self.tree.selection()[0]
-            symbol = self.tree.item(selected)['values'][0]
+            symbol = self.tree.selection()[0]
             if messagebox.askyesno("確認", f"刪除 {symbol}？"):
                 self.stocks.remove(symbol)
-                self.save_stocks()
-                self.refresh_data()
+                self.stocks_changed()
+                self.main_app.set_position(self, symbol, None)
                 return True
         except IndexError:
             messagebox.showwarning("警告", "請選擇股票")
         return False
 
     def refresh_data(self, force=False):
-        """优化后的数据刷新方法"""
-        if not force and self.cache_valid:
-            return  # 使用缓存数据
-
-        def fetch_data():
-            with self.data_lock:
-                stocks = self.load_stocks()
-                new_items = []
-                for symbol in stocks:
-                    if symbol not in self.cached_data or force:
-                        data = self.get_stock_data(symbol)
-                        self.cached_data[symbol] = data
-                    else:
-                        data = self.cached_data[symbol]
-                    # ... 数据处理逻辑 ...
-                
-                self.after(0, self._update_ui)
-                # 在数据获取完成后更新缓存状态
-                self.cache_valid = True
-                self.cached_items = items  # 存储排序后的数据
-
-        threading.Thread(target=fetch_data, daemon=True).start()
-
-    def _update_ui(self):
-        """最小化UI更新操作"""
-        self.tree.delete(*self.tree.get_children())
-        # 仅插入可见范围数据（分页加载优化）
-        for item in self.cached_data.values()[:100]:  # 假设每页显示100条
-            self.tree.insert("", "end", values=item)
-        # 异步加载剩余数据
-        threading.Thread(target=self._load_remaining_data, daemon=True).start()
-
-    def _load_remaining_data(self):
-        """后台加载剩余数据"""
-        for item in self.cached_data.values()[100:]:
-            self.tree.insert("", "end", values=item)
-
-    def refresh_data(self):
-        self.tree.delete(*self.tree.get_children())
-        items = []
+        """先以快取顯示，過期的代碼再交由背景工作池抓取"""
+        self.main_app.request_refresh([self], force=force)
+
+    def apply_quotes(self, quotes):
+        """只更新數據不碰元件，回傳本分頁顯示是否受影響"""
+        changed = False
+        if len(quotes) < len(self.stocks):
+            # 大分頁（篩選清單）收到少量 tick 時只看收到的代碼
+            for symbol, quote in quotes.items():
+                changed = self.model.update(symbol, quote) or changed
+        else:
+            for symbol in self.stocks:
+                if symbol in quotes:
+                    changed = self.model.update(symbol, quotes[symbol]) or changed
+        return changed
+
+    def apply_indicators(self, rows, indicators):
+        """從整批計算好的指標陣列取出本分頁各檔的值，回傳顯示是否受影響"""
+        changed = False
         for symbol in self.stocks:
-            data = self.get_stock_data(symbol)
-            if data:
-                # 只保留需要的數據
-                price = f"{data['price']:.1f}" if isinstance(data['price'], float) else 'N/A'
-                change_percent = data['change_percent']
-                
-                item = (
-                    data['symbol'],
-                    price,
-                    change_percent
-                )
-                items.append((item, data.get('change')))  # 保留change用於排序判斷
-        
-        # 調整排序邏輯
-        if self.sort_column:
-            col_index = self.tree["columns"].index(self.sort_column)
-            reverse = self.sort_reverse
-            if self.sort_column == "change_percent":
-                items.sort(key=lambda x: self.parse_percent(x[0][col_index]), reverse=reverse)
-           
-            elif self.sort_column == "price":
-                items.sort(key=lambda x: self.parse_price(x[0][col_index]), reverse=reverse)
-            else:
-                items.sort(key=lambda x: x[0][col_index], reverse=reverse)
+            row = rows.get(symbol)
+            if row is None:
+                continue
+            values = {name: column[row] for name, column in indicators.items()}
+            values["price"] = self.model.rows[symbol].price
+            changed = self.model.update_extras(symbol, format_indicators(values)) or changed
+        return changed
+
+    def render(self):
+        """依排序索引同步到 Treeview，只改有變動的列，只能在主執行緒呼叫"""
+        if not self.materialized:
+            return  # 隱藏分頁只更新資料模型
+        rows = self.model.rows
+        order = self.model.order(self.sort_column, self.sort_reverse)
+        if self.virtual:
+            order = self.tree_rows.window(order)  # 之後只處理可視範圍的列
+        images = None
+        if self.main_app.show_sparklines.get() and self.main_app.sparklines:
+            # 快取命中只是查表，資料版本改變的代碼才會重畫
+            bar_store, sparklines = self.main_app.bar_store, self.main_app.sparklines
+            images = {symbol: sparklines.get(symbol, bar_store.versions.get(symbol),
+                                             lambda s=symbol: bar_store.intraday(s))
+                      for symbol in order}
+        self.tree_rows.sync([(symbol, rows[symbol].values(), rows[symbol].tags) for symbol in order], images)
+
+class AddStockDialog(tk.Toplevel):
+    """新增股票對話框：以本機代碼索引即時自動完成，可一次貼上多檔"""
+
+    def __init__(self, master, symbol_index):
+        super().__init__(master)
+        self.title("新增股票")
+        self.configure(background='black')
+        self.transient(master)
+        self.resizable(False, False)
+        self.symbol_index = symbol_index
+        self.result = []
+
+        ttk.Label(self, text="輸入股票代碼（可用空白、逗號或換行分隔多檔）：").pack(fill=tk.X, padx=8, pady=(8, 2))
+        self.entry_var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.entry_var, width=36)
+        self.entry.pack(fill=tk.X, padx=8)
+        self.suggestions = tk.Listbox(self, height=8, activestyle='none',
+                                      background='#1f1e1e', foreground='white',
+                                      selectbackground='#1a3d5d', font=('微軟正黑體', 10))
+        self.suggestions.pack(fill=tk.BOTH, expand=True, padx=8, pady=4)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill=tk.X, padx=8, pady=(0, 8))
+        ttk.Button(buttons, text="取消", command=self.destroy).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="確定", command=self.ok).pack(side=tk.RIGHT, padx=2)
+
+        self.entry.bind("<KeyRelease>", self.update_suggestions)
+        self.entry.bind("<Down>", lambda e: self.move_selection(1))
+        self.entry.bind("<Up>", lambda e: self.move_selection(-1))
+        self.entry.bind("<Tab>", self.accept_suggestion)
+        self.entry.bind("<Return>", self.on_return)
+        self.suggestions.bind("<Double-Button-1>", self.accept_suggestion)
+        self.bind("<Escape>", lambda e: self.destroy())
+
+        self.entry.focus_set()
+        self.grab_set()
+        self.wait_window()
+
+    def current_token(self):
+        text = self.entry_var.get()
+        return parse_symbols(text)[-1] if text and not text[-1].isspace() and text[-1] not in ",;" else ""
+
+    def update_suggestions(self, event=None):
+        if event is not None and event.keysym in ("Up", "Down", "Return", "Tab", "Escape"):
+            return
+        self.suggestions.delete(0, tk.END)
+        for symbol, name in self.symbol_index.complete(self.current_token()):
+            self.suggestions.insert(tk.END, f"{symbol}  {name}")
+
+    def move_selection(self, step):
+        size = self.suggestions.size()
+        if not size:
+            return "break"
+        current = self.suggestions.curselection()
+        index = (current[0] + step) % size if current else (0 if step > 0 else size - 1)
+        self.suggestions.selection_clear(0, tk.END)
+        self.suggestions.selection_set(index)
+        self.suggestions.see(index)
+        return "break"
+
+    def accept_suggestion(self, event=None):
+        """以選取（或第一個）建議取代正在輸入的代碼"""
+        if not self.suggestions.size():
+            return "break"
+        current = self.suggestions.curselection()
+        symbol = self.suggestions.get(current[0] if current else 0).split()[0]
+        text = self.entry_var.get()
+        token = self.current_token()
+        self.entry_var.set(text[:len(text) - len(token)] + symbol + " ")
+        self.entry.icursor(tk.END)
+        self.suggestions.delete(0, tk.END)
+        return "break"
+
+    def on_return(self, event=None):
+        if self.suggestions.curselection():
+            return self.accept_suggestion()
+        self.ok()
+        return "break"
+
+    def ok(self):
+        self.result = parse_symbols(self.entry_var.get())
+        self.destroy()
+
+
+class AlertDialog(tk.Toplevel):
+    """新增警示：選擇類型與門檻，可套用到整個分頁"""
+
+    def __init__(self, master, symbol, tab):
+        super().__init__(master)
+        self.title(f"新增警示：{symbol}")
+        self.configure(background='black')
+        self.transient(master)
+        self.resizable(False, False)
+        self.symbol = symbol
+        self.tab = tab
+        self.result = None
+
+        labels = list(ALERT_KINDS.values())
+        self.kind_var = tk.StringVar(value=labels[0])
+        ttk.Combobox(self, textvariable=self.kind_var, values=labels, state="readonly", width=20).pack(
+            fill=tk.X, padx=8, pady=(8, 2))
+        self.threshold_var = tk.StringVar()
+        entry = ttk.Entry(self, textvariable=self.threshold_var, width=20)
+        entry.pack(fill=tk.X, padx=8, pady=2)
+        self.whole_tab = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self, text="套用到整個分頁", variable=self.whole_tab).pack(anchor=tk.W, padx=8, pady=2)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill=tk.X, padx=8, pady=(2, 8))
+        ttk.Button(buttons, text="取消", command=self.destroy).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="確定", command=self.ok).pack(side=tk.RIGHT, padx=2)
+        entry.bind("<Return>", lambda e: self.ok())
+        self.bind("<Escape>", lambda e: self.destroy())
+
+        entry.focus_set()
+        self.grab_set()
+        self.wait_window()
+
+    def ok(self):
+        kind = next(k for k, label in ALERT_KINDS.items() if label == self.kind_var.get())
+        try:
+            threshold = float(self.threshold_var.get())
+        except ValueError:
+            messagebox.showwarning("警告", "請輸入數值門檻", parent=self)
+            return
+        if self.whole_tab.get():
+            self.result = AlertRule(kind, threshold, tab=self.tab)
+        else:
+            self.result = AlertRule(kind, threshold, symbol=self.symbol)
+        self.destroy()
 
-        # 插入簡化後數據
-        for item, change in items:
-            tags = ()
-            try:
-                # 解析漲跌幅百分比數值
-                percent_str = item[2].replace('%', '')  # 移除百分比符號
-                percent = float(percent_str)
-                
-                # 僅當漲幅超過0.5%時標記為綠色
-                if percent > 0.5:
-                    tags = ('rise',)
-                elif percent < -0.5:  # 新增负值判断
-                    tags = ('fall',)
-                else:  # 新增中间范围
-                    tags = ('neutral',)
-
-            except (ValueError, AttributeError):
-                # 異常處理保持原邏輯
-               if isinstance(change, float):
-                    tags = ('rise',) if change >= 0 else ('fall',)
-            
-            self.tree.insert("", tk.END, values=item, tags=tags)
-        
-        # 新增中性样式配置
-        self.tree.tag_configure('neutral', foreground='white')
-        self.tree.tag_configure('rise', foreground='#33FF77')  #green
-        self.tree.tag_configure('fall', foreground='#FF1919')  #red
 
-    def parse_percent(self, value):
-        try:
-            return float(value.strip('%'))
-        except:
-            return -float('inf') if self.sort_reverse else float('inf')
+class PositionDialog(tk.Toplevel):
+    """設定持股：股數與每股平均成本（原幣）；股數留空或 0 表示刪除"""
 
-    def parse_price(self, value):
+    def __init__(self, master, symbol, current=None):
+        super().__init__(master)
+        self.title(f"設定持股：{symbol}")
+        self.configure(background='black')
+        self.transient(master)
+        self.resizable(False, False)
+        self.result = None
+
+        shares, cost = current or (None, None)
+        ttk.Label(self, text="股數：").pack(anchor=tk.W, padx=8, pady=(8, 0))
+        self.shares_var = tk.StringVar(value=f"{shares:g}" if shares else "")
+        entry = ttk.Entry(self, textvariable=self.shares_var, width=20)
+        entry.pack(fill=tk.X, padx=8, pady=2)
+        ttk.Label(self, text="每股成本（原幣，可留空）：").pack(anchor=tk.W, padx=8)
+        self.cost_var = tk.StringVar(value=f"{cost:g}" if cost else "")
+        cost_entry = ttk.Entry(self, textvariable=self.cost_var, width=20)
+        cost_entry.pack(fill=tk.X, padx=8, pady=2)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill=tk.X, padx=8, pady=(2, 8))
+        ttk.Button(buttons, text="取消", command=self.destroy).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(buttons, text="確定", command=self.ok).pack(side=tk.RIGHT, padx=2)
+        for widget in (entry, cost_entry):
+            widget.bind("<Return>", lambda e: self.ok())
+        self.bind("<Escape>", lambda e: self.destroy())
+
+        entry.focus_set()
+        self.grab_set()
+        self.wait_window()
+
+    def ok(self):
         try:
-            return float(value)
-        except:
-            return -float('inf') if self.sort_reverse else float('inf')
+            shares = float(self.shares_var.get() or 0)
+            cost = float(self.cost_var.get() or 0)
+        except ValueError:
+            messagebox.showwarning("警告", "請輸入數值", parent=self)
+            return
+        if shares < 0 or cost < 0:
+            messagebox.showwarning("警告", "股數與成本不可為負數", parent=self)
+            return
+        self.result = (shares, cost)
+        self.destroy()
 
-    def get_stock_data(self, symbol):
-        try:
-            ticker = yf.Ticker(symbol)
-            data = ticker.info
-            market_state = data.get('marketState', 'REGULAR')
-            
-            price = data.get('regularMarketPrice')
-            prev_close = data.get('regularMarketPreviousClose')
-            
-            change = None
-            change_percent = None
-            if price and prev_close:
-                change = round(price - prev_close, 2)
-                change_percent = f"{(change/prev_close)*100:+.2f}%"   ####
-            
-            
-            return {
-                "symbol": symbol,
-                "price": price,
-                "change": change,  # 保留用於顏色標記
-                "change_percent": change_percent or 'N/A'
-                # 移除其他不需要的欄位
-            }
-        except Exception as e:
-            print(f"獲取數據失敗：{symbol} - {str(e)}")
-            return None
 
 class DualPaneStockApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, feed_mode=FEED_MODE, replay_file=None, replay_speed=1.0, record_file=None,
+                 profile_file=None, shared=False, replay_start=None, journal=True, hedge=HEDGE_REQUESTS,
+                 quotes_csv=QUOTE_CSV):
+        self.startup = StartupTimer(STARTED)  # 啟動各階段的時間
+        self.startup.mark("imports")
         super().__init__()
         self.title("雙窗看股系統 v2.0")
         self.geometry("428x840")    #####
         self.panes = {"left": {"notebook": None, "tabs": {}}, "right": {"notebook": None, "tabs": {}}}
-        self.create_widgets()
-
-        # 配置黑色主题
+        # 所有分頁共用的報價引擎與快取（與命令列共用 quote_service 的設定），抓取一律經過限流與熔斷保護
+        self.telemetry = Telemetry()  # 抓取延遲、Treeview 更新時間與主迴圈卡頓
+        self.profiler = Profiler(profile_file or PROFILE_FILE)
+        # 多個報價來源依代碼後綴分派，各來源的延遲統計決定先問誰（設定了 HTTP 端點時不使用）
+        self.providers = None if QUOTE_SERVER_URL else create_router(hedge, quotes_csv)
+        self.quote_engine = create_engine(telemetry=self.telemetry, router=self.providers)
+        self.fetch_guard = self.quote_engine.fetcher
+        # K 線與報價打同一個資料來源：共用限流與全域熔斷，報價被熔斷時 K 線也暫停
+        self.daily_bars = self.fetch_guard.sibling(
+            lambda symbols: fetch_bars(symbols, period="3mo", interval="1d"), valid=has_bars)
+        self.intraday_bars = self.fetch_guard.sibling(
+            lambda symbols: fetch_bars(symbols, period="1d", interval=BAR_INTERVAL), valid=has_bars)
+        self.worker = RefreshWorker(self.quote_engine, batch_size=QUOTE_BATCH_SIZE)
+        self.scheduler = RefreshScheduler()
+        self.symbol_index = SymbolIndex()  # 新增股票時的本機驗證與自動完成
+        self.store = WorkspaceStore()  # 分頁、股票清單、排序與快取報價，背景合併寫入
+        self._store_error = None  # 狀態列上顯示中的工作區寫入錯誤
+        # 日K與盤中價位（指標欄位由此計算）及走勢圖快取需要 NumPy，第一次繪製後才在背景載入
+        self.bar_store = None
+        self.sparklines = None
+        self.positions = None  # 持股與損益合計（PositionBook）
+        self.show_indicators = tk.BooleanVar(value=False)
+        self.show_sparklines = tk.BooleanVar(value=False)
+        self.show_stats = tk.BooleanVar(value=False)
+        self.profiling = tk.BooleanVar(value=False)
+        self.alerts = AlertEngine(self.average_volume)  # 每筆報價只檢查該代碼的規則
+        self.ticks = TickBuffer()  # 推播來源寫入，主執行緒依 STREAM_MAX_FPS 取出
+        self.feed = self.create_feed(feed_mode, replay_file, replay_speed, replay_start)
+        if shared:
+            self.feed = SharedFeed(self.feed)  # 多個視窗只由搶到鎖的一個抓取
+        self.recorder = TickRecorder(record_file) if record_file else None
+        # 收到的每筆報價都寫進每日輪替的二進位日誌（重播時不寫），可用 --replay journal 重播
+        self.journal = QuoteJournal() if journal and self.feed.name != "replay" else None
+        self.replay_speed = tk.DoubleVar(value=replay_speed)
+        self.replay_paused = tk.BooleanVar(value=False)
+        if isinstance(self.feed, JournalFeed):
+            self.replay_speed.trace_add("write", lambda *_: self.feed.set_speed(self.replay_speed.get()))
+            self.replay_paused.trace_add("write", lambda *_: self.feed.set_paused(self.replay_paused.get()))
+        self.refresh_bus = RefreshBus()  # UI 動作的重繪與重抓請求，重抓在短時間窗內合併
+        self._refresh_pending = False
+        self._snapshot_dirty = False
+        self._last_snapshot = 0
+        self._last_flush = 0
+        self._last_indicators = 0
+        self._indicators_version = -1
+        self._sparkline_version = -1
+        self._positions_version = -1
+        self._last_positions = 0
+        self._initialized = False
+        self.exit_code = 0
+        if profile_file:
+            self.profiling.set(True)
+            self.profiler.start()  # 從建立視窗就開始剖析，關閉時寫檔
+
+        # 配置黑色主题：先設定樣式再建立元件，第一次繪製就是最終外觀
         self.configure(background='black')
         self._setup_dark_theme()
-        self.current_visible_tabs = {}  # 跟踪可见分页
+        self.create_widgets()
+        self.startup.mark("widgets")
 
-        # 延遲加載配置和自動刷新
-        self.after(100, self.initialize_app)
+        # 第一次繪製前只讀本機工作區，畫出分頁與上次的報價；連網與較重的模組等畫面出來後才開始
+        self.show_workspace()
+        self.startup.mark("workspace")
+        self.bind("<Map>", self.on_map)
+        self.after(UI_POLL_INTERVAL, self.process_results)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    def initialize_app(self):
-        """延遲初始化非必要資源"""
+    def show_workspace(self):
+        snapshot_time = self.restore_snapshot()
         self.load_config()
-        self.after(REFRESH_INTERVAL, self.auto_refresh)
+        if snapshot_time:
+            self.status.config(text=f"顯示 {snapshot_time:%m/%d %H:%M} 的報價，更新中...")
 
-        
+    def on_map(self, event):
+        if event.widget is self:
+            self.unbind("<Map>")
+            self.after_idle(self.on_first_paint)  # 等元件畫完
 
-    def add_existing_tab(self, side, filename, tab_name):
-        """空分頁初始化，延遲加載數據"""
-        new_tab = PortfolioTab(self.panes[side]["notebook"], filename, side, self)
-        self.panes[side]["notebook"].add(new_tab, text=tab_name)
-        self.panes[side]["tabs"][filename] = new_tab
-        new_tab.load_stocks(deferred=True)  # 新增延遲加載參數
+    def on_first_paint(self):
+        self.startup.mark("first_paint")
+        if self.startup.marks["first_paint"] > FIRST_PAINT_TARGET:
+            print(f"啟動較慢：第一次繪製花了 {self.startup.marks['first_paint'] * 1000:.0f} ms"
+                  f"（目標 {FIRST_PAINT_TARGET * 1000:.0f} ms）")
+        self.initialize_app()
+
+    def initialize_app(self):
+        """延遲初始化非必要資源"""
+        self._initialized = True
+        self.worker.submit(load_data_stack, priority=PRIORITY_HIGH,
+                           callback=self.on_data_stack, errback=self.data_stack_failed)
+        self.alerts.load(ALERT_RULES_FILE)
+        self.worker.submit(self.load_symbol_index, priority=PRIORITY_LOW)
+        self.feed.start(self.ticks)
+        self.refresh_all()
+        self.auto_refresh()
+        self.refresh_bars()
+        self.after(WORKSPACE_SYNC_INTERVAL, self.sync_workspace)
+        if isinstance(self.feed, JournalFeed):
+            self.update_replay_status()
+
+    def on_data_stack(self, classes):
+        """NumPy 等模組載入後才建立 K 線存放、走勢圖快取與持股，並套用已勾選的顯示選項"""
+        bar_store_class, sparkline_class, position_class = classes
+        self.bar_store = bar_store_class()
+        self.sparklines = sparkline_class(self, max_size=QUOTE_CACHE_SIZE)
+        self.load_positions(position_class())
+        self.startup.mark("data_stack")
+        if self.show_indicators.get():
+            self.toggle_indicators()
+        if self.show_sparklines.get():
+            self.toggle_sparklines()
+
+    def data_stack_failed(self, error):
+        print(f"模組載入失敗：{str(error)}")
+
+    def load_positions(self, positions):
+        """登記所有分頁、讀入工作區的持股並套用快取報價；需要匯率時一併抓取"""
+        for tab in self.all_tabs():
+            positions.set_tab(tab.filename, tab.pane_side)
+        try:
+            rows = self.store.load_positions()
+        except sqlite3.Error as e:
+            print(f"持股讀取失敗：{str(e)}")
+            rows = []
+        for tab_id, symbol, shares, cost in rows:
+            if tab_id in positions.tab_ids:
+                positions.set(tab_id, symbol, shares, cost)
+        positions.update_quotes(self.quote_engine.cached(list(positions.symbol_rows) + positions.fx_symbols())[0])
+        self.positions = positions
+        if positions.fx_symbols():
+            self.request_refresh([])
+
+    def set_position(self, tab, symbol, shares, cost=0.0):
+        self.store.set_position(tab.filename, symbol, shares, cost)
+        if self.positions:
+            quote = self.quote_engine.cached([symbol])[0].get(symbol)
+            self.positions.set(tab.filename, symbol, shares, cost, quote)
+            self.request_refresh([])  # 新幣別需要的匯率
+
+    def move_position(self, source, target, symbol):
+        """股票移到另一個分頁時持股跟著移動"""
+        if self.positions and (position := self.positions.get(source.filename, symbol)):
+            self.set_position(source, symbol, None)
+            self.set_position(target, symbol, *position)
+
+    def average_volume(self, symbol):
+        return self.bar_store.average_volume(symbol) if self.bar_store else None
+
+    def report_startup(self, deadline):
+        """--startup-report：等到第一批報價（或逾時）後印出各階段時間並關閉，第一次繪製超過目標時結束碼為 1"""
+        if "first_quotes" not in self.startup.marks and time.perf_counter() < deadline:
+            self.after(50, self.report_startup, deadline)
+            return
+        print(self.startup.report())
+        first_paint = self.startup.marks.get("first_paint")
+        self.exit_code = 0 if first_paint is not None and first_paint <= FIRST_PAINT_TARGET else 1
+        self.on_close()
+
+    @property
+    def offline(self):
+        """重播、常駐程式或共用模式的 follower 不自行抓取"""
+        return self.feed.remote
+
+    def create_feed(self, mode, replay_file=None, replay_speed=1.0, replay_start=None):
+        """依模式建立報價來源；串流不可用時退回輪詢"""
+        if mode == "replay":
+            if is_journal(replay_file):
+                return JournalFeed(replay_file, speed=replay_speed, start=replay_start)
+            return ReplayFeed(replay_file, speed=replay_speed)
+        if mode == "daemon":
+            return DaemonFeed(parse_address(DAEMON_ADDRESS))
+        if mode == "stream":
+            if YahooStreamFeed.available():
+                return YahooStreamFeed()
+            print("此版本 yfinance 不支援串流，改用輪詢")
+        return PollingFeed(self.quote_engine, self.scheduler, tick=REFRESH_TICK / 1000)
 
         
 
+    def load_symbol_index(self):
+        """在背景執行緒載入代碼清單；清單過舊時順便重新下載"""
+        for path in (SYMBOL_BUNDLED_FILE, SYMBOL_CACHE_FILE):
+            self.symbol_index.load(path)
+        if cache_is_stale(SYMBOL_CACHE_FILE):
+            self.symbol_index.update(refresh_cache(SYMBOL_CACHE_FILE))
+
+    def restore_snapshot(self):
+        """把工作區保存的上次報價載入快取，讓分頁在連網前就能顯示；回傳報價時間"""
+        entries = self.store.load_quotes()
+        if not entries:
+            return None
+        self.quote_engine.cache.restore(entries)
+        return datetime.fromtimestamp(max(timestamp for timestamp, _ in entries.values()))
 
     def _setup_dark_theme(self):
         style = ttk.Style()
@@ -453,9 +880,6 @@ class DualPaneStockApp(tk.Tk):
                   background=[('selected', bg_color)],
                   foreground=[('selected', fg_color)])
 
-        # 状态栏样式
-        self.status.configure(style='TLabel')
-
         # 分隔线样式
         self.option_add('*TCombobox*Listbox.background', field_bg)
         self.option_add('*TCombobox*Listbox.foreground', fg_color)
@@ -496,6 +920,11 @@ class DualPaneStockApp(tk.Tk):
 
         self.status = ttk.Label(self, text="就緒", anchor=tk.W)
         self.status.pack(side=tk.BOTTOM, fill=tk.X)
+        # 效能統計面板，預設隱藏（雙擊狀態列或窗格選單切換）
+        self.stats_panel = ttk.Label(self, text="", anchor=tk.W, justify=tk.LEFT, font=('Consolas', 8))
+        self._stats_job = None
+        self.show_stats.trace_add("write", lambda *_: self.toggle_stats())
+        self.status.bind("<Double-Button-1>", lambda e: self.show_stats.set(not self.show_stats.get()))
 
         '''style = ttk.Style()
         style.configure("Custom.Treeview", rowheight=25, font=('微軟正黑體', 10))
@@ -507,27 +936,90 @@ class DualPaneStockApp(tk.Tk):
         notebook = ttk.Notebook(pane_frame)
         notebook.pack(fill=tk.BOTH, expand=True)
         notebook.bind("<<NotebookTabChanged>>", lambda e: self.on_tab_changed(side))
+        notebook.bind("<Button-3>", lambda e: self.show_pane_menu(side, e))
         self.panes[side]["notebook"] = notebook
         self.panes[side]["tabs"] = {}
-        ttk.Label(pane_frame, text=f"{side.upper()} 窗格", font=('微軟正黑體', 10, 'bold')).pack(side=tk.TOP, fill=tk.X)
+        # 窗格標籤，有持股時附上窗格合計
+        self.panes[side]["summary"] = ttk.Label(pane_frame, text=f"{side.upper()} 窗格", font=('微軟正黑體', 10, 'bold'))
+        self.panes[side]["summary"].pack(side=tk.TOP, fill=tk.X)
+
+    def show_pane_menu(self, side, event):
+        """在分頁標籤上按右鍵：新增一般分頁或篩選分頁"""
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="新增分頁", command=lambda: self.add_portfolio(side))
+        screener = tk.Menu(menu, tearoff=0)
+        for label, suffix in SCREENER_UNIVERSES.items():
+            screener.add_command(label=label, command=lambda l=label, s=suffix: self.add_screener(
+                side, l, self.symbol_index.market(s)))
+        screener.add_separator()
+        screener.add_command(label="從檔案...", command=lambda: self.add_screener_from_file(side))
+        menu.add_cascade(label="新增篩選分頁", menu=screener)
+        menu.add_separator()
+        menu.add_checkbutton(label="效能統計", variable=self.show_stats)
+        menu.add_checkbutton(label=f"效能剖析（{self.profiler.path}）", variable=self.profiling,
+                             command=self.toggle_profiling)
+        if isinstance(self.feed, JournalFeed):
+            replay = tk.Menu(menu, tearoff=0)
+            replay.add_checkbutton(label="暫停", variable=self.replay_paused)
+            replay.add_separator()
+            for label, speed in REPLAY_SPEEDS.items():
+                replay.add_radiobutton(label=label, variable=self.replay_speed, value=speed)
+            menu.add_cascade(label="重播", menu=replay)
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
 
-    def add_portfolio(self):
-        side = self.side_var.get()
-        filename = simpledialog.askstring("新增分頁", f"輸入{side}窗格檔案名稱：")
+    def add_portfolio(self, side=None, symbols=None, default_name=None):
+        side = side or self.side_var.get()
+        filename = simpledialog.askstring("新增分頁", f"輸入{side}窗格檔案名稱：", initialvalue=default_name)
         if not filename:
-            return
+            return None
         if not filename.endswith(".txt"):
             filename += ".txt"
         
         if filename in self.panes[side]["tabs"]:
             messagebox.showwarning("警告", "分頁已存在")
-            return
+            return None
 
         new_tab = PortfolioTab(self.panes[side]["notebook"], filename, side, self)
+        if symbols:
+            new_tab.stocks = list(symbols)
+            new_tab.stocks_changed()
         tab_name = os.path.splitext(filename)[0]
         self.panes[side]["notebook"].add(new_tab, text=tab_name)
         self.panes[side]["tabs"][filename] = new_tab
         self.save_config()
+        return new_tab
+
+    def add_screener(self, side, name, symbols):
+        """以整個市場或成分股清單建立篩選分頁；檔數多時自動使用虛擬清單"""
+        if not symbols:
+            messagebox.showwarning("警告", f"{name}沒有可用的代碼（代碼清單可能仍在下載中）")
+            return
+        if new_tab := self.add_portfolio(side, symbols, default_name=f"篩選_{name}"):
+            self.panes[side]["notebook"].select(new_tab)  # 選取時才建立元件並抓取
+            self.status.config(text=f"篩選分頁：{len(symbols)} 檔")
+
+    def add_screener_from_file(self, side):
+        """成分股檔案：有 symbol 欄位的 CSV，或以空白、逗號分隔代碼的文字檔"""
+        path = filedialog.askopenfilename(title="選擇成分股清單",
+                                          filetypes=[("代碼清單", "*.csv *.txt"), ("所有檔案", "*.*")])
+        if not path:
+            return
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            if path.lower().endswith(".csv"):
+                index = SymbolIndex()
+                index.load(path)
+                symbols = list(index.names)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    symbols = parse_symbols(f.read())
+        except Exception as e:
+            messagebox.showerror("錯誤", f"讀取失敗：{str(e)}")
+            return
+        self.add_screener(side, name, symbols)
 
     def delete_portfolio(self):
         side = self.side_var.get()
@@ -538,7 +1030,11 @@ class DualPaneStockApp(tk.Tk):
         if messagebox.askyesno("確認", f"刪除分頁 {self.panes[side]['notebook'].tab('current')['text']}？"):
             self.panes[side]["notebook"].forget(current_tab)
             del self.panes[side]["tabs"][current_tab.filename]
-            os.remove(current_tab.filename)
+            self.store.delete_tab(current_tab.filename)
+            self.alerts.set_tab_symbols(current_tab.filename, [])
+            self.clear_alert_rules(tab=current_tab.filename)
+            if self.positions:
+                self.positions.remove_tab(current_tab.filename)  # 工作區的持股隨分頁一起刪除
             self.save_config()
 
     def get_current_tab(self, side=None):
@@ -551,16 +1047,9 @@ class DualPaneStockApp(tk.Tk):
 
     def on_tab_changed(self, side):
         if current_tab := self.get_current_tab(side):
-            current_tab.refresh_data()
-
-
-    def _update_visible_tabs(self, active_side):
-        """资源管理优化"""
-        for side in ['left', 'right']:
-            if side != active_side:
-                tab = self.get_current_tab(side)
-                if tab and tab.winfo_ismapped():
-                    tab.tree.unmap()  # 隐藏不可见分页组件
+            current_tab.materialize()
+            if self._initialized:
+                current_tab.refresh_data()  # 啟動時由 initialize_app 統一抓取
 
     def add_stock(self):
         side = self.side_var.get()
@@ -569,36 +1058,63 @@ class DualPaneStockApp(tk.Tk):
             messagebox.showwarning("警告", "請先選擇分頁")
             return
         
-        symbol = simpledialog.askstring("新增股票", "輸入股票代碼：") or ""
-        symbol = symbol.upper().strip()
-        if not symbol:
+        symbols = AddStockDialog(self, self.symbol_index).result
+        if not symbols:
             return
         
-        if symbol in current_tab.stocks:
+        symbols = [s for s in symbols if s not in current_tab.stocks]
+        if not symbols:
             messagebox.showwarning("警告", "股票已存在")
             return
         
-        self.status.config(text="驗證中...")
-        threading.Thread(target=self.validate_add_stock, args=(side, symbol)).start()
-
-    def validate_add_stock(self, side, symbol):
-        try:
-            current_tab = self.get_current_tab(side)
-            if not current_tab:
-                return
-            
-            data = yf.Ticker(symbol).info
-            if not data.get('symbol'):
-                raise ValueError("無效代碼")
-            
-            current_tab.stocks.append(symbol)
-            current_tab.save_stocks()
+        # 本機索引有的代碼直接加入，其餘整批送去網路驗證
+        known = [s for s in symbols if s in self.symbol_index]
+        unknown = [s for s in symbols if s not in self.symbol_index]
+        if known:
+            self.finish_add_stock(side, (known, {}))
+        if unknown:
+            self.status.config(text=f"驗證中：{', '.join(unknown)}")
+            self.worker.submit(
+                self.validate_add_stock, unknown, priority=PRIORITY_HIGH,
+                callback=lambda result: self.finish_add_stock(side, result),
+                errback=self.add_stock_failed
+            )
+
+    def validate_add_stock(self, symbols):
+        """在背景執行緒以一次批次抓取驗證代碼，回傳 (有效代碼, {無效代碼: 原因})，不碰任何元件
+
+        重播、常駐程式與共用模式的 follower 不連網，只以快取中有報價的代碼為有效。
+        """
+        if self.offline:
+            cached = self.quote_engine.cache.peek(symbols)
+            valid = [s for s in symbols if (cached.get(s) or {}).get('price') is not None]
+            return valid, {s: "離線模式無法驗證（不在代碼清單或快取中）" for s in symbols if s not in valid}
+        quotes = self.quote_engine.fetch(symbols)
+        valid = [s for s in symbols if quotes[s].get('price') is not None]
+        rejected = {s: quotes[s].get('error') or "無效代碼" for s in symbols if s not in valid}
+        if valid:
+            # 記下驗證通過的代碼，下次就不必再連網
+            self.symbol_index.update((s, "") for s in valid)
+            append_cache(SYMBOL_CACHE_FILE, [(s, "") for s in valid])
+        return valid, rejected
+
+    def finish_add_stock(self, side, result):
+        valid, rejected = result
+        current_tab = self.get_current_tab(side)
+        added = [s for s in valid if current_tab and s not in current_tab.stocks]
+        if added:
+            current_tab.stocks.extend(added)
+            current_tab.stocks_changed()
             current_tab.refresh_data()
-            self.status.config(text=f"已添加：{symbol}")
-        except Exception as e:
-            messagebox.showerror("錯誤", f"添加失敗：{str(e)}")
-        finally:
+            self.status.config(text=f"已添加：{', '.join(added)}")
+        else:
             self.status.config(text="就緒")
+        if rejected:
+            messagebox.showerror("錯誤", "添加失敗：\n" + "\n".join(f"{s}：{reason}" for s, reason in rejected.items()))
+
+    def add_stock_failed(self, error):
+        messagebox.showerror("錯誤", f"添加失敗：{str(error)}")
+        self.status.config(text="就緒")
 
     def delete_stock(self):
         side = self.side_var.get()
@@ -606,51 +1122,394 @@ class DualPaneStockApp(tk.Tk):
             if current_tab.delete_stock():
                 self.status.config(text="股票已刪除")
 
+    def all_tabs(self):
+        return [tab for side in ["left", "right"] for tab in self.panes[side]["tabs"].values()]
+
+    def tracked_symbols(self, tabs):
+        """分頁的代碼，加上持股換算需要的匯率代碼"""
+        symbols = self.quote_engine.collect_symbols(tabs)
+        if self.positions:
+            symbols += [s for s in self.positions.fx_symbols() if s not in symbols]
+        return symbols
+
+    def request_refresh(self, tabs, priority=PRIORITY_NORMAL, force=False):
+        """交給刷新匯流排，同一分頁在短時間窗內的請求合併後才由 dispatch_refresh 處理"""
+        self.refresh_bus.fetch(tabs, priority, force)
+
+    def dispatch_refresh(self, tabs, priority=PRIORITY_NORMAL, force=False):
+        """先以快取顯示，再把過期的代碼（force 時全部）去重、略過抓取中的代碼後交給背景工作池"""
+        with self.telemetry.timer("refresh_request"):
+            symbols = self.tracked_symbols(tabs)
+            cached, stale = self.quote_engine.cached(symbols)
+            self.on_quotes(cached)
+            if not self.offline and (fetch := self.refresh_bus.claim(symbols if force else stale)):
+                self.scheduler.mark(fetch)
+                self.worker.submit_quotes(fetch, self.on_fetched, priority=priority)
+            for tab in tabs:
+                self.mark_dirty(tab)
+
+    def on_fetched(self, quotes):
+        self.startup.mark("first_quotes")
+        self.refresh_bus.release(quotes)
+        self._snapshot_dirty = True
+        self.scheduler.observe(quotes)
+        if self.bar_store:
+            self.bar_store.append_quotes(quotes)
+        if alerts := self.alerts.evaluate(quotes):
+            self.on_alerts(alerts)
+        if self.recorder:
+            self.recorder.record(quotes)
+        if self.journal and (self.feed.name != "shared" or self.feed.leader):
+            self.journal.record(quotes)  # 共用模式只由 leader 記錄，各視窗不重複寫同樣的報價
+        self.feed.publish(quotes)
+        self.on_quotes(quotes)
+
+    def flush_ticks(self):
+        """依 STREAM_MAX_FPS 取出推播來源累積的最新報價"""
+        now = time.perf_counter()
+        if now - self._last_flush < 1 / STREAM_MAX_FPS:
+            return
+        self._last_flush = now
+        if quotes := self.ticks.take():
+            self.quote_engine.cache.put_many(quotes)
+            self.on_fetched(quotes)
+
+    def on_quotes(self, quotes):
+        """主執行緒收到一批報價：分送給需要的分頁並標記待重繪"""
+        for tab in self.all_tabs():
+            if tab.apply_quotes(quotes):
+                self.mark_dirty(tab)
+        if self.positions:
+            self.positions.update_quotes(quotes)  # 只改價格，合計在 process_results 中節流重算
+
+    def on_alerts(self, alerts):
+        """觸發的警示顯示在狀態列，並在背景附加到紀錄檔"""
+        text = f"🔔 {alerts[-1].message()}"
+        if len(alerts) > 1:
+            text += f"（另 {len(alerts) - 1} 則）"
+        self.status.config(text=text)
+        self.bell()
+        self.worker.submit(append_alert_log, ALERT_LOG_FILE, alerts, priority=PRIORITY_LOW)
+
+    def add_alert_rule(self, rule):
+        self.alerts.add(rule)
+        self.worker.submit(self.alerts.save, ALERT_RULES_FILE, priority=PRIORITY_LOW)
+        target = rule.symbol or os.path.splitext(rule.tab)[0]
+        self.status.config(text=f"已新增警示：{target} {rule.describe()}")
+
+    def clear_alert_rules(self, symbol=None, tab=None):
+        """移除某檔的個股規則或某分頁的分頁規則"""
+        removed = [r.rule_id for r in list(self.alerts.rules.values())
+                   if (symbol and r.symbol == symbol) or (tab and r.tab == tab)]
+        for rule_id in removed:
+            self.alerts.remove(rule_id)
+        if removed:
+            self.worker.submit(self.alerts.save, ALERT_RULES_FILE, priority=PRIORITY_LOW)
+            self.status.config(text=f"已清除 {len(removed)} 則警示")
+
+    def mark_dirty(self, tab):
+        """只從資料模型重繪，不連網"""
+        self.refresh_bus.render(tab)
+
+    def process_results(self):
+        """唯一的元件更新入口：取出背景結果與推播 tick 後重繪受影響的分頁"""
+        telemetry = self.telemetry
+        telemetry.heartbeat(UI_POLL_INTERVAL / 1000)
+        telemetry.gauge("queue", self.worker.jobs.qsize())
+        telemetry.gauge("outstanding", self.worker.pending())
+        telemetry.gauge("results", self.worker.results.qsize())
+        telemetry.gauge("coalesced", self.refresh_bus.requested - self.refresh_bus.dispatched)
+        telemetry.gauge("inflight_skipped", self.refresh_bus.skipped)
+        with telemetry.timer("drain"):
+            self.worker.drain()
+            self.flush_ticks()
+        for priority, force, tabs in self.refresh_bus.take_fetch():
+            self.dispatch_refresh(tabs, priority, force)
+        if self.bar_store:
+            if (self.show_indicators.get() and self.bar_store.version != self._indicators_version
+                    and time.perf_counter() - self._last_indicators >= INDICATOR_MIN_INTERVAL):
+                self.update_indicators()
+            if self.show_sparklines.get() and self.bar_store.version != self._sparkline_version:
+                self._sparkline_version = self.bar_store.version
+                for tab in self.visible_tabs():
+                    self.mark_dirty(tab)
+        if (self.positions and self.positions.version != self._positions_version
+                and time.perf_counter() - self._last_positions >= POSITIONS_MIN_INTERVAL):
+            self.update_positions()
+        for tab in self.refresh_bus.take_render():
+            if tab.winfo_exists():
+                with telemetry.timer("render"):
+                    tab.render()
+        if self._refresh_pending and not self.refresh_bus.pending() and not self.worker.pending():
+            self._refresh_pending = False
+            self.status.config(text=f"全部數據已刷新（{self.describe_markets()}）")
+        if (self._snapshot_dirty and not self.worker.pending()
+                and time.time() - self._last_snapshot >= SNAPSHOT_MIN_INTERVAL):
+            # 一輪抓取結束後交給工作區在背景寫入
+            self._snapshot_dirty = False
+            self._last_snapshot = time.time()
+            self.store.save_quotes(self.quote_engine.cache.entries())
+        self.after(UI_POLL_INTERVAL, self.process_results)
+
+    def update_store_status(self):
+        """背景寫入失敗時會自動重試，狀態列顯示原因，寫入成功後告知"""
+        error = self.store.write_error
+        if error != self._store_error:
+            if error:
+                self.status.config(text=f"工作區寫入失敗，{self.store.failures} 次重試中：{error}")
+            elif self._store_error:
+                self.status.config(text="工作區變更已寫入")
+            self._store_error = error
+
+    def visible_tabs(self):
+        """每個窗格目前顯示的分頁"""
+        return [tab for side in ["left", "right"] if (tab := self.get_current_tab(side))]
+
     def refresh_all(self):
-        for side in ["left", "right"]:
-            for tab in self.panes[side]["tabs"].values():
-                tab.refresh_data()
-        self.status.config(text="全部數據已刷新")
+        # 只抓取兩個窗格正在顯示的分頁，跨窗格去重後每檔只抓一次
+        visible = self.visible_tabs()
+        self.request_refresh(visible, force=True)
+        if PREFETCH_HIDDEN_TABS:
+            hidden = [tab for tab in self.all_tabs() if tab not in visible]
+            self.request_refresh(hidden, priority=PRIORITY_LOW)
+        self._refresh_pending = True
+        self.status.config(text="刷新中...")
 
     def auto_refresh(self):
-        self.refresh_all()
-        self.after(REFRESH_INTERVAL, self.auto_refresh)
+        """讓報價來源追蹤顯示中的代碼；輪詢來源依排程只抓取到期的代碼"""
+        with self.telemetry.timer("auto_refresh"):
+            self.feed.subscribe(self.tracked_symbols(self.visible_tabs()))
+        self.after(REFRESH_TICK, self.auto_refresh)
+
+    def toggle_stats(self):
+        if self._stats_job:
+            self.after_cancel(self._stats_job)
+            self._stats_job = None
+        if self.show_stats.get():
+            self.stats_panel.pack(side=tk.BOTTOM, fill=tk.X, after=self.status)
+            self.update_stats()
+        else:
+            self.stats_panel.pack_forget()
+
+    def update_stats(self):
+        """顯示時每 STATS_INTERVAL 毫秒整理一次統計"""
+        self.stats_panel.config(text=format_stats(self.telemetry.snapshot(), self.quote_engine.cache,
+                                                  self.providers.snapshot() if self.providers else None))
+        self._stats_job = self.after(STATS_INTERVAL, self.update_stats)
+
+    def toggle_profiling(self):
+        if self.profiling.get():
+            self.profiler.start()
+            self.status.config(text="效能剖析中...")
+        elif path := self.profiler.stop():
+            self.status.config(text=f"剖析結果已寫入 {path}")
+
+    def toggle_indicators(self):
+        show = self.show_indicators.get()
+        for tab in self.all_tabs():
+            if tab.materialized:
+                tab.show_indicator_columns(show)
+        if show:
+            self.load_visible_bars()
+
+    def toggle_sparklines(self):
+        show = self.show_sparklines.get()
+        for tab in self.all_tabs():
+            if tab.materialized:
+                tab.show_sparkline_column(show)
+                self.mark_dirty(tab)
+        if show:
+            self.load_visible_bars()
+
+    def refresh_bars(self):
+        """顯示指標欄位或走勢圖時定期補抓歷史與當日分K；平常只靠每次刷新附加的報價"""
+        if self.show_indicators.get() or self.show_sparklines.get():
+            self.load_visible_bars()
+        self.after(BAR_REFRESH_INTERVAL * 1000, self.refresh_bars)
+
+    def load_visible_bars(self):
+        if self.bar_store and not self.offline:
+            self.worker.submit(self.load_bars, self.quote_engine.collect_symbols(self.visible_tabs()),
+                               priority=PRIORITY_LOW, callback=self.bars_loaded)
+
+    def load_bars(self, symbols):
+        """在背景執行緒批次抓取：日K每天每檔只抓一次，當日分K每次都抓；回傳 {代碼: 錯誤}"""
+        daily = [s for s in symbols if self.bar_store.needs_daily(s)]
+        errors = {}
+        for guard, wanted, load in ((self.daily_bars, daily, self.bar_store.load_daily),
+                                    (self.intraday_bars, symbols, self.bar_store.load_intraday)):
+            for symbol, bars in guard(wanted).items():
+                if bars.get('error'):
+                    errors[symbol] = bars['error']
+                else:
+                    load(symbol, bars)
+        return errors
+
+    def bars_loaded(self, errors):
+        if errors:
+            reason = next(iter(errors.values()))
+            self.status.config(text=f"K線抓取失敗：{len(errors)} 檔（{reason}）")
+
+    def update_indicators(self):
+        """所有代碼的指標一次算完，再分給各分頁"""
+        self._last_indicators = time.perf_counter()
+        self._indicators_version = self.bar_store.version
+        rows, indicators = self.bar_store.indicators()
+        for tab in self.all_tabs():
+            if tab.apply_indicators(rows, indicators):
+                self.mark_dirty(tab)
+
+    def update_positions(self):
+        """持股合計一次向量化算完，再分給各分頁與窗格的摘要列"""
+        self._last_positions = time.perf_counter()
+        self._positions_version = self.positions.version
+        totals = self.positions.totals()
+        for tab in self.all_tabs():
+            text = format_totals(totals["tabs"].get(tab.filename), "占窗格")
+            if text != tab.totals_text:
+                tab.show_totals(text)
+        for side in ["left", "right"]:
+            text = format_totals(totals["panes"].get(side), "占總額")
+            self.panes[side]["summary"].config(text=f"{side.upper()} 窗格  {text}" if text else f"{side.upper()} 窗格")
+
+    def update_replay_status(self):
+        """重播日誌時在狀態列顯示目前重播到的時間"""
+        feed = self.feed
+        if feed.finished:
+            self.status.config(text=f"重播結束：{feed.replayed} 筆報價")
+            return
+        if feed.position is not None:
+            speed = next((label for label, value in REPLAY_SPEEDS.items() if value == feed.speed), f"{feed.speed:g}×")
+            state = "已暫停" if feed.paused else speed
+            self.status.config(text=f"重播 {datetime.fromtimestamp(feed.position):%m/%d %H:%M:%S}（{state}）")
+        self.after(REPLAY_STATUS_INTERVAL, self.update_replay_status)
+
+    def describe_markets(self):
+        states = self.scheduler.describe(self.quote_engine.collect_symbols(self.visible_tabs()))
+        text = " / ".join(f"{exchange} {STATE_LABELS[state]}" for exchange, state in states.items())
+        if remaining := self.fetch_guard.breaker.remaining():
+            text += f"，資料來源暫停 {remaining:.0f} 秒"
+        return text
+
+    def on_close(self):
+        if path := self.profiler.stop():
+            print(f"剖析結果已寫入 {path}")
+        self.feed.stop()
+        self.worker.shutdown()
+        if self.providers:
+            self.providers.shutdown()
+        if self.journal:
+            self.journal.close()
+        self.store.save_quotes(self.quote_engine.cache.entries())
+        if lost := self.store.close():  # 等待尚未寫入的變更完成
+            messagebox.showwarning("工作區", f"工作區資料庫一直被鎖定，{lost} 項變更未能寫入")
+        self.destroy()
 
     def load_config(self):
-        if not os.path.exists(CONFIG_FILE):
-            return
-        
         try:
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-                for side in ["left", "right"]:
-                    for filename, tab_name in config.get(side, {}).items():
-                        self.add_existing_tab(side, filename, tab_name)
-        except Exception as e:
+            if self.store.is_empty() and self.store.import_legacy(LEGACY_CONFIG_FILE):
+                self.status.config(text=f"已從 {LEGACY_CONFIG_FILE} 匯入分頁")
+            for side, tabs in self.store.load_tabs().items():
+                for tab in tabs:
+                    self.add_existing_tab(side, tab["tab_id"], tab["name"], tab["symbols"],
+                                          tab["sort_column"], tab["sort_reverse"])
+        except sqlite3.Error as e:
             messagebox.showerror("錯誤", f"配置讀取失敗：{str(e)}")
-
-    def add_existing_tab(self, side, filename, tab_name):
-        new_tab = PortfolioTab(self.panes[side]["notebook"], filename, side, self)
+        # 所有分頁建立後先套用快取報價，再只建立顯示中的分頁元件；抓取留到第一次繪製之後
+        visible = self.visible_tabs()
+        self.on_quotes(self.quote_engine.cached(self.quote_engine.collect_symbols(visible))[0])
+        for tab in visible:
+            tab.materialize()
+
+    def add_existing_tab(self, side, filename, tab_name, stocks, sort_column, sort_reverse):
+        """分頁先以佔位框架加入，選取時才建立元件"""
+        new_tab = PortfolioTab(self.panes[side]["notebook"], filename, side, self,
+                               stocks, sort_column, sort_reverse)
         self.panes[side]["notebook"].add(new_tab, text=tab_name)
         self.panes[side]["tabs"][filename] = new_tab
 
-    def save_config(self):
-        config = {
-            "left": {tab.filename: self.panes["left"]["notebook"].tab(tab, "text") for tab in self.panes["left"]["tabs"].values()},
-            "right": {tab.filename: self.panes["right"]["notebook"].tab(tab, "text") for tab in self.panes["right"]["tabs"].values()}
-        }
+    def sync_workspace(self):
+        """其他視窗改過工作區時重新載入；本視窗還有變更沒寫入時等下一輪，寫入時會先合併"""
         try:
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(config, f, ensure_ascii=False)
-        except Exception as e:
-            messagebox.showerror("錯誤", f"配置保存失敗：{str(e)}")
+            if self.store.external_changes() and not self.store.has_pending():
+                self.apply_workspace(self.store.load_tabs())
+        except sqlite3.Error as e:
+            print(f"工作區同步失敗：{str(e)}")
+        self.update_store_status()
+        self.after(WORKSPACE_SYNC_INTERVAL, self.sync_workspace)
+
+    def apply_workspace(self, layout):
+        """把工作區的分頁與股票清單套用到畫面：新增、刪除、改名，股票清單不同的分頁重新抓取"""
+        changed = []
+        for side in ["left", "right"]:
+            notebook, tabs = self.panes[side]["notebook"], self.panes[side]["tabs"]
+            wanted = {tab["tab_id"]: tab for tab in layout.get(side, [])}
+            for filename in [f for f in tabs if f not in wanted]:
+                notebook.forget(tabs.pop(filename))
+                self.alerts.set_tab_symbols(filename, [])
+                if self.positions:
+                    self.positions.remove_tab(filename)
+            for filename, info in wanted.items():
+                tab = tabs.get(filename)
+                if tab is None:
+                    self.add_existing_tab(side, filename, info["name"], info["symbols"],
+                                          info["sort_column"], info["sort_reverse"])
+                    continue
+                if notebook.tab(tab, "text") != info["name"]:
+                    notebook.tab(tab, text=info["name"])
+                if tab.stocks != info["symbols"]:
+                    tab.load_stocks(info["symbols"])
+                    self.mark_dirty(tab)
+                    changed.append(tab)
+        if changed:
+            self.request_refresh(changed)
+            self.status.config(text=f"已同步其他視窗的變更：{len(changed)} 個分頁")
+
+    def save_config(self):
+        """分頁配置交給工作區在背景寫入"""
+        self.store.save_layout({
+            side: [(tab.filename, self.panes[side]["notebook"].tab(tab, "text"))
+                   for tab in self.panes[side]["tabs"].values()]
+            for side in ["left", "right"]
+        })
 
 if __name__ == "__main__":
-    try:
-        import yfinance
-    except ImportError:
+    # 只確認有安裝，實際匯入（連帶 pandas）留到視窗出現後在背景進行
+    if importlib.util.find_spec("yfinance") is None:
         print("請先安裝套件：pip install yfinance")
         exit()
     
-    app = DualPaneStockApp()
+    parser = argparse.ArgumentParser(description="雙窗看股系統")
+    parser.add_argument("--feed", choices=["poll", "stream", "daemon", "replay"], default=FEED_MODE, help="報價來源")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="重播報價日誌（journal 目錄或其中的 .bin 檔）或錄下的 tick 檔（隱含 --feed replay）")
+    parser.add_argument("--speed", type=float, default=1.0, help="重播倍速，0 為全速")
+    parser.add_argument("--replay-start", metavar="HH:MM[:SS]", help="重播日誌時直接跳到這個時間點")
+    parser.add_argument("--record", metavar="FILE", help="把收到的報價錄成可重播的檔案")
+    parser.add_argument("--no-journal", action="store_true", help="不把收到的報價寫進 journal 目錄")
+    parser.add_argument("--shared", action="store_true",
+                        help="同一目錄的多個視窗共用抓取：一個視窗抓取，其他視窗從共用報價表讀取")
+    parser.add_argument("--hedge", action="store_true", default=HEDGE_REQUESTS,
+                        help="主要報價來源太慢時同時向下一個來源請求，採用先回來的報價")
+    parser.add_argument("--quotes-csv", metavar="FILE", default=QUOTE_CSV,
+                        help="本機報價檔（symbol,price,prev_close[,volume]），檔中的代碼優先採用")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_FILE, metavar="FILE",
+                        help="以 cProfile 剖析 UI 主執行緒，關閉時寫入檔案")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="印出啟動各階段時間後結束；第一次繪製超過目標時結束碼為 1")
+    args = parser.parse_args()
+    if args.feed == "replay" and not args.replay:
+        parser.error("--feed replay 需要以 --replay 指定檔案")
+    if args.shared and (args.replay or args.feed in ("replay", "daemon")):
+        parser.error("--shared 只能搭配 poll 或 stream 報價來源")
+
+    app = DualPaneStockApp(
+        feed_mode="replay" if args.replay else args.feed,
+        replay_file=args.replay, replay_speed=args.speed, record_file=args.record,
+        profile_file=args.profile, shared=args.shared, replay_start=args.replay_start,
+        journal=not args.no_journal, hedge=args.hedge, quotes_csv=args.quotes_csv
+    )
+    if args.startup_report:
+        app.after(0, app.report_startup, time.perf_counter() + STARTUP_REPORT_TIMEOUT)
     app.mainloop()
+    exit(app.exit_code)
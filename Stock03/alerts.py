@@ -0,0 +1,188 @@
+"""價格警示：規則依代碼建立索引，每筆報價只檢查該代碼（與所屬分頁）的規則"""
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from refresh_scheduler import local_date
+
+ALERT_KINDS = {
+    "price_above": "價格突破",
+    "price_below": "價格跌破",
+    "move_pct": "漲跌幅超過 %",
+    "gap_pct": "跳空超過 %",
+    "volume_spike": "成交量達均量倍數",
+}
+CROSS_KINDS = ("price_above", "price_below")  # 需要先看過一次另一側才算穿越
+
+
+class AlertRule:
+    """symbol 與 tab 擇一：個股規則或套用到整個分頁的規則"""
+
+    def __init__(self, kind, threshold, symbol=None, tab=None, rule_id=None):
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"未知的警示類型：{kind}")
+        self.kind = kind
+        self.threshold = float(threshold)
+        self.symbol = symbol
+        self.tab = tab
+        self.rule_id = rule_id
+
+    def describe(self):
+        return f"{ALERT_KINDS[self.kind]} {self.threshold:g}"
+
+    def to_dict(self):
+        return {"kind": self.kind, "threshold": self.threshold, "symbol": self.symbol, "tab": self.tab}
+
+
+class Alert:
+    __slots__ = ("time", "symbol", "rule", "value")
+
+    def __init__(self, time, symbol, rule, value):
+        self.time = time
+        self.symbol = symbol
+        self.rule = rule
+        self.value = value
+
+    def message(self):
+        return f"{self.symbol} {self.rule.describe()}（{self.value:.2f}）"
+
+
+class AlertEngine:
+    """條件由假轉真時觸發一次，條件解除後才會再次觸發
+
+    avg_volume(symbol) 提供成交量倍數規則所需的日均量（例如 BarStore.average_volume）。
+    """
+
+    def __init__(self, avg_volume=None):
+        self.avg_volume = avg_volume
+        self.rules = {}  # rule_id -> AlertRule
+        self.by_symbol = {}  # symbol -> [AlertRule]
+        self.by_tab = {}  # tab -> [AlertRule]
+        self.symbol_tabs = {}  # symbol -> 所屬分頁，分頁規則經由這裡找到
+        self.active = {}  # (rule_id, symbol) -> 上次條件是否成立
+        self.opens = {}  # symbol -> (日期, 開盤價)，報價帶有開盤價時記下，跳空規則用
+        self.evaluated = 0  # 累計檢查的規則數
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, rule):
+        with self._lock:
+            rule.rule_id = next(self._ids)
+            self.rules[rule.rule_id] = rule
+            if rule.symbol:
+                self.by_symbol.setdefault(rule.symbol, []).append(rule)
+            else:
+                self.by_tab.setdefault(rule.tab, []).append(rule)
+        return rule
+
+    def remove(self, rule_id):
+        with self._lock:
+            rule = self.rules.pop(rule_id, None)
+            if rule is None:
+                return
+            index = self.by_symbol if rule.symbol else self.by_tab
+            key = rule.symbol or rule.tab
+            index[key] = [r for r in index[key] if r.rule_id != rule_id]
+            if not index[key]:
+                del index[key]
+            self.active = {k: v for k, v in self.active.items() if k[0] != rule_id}
+
+    def rules_for(self, symbol):
+        """該代碼適用的所有規則（個股規則加上所屬分頁的規則）"""
+        rules = list(self.by_symbol.get(symbol, ()))
+        for tab in self.symbol_tabs.get(symbol, ()):
+            rules.extend(self.by_tab.get(tab, ()))
+        return rules
+
+    def set_tab_symbols(self, tab, symbols):
+        """分頁的股票清單變動時更新 symbol -> 分頁 的對照"""
+        with self._lock:
+            for tabs in self.symbol_tabs.values():
+                tabs.discard(tab)
+            for symbol in symbols:
+                self.symbol_tabs.setdefault(symbol, set()).add(tab)
+            self.symbol_tabs = {s: tabs for s, tabs in self.symbol_tabs.items() if tabs}
+
+    def evaluate(self, quotes, now=None):
+        """檢查一批報價，回傳新觸發的警示；快照或抓取失敗的報價不檢查"""
+        now = now or time.time()
+        alerts = []
+        with self._lock:
+            for symbol, quote in quotes.items():
+                if not quote or quote.get('price') is None or quote.get('stale') or quote.get('error'):
+                    continue
+                if symbol not in self.by_symbol and symbol not in self.symbol_tabs:
+                    continue
+                for rule in self.rules_for(symbol):
+                    self.evaluated += 1
+                    value = self._value(rule.kind, symbol, quote)
+                    if value is None:
+                        continue
+                    hit = self._condition(rule, value)
+                    key = (rule.rule_id, symbol)
+                    previous = self.active.get(key)
+                    self.active[key] = hit
+                    if hit and (previous is False or previous is None and rule.kind not in CROSS_KINDS):
+                        alerts.append(Alert(now, symbol, rule, value))
+        return alerts
+
+    def _value(self, kind, symbol, quote):
+        price = quote['price']
+        prev_close = quote.get('prev_close')
+        if kind in CROSS_KINDS:
+            return price
+        if kind == "move_pct":
+            return (price / prev_close - 1) * 100 if prev_close else None
+        if kind == "gap_pct":
+            day = local_date(symbol, quote.get('time'))
+            if quote.get('open'):
+                self.opens[symbol] = (day, quote['open'])
+            opened = self.opens.get(symbol)
+            if not opened or opened[0] != day or not prev_close:
+                return None  # 還不知道當日開盤價（如推播報價沒有附上）就先不判斷
+            return (opened[1] / prev_close - 1) * 100
+        if kind == "volume_spike":
+            average = self.avg_volume(symbol) if self.avg_volume else None
+            return quote['volume'] / average if quote.get('volume') and average else None
+        return None
+
+    @staticmethod
+    def _condition(rule, value):
+        if rule.kind == "price_above":
+            return value >= rule.threshold
+        if rule.kind == "price_below":
+            return value <= rule.threshold
+        if rule.kind == "volume_spike":
+            return value >= rule.threshold
+        return abs(value) >= rule.threshold  # 漲跌幅與跳空不分方向
+
+    def save(self, path):
+        with self._lock:
+            data = [rule.to_dict() for rule in self.rules.values()]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for item in data:
+                self.add(AlertRule(item["kind"], item["threshold"], item.get("symbol"), item.get("tab")))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"警示規則讀取失敗：{path} - {str(e)}")
+        return len(self.rules)
+
+
+def append_alert_log(path, alerts):
+    """觸發紀錄以 tab 分隔附加到文字檔"""
+    with open(path, "a", encoding="utf-8") as f:
+        for alert in alerts:
+            f.write(f"{datetime.fromtimestamp(alert.time):%Y-%m-%d %H:%M:%S}\t{alert.symbol}\t"
+                    f"{alert.rule.describe()}\t{alert.value:.4f}\n")
@@ -0,0 +1,240 @@
+"""日K與盤中價位存放區：所有代碼共用 NumPy 矩陣（一列一檔、最新在最右），指標一次對全部代碼向量化計算"""
+import threading
+
+import numpy as np
+
+from refresh_scheduler import local_date
+
+DAILY_DAYS = 60  # 每檔保留的日K數，20日漲跌與 RSI 需要
+INTRADAY_POINTS = 400  # 每檔保留的盤中價位數
+RSI_PERIOD = 14
+
+
+def _shift_left(matrix, row, n):
+    """把一列往左移 n 格，右邊補 NaN"""
+    matrix[row, :-n] = matrix[row, n:]
+    matrix[row, -n:] = np.nan
+
+
+class BarStore:
+    """背景執行緒載入歷史K線、主執行緒逐筆附加報價，所有存取都在鎖內"""
+
+    def __init__(self, daily_days=DAILY_DAYS, intraday_points=INTRADAY_POINTS):
+        self.daily_days = daily_days
+        self.intraday_points = intraday_points
+        self.rows = {}  # symbol -> 列號
+        self.size = 0
+        self.high = self.low = self.close = self.volume = np.full((0, daily_days), np.nan)
+        self.last_day = np.zeros(0, dtype=np.int64)  # 每列最右一根日K的日期序號，0 表示沒有
+        self.tick_price = self.tick_volume = np.full((0, intraday_points), np.nan)
+        self.tick_count = np.zeros(0, dtype=np.int64)
+        self.tick_day = np.zeros(0, dtype=np.int64)  # 盤中價位屬於哪一天
+        # 當日累計的 Σ價位×成交量 與 Σ成交量，盤中價位滿了丟掉舊的也不受影響，VWAP 一律從開盤算起
+        self.turnover = self.traded = self.last_volume = np.zeros(0)
+        self.daily_loaded = {}  # symbol -> 哪一天載入過日K，每天只抓一次
+        self.versions = {}  # symbol -> 資料版本，供畫面判斷是否需要重畫
+        self.version = 0  # 整體版本，指標快取用
+        self._indicators = None
+        self._indicators_version = -1
+        self._lock = threading.Lock()
+
+    def _grow(self):
+        """容量加倍，避免每加一檔就重新配置整個矩陣"""
+        capacity = max(16, len(self.last_day) * 2)
+
+        def grown(matrix, fill):
+            new = np.full((capacity,) + matrix.shape[1:], fill, dtype=matrix.dtype)
+            new[:len(matrix)] = matrix
+            return new
+
+        self.high, self.low, self.close, self.volume = (
+            grown(m, np.nan) for m in (self.high, self.low, self.close, self.volume))
+        self.tick_price, self.tick_volume = (grown(m, np.nan) for m in (self.tick_price, self.tick_volume))
+        self.last_day = grown(self.last_day, 0)
+        self.tick_count = grown(self.tick_count, 0)
+        self.tick_day = grown(self.tick_day, 0)
+        self.turnover, self.traded, self.last_volume = (
+            grown(m, 0.0) for m in (self.turnover, self.traded, self.last_volume))
+
+    def _row(self, symbol):
+        row = self.rows.get(symbol)
+        if row is None:
+            if self.size == len(self.last_day):
+                self._grow()
+            row = self.rows[symbol] = self.size
+            self.size += 1
+        return row
+
+    def _touch(self, symbol):
+        self.versions[symbol] = self.versions.get(symbol, 0) + 1
+        self.version += 1
+
+    def needs_daily(self, symbol, today=None):
+        return self.daily_loaded.get(symbol) != (today or local_date(symbol))
+
+    def load_daily(self, symbol, bars):
+        """以 fetch_bars 的日K取代該列歷史，靠右對齊"""
+        closes = bars["close"][-self.daily_days:]
+        n = len(closes)
+        if not n:
+            return
+        with self._lock:
+            row = self._row(symbol)
+            for matrix, values in ((self.high, bars["high"]), (self.low, bars["low"]),
+                                   (self.close, bars["close"]), (self.volume, bars["volume"])):
+                matrix[row] = np.nan
+                matrix[row, -n:] = values[-n:]
+            self.last_day[row] = local_date(symbol, bars["time"][-1])
+            self.daily_loaded[symbol] = local_date(symbol)
+            self._touch(symbol)
+
+    def load_intraday(self, symbol, bars):
+        """以當日分K的典型價與累計量作為盤中起點，VWAP 才會從開盤算起"""
+        day = local_date(symbol, bars["time"][-1])
+        times = bars["time"]
+        start = next(i for i, t in enumerate(times) if local_date(symbol, t) == day)
+        typical = ((bars["high"] + bars["low"] + bars["close"]) / 3)[start:]
+        traded = np.nan_to_num(bars["volume"][start:])
+        volume = traded.cumsum()
+        turnover = np.nansum(typical * traded)
+        typical = typical[-self.intraday_points:]
+        n = len(typical)
+        with self._lock:
+            row = self._row(symbol)
+            self.tick_price[row] = np.nan
+            self.tick_volume[row] = np.nan
+            self.tick_price[row, :n] = typical
+            self.tick_volume[row, :n] = volume[-n:]
+            self.tick_count[row] = n
+            self.tick_day[row] = day
+            self.turnover[row], self.traded[row] = turnover, volume[-1]
+            self.last_volume[row] = volume[-1]
+            self._touch(symbol)
+
+    def append_quotes(self, quotes, timestamp=None):
+        """每次刷新把最新價格附加進去：同一天更新最右一根，換日則整列左移"""
+        with self._lock:
+            for symbol, quote in quotes.items():
+                price = (quote or {}).get('price')
+                if price is None or quote.get('stale') or quote.get('error'):
+                    continue
+                day = local_date(symbol, quote.get('time') or timestamp)
+                row = self._row(symbol)
+                if day < self.last_day[row]:
+                    continue
+                new_day = day > self.last_day[row]
+                if new_day:
+                    if self.last_day[row]:
+                        for matrix in (self.high, self.low, self.close, self.volume):
+                            _shift_left(matrix, row, 1)
+                    self.high[row, -1] = self.low[row, -1] = price
+                    self.last_day[row] = day
+                if day > self.tick_day[row]:
+                    self.tick_price[row] = self.tick_volume[row] = np.nan
+                    self.tick_count[row] = 0
+                    self.tick_day[row] = day
+                    self.turnover[row] = self.traded[row] = self.last_volume[row] = 0.0
+                self.close[row, -1] = price
+                self.high[row, -1] = np.fmax(self.high[row, -1], price)
+                self.low[row, -1] = np.fmin(self.low[row, -1], price)
+                if quote.get('volume') is not None:
+                    self.volume[row, -1] = quote['volume']
+                if self._append_tick(row, price, quote.get('volume')) or new_day:
+                    self._touch(symbol)  # 價位沒變就不動版本，走勢圖也不必重畫
+
+    def _append_tick(self, row, price, volume):
+        count = self.tick_count[row]
+        if count and self.tick_price[row, count - 1] == price and (
+                volume is None or self.tick_volume[row, count - 1] == volume):
+            return False
+        if count == self.intraday_points:
+            # 滿了就丟掉最舊的四分之一，平攤搬移成本
+            drop = self.intraday_points // 4
+            _shift_left(self.tick_price, row, drop)
+            _shift_left(self.tick_volume, row, drop)
+            count -= drop
+        self.tick_price[row, count] = price
+        self.tick_volume[row, count] = np.nan if volume is None else volume
+        self.tick_count[row] = count + 1
+        if volume is not None:
+            # 累計量的增量算在這個價位；量變少（資料來源修正）時只重新對齊不計入
+            traded = volume - self.last_volume[row]
+            if traded > 0:
+                self.turnover[row] += price * traded
+                self.traded[row] += traded
+            self.last_volume[row] = volume
+        return True
+
+    def intraday(self, symbol):
+        """某檔當日的盤中價位（複本）"""
+        with self._lock:
+            row = self.rows.get(symbol)
+            if row is None:
+                return np.empty(0)
+            return self.tick_price[row, :self.tick_count[row]].copy()
+
+    def average_volume(self, symbol, days=20):
+        """不含當日的日均量；沒有歷史時回傳 None"""
+        with self._lock:
+            row = self.rows.get(symbol)
+            if row is None:
+                return None
+            history = self.volume[row, -days - 1:-1]
+            history = history[~np.isnan(history)]
+            return float(history.mean()) if len(history) else None
+
+    def indicators(self):
+        """回傳 (symbol -> 列號, {指標: 每列一值的陣列})；資料沒變就沿用上次結果"""
+        with self._lock:
+            if self._indicators_version != self.version:
+                self._indicators = (dict(self.rows), compute_indicators(
+                    self.high[:self.size], self.low[:self.size], self.close[:self.size],
+                    self.turnover[:self.size], self.traded[:self.size]))
+                self._indicators_version = self.version
+            return self._indicators
+
+
+def _change(close, days):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (close[:, -1] / close[:, -1 - days] - 1) * 100
+
+
+def rsi(close, period=RSI_PERIOD):
+    """Wilder RSI；迴圈只走時間軸，每一步都同時處理所有代碼，歷史不足的列為 NaN"""
+    diff = np.diff(close, axis=1)
+    valid = ~np.isnan(diff)
+    gain = np.where(diff > 0, diff, 0.0)
+    loss = np.where(diff < 0, -diff, 0.0)
+    n = len(close)
+    avg_gain, avg_loss = np.zeros(n), np.zeros(n)
+    count = np.zeros(n, dtype=np.int64)
+    for t in range(diff.shape[1]):
+        step = valid[:, t]
+        count += step
+        seeding = step & (count <= period)
+        avg_gain[seeding] += gain[seeding, t] / period
+        avg_loss[seeding] += loss[seeding, t] / period
+        smoothing = step & (count > period)
+        avg_gain[smoothing] = (avg_gain[smoothing] * (period - 1) + gain[smoothing, t]) / period
+        avg_loss[smoothing] = (avg_loss[smoothing] * (period - 1) + loss[smoothing, t]) / period
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.where(avg_loss > 0, 100 - 100 / (1 + avg_gain / avg_loss), 100.0)
+    return np.where(count >= period, result, np.nan)
+
+
+def vwap(turnover, traded):
+    """當日 Σ價位×成交量 / Σ成交量；沒有量的列為 NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(traded > 0, turnover / traded, np.nan)
+
+
+def compute_indicators(high, low, close, turnover, traded):
+    """每個指標都是整個矩陣一次運算，加欄位不會讓每檔的成本倍增"""
+    return {
+        "vwap": vwap(turnover, traded),
+        "day_low": low[:, -1],
+        "day_high": high[:, -1],
+        "chg5": _change(close, 5),
+        "chg20": _change(close, 20),
+        "rsi": rsi(close),
+    }
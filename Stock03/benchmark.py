@@ -0,0 +1,304 @@
+"""效能量測：以本機假報價伺服器取代 Yahoo，量測啟動、刷新、排序、換位與新增股票驗證，結果寫成 JSON
+
+    python benchmark.py --tabs 4 --symbols 50 --latency 0.05 --output bench.json
+    python benchmark.py --compare bench_old.json          # 與上一版比較，變慢超過門檻時回傳 1
+    python benchmark.py --replay journal                  # 另以錄下的報價日誌全速重播，量測畫面更新
+
+需要顯示環境（Linux 無桌面時可用 xvfb-run python benchmark.py）。
+每次在暫存目錄建立新的工作區，不會動到目前目錄的 workspace.db。
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tkinter as tk
+from datetime import datetime
+
+import quote_service
+from fake_quote_server import FakeQuoteServer
+from quote_journal import JOURNAL_DIR, journal_files
+from view_model import SORT_COLUMNS
+from workspace_store import WorkspaceStore
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULT_FILE = "benchmark_results.json"
+PUMP_TIMEOUT = 60  # 等待畫面或抓取完成的上限（秒）
+REGRESSION_RATIO = 1.2  # 中位數比基準慢超過此倍數視為退步
+
+
+class Recorder:
+    """每項量測記下多次執行的毫秒數"""
+
+    def __init__(self):
+        self.runs = {}
+
+    def add(self, name, seconds):
+        self.runs.setdefault(name, []).append(seconds * 1000)
+
+    def summary(self):
+        return {name: {"unit": "ms", "runs": [round(v, 3) for v in values],
+                       "median": round(statistics.median(values), 3),
+                       "min": round(min(values), 3), "max": round(max(values), 3)}
+                for name, values in self.runs.items()}
+
+
+def make_workspace(tabs, symbols, path="workspace.db"):
+    """重新建立工作區：tabs 個分頁（左右窗格輪流放），每個分頁 symbols 檔互不重複的代碼"""
+    for name in glob.glob(f"{path}*"):
+        os.remove(name)  # 連同上次留下的 -wal、-shm 檔
+    store = WorkspaceStore(path)
+    layout = {"left": [], "right": []}
+    for i in range(tabs):
+        tab_id = f"B{i + 1}.txt"
+        layout["left" if i % 2 == 0 else "right"].append((tab_id, f"B{i + 1}"))
+        store.set_symbols(tab_id, [f"T{i:02d}S{j:04d}" for j in range(symbols)])
+    store.save_layout(layout)
+    store.close()
+
+
+def prepare_directory(path):
+    """附上代碼清單並把快取標成最新，避免啟動時連網下載"""
+    bundled = os.path.join(BASE_DIR, "symbols.csv")
+    shutil.copy(bundled, os.path.join(path, "symbols.csv"))
+    shutil.copy(bundled, os.path.join(path, "symbols_cache.csv"))
+
+
+def pump(app, done, timeout=PUMP_TIMEOUT):
+    """執行 Tk 事件迴圈直到 done() 成立，回傳經過秒數"""
+    start = time.perf_counter()
+    while not done():
+        app.update()
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("等待逾時")
+        time.sleep(0.001)
+    return time.perf_counter() - start
+
+
+def render_dirty(app):
+    """立即重繪待更新的分頁（不等下一次 process_results），回傳重繪的分頁數"""
+    dirty = app.refresh_bus.take_render()
+    for tab in dirty:
+        tab.render()
+    app.update_idletasks()
+    return len(dirty)
+
+
+def refresh_done(app):
+    return not app._refresh_pending and not app.refresh_bus.pending() and not app.worker.pending()
+
+
+def first_quotes(app):
+    tabs = app.visible_tabs()
+    return bool(tabs) and all(tab.materialized and tab.tree.get_children() for tab in tabs)
+
+
+def bench_cold_start(ST03, recorder, args):
+    """從建立視窗到第一次繪製、顯示第一批報價、到第一輪刷新完成；每次都用全新的工作區"""
+    for _ in range(args.repeat):
+        make_workspace(args.tabs, args.symbols)
+        start = time.perf_counter()
+        app = ST03.DualPaneStockApp()
+        recorder.add("cold_start.window", time.perf_counter() - start)
+        pump(app, lambda: "first_paint" in app.startup.marks)
+        recorder.add("cold_start.first_paint", time.perf_counter() - start)
+        pump(app, lambda: first_quotes(app))
+        recorder.add("cold_start.first_quotes", time.perf_counter() - start)
+        pump(app, lambda: refresh_done(app))
+        recorder.add("cold_start.refreshed", time.perf_counter() - start)
+        app.on_close()
+
+
+def bench_refresh_all(app, recorder, args):
+    """顯示中分頁的完整刷新（強制重抓）到重繪完成"""
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        app.refresh_all()
+        pump(app, lambda: refresh_done(app))
+        render_dirty(app)
+        recorder.add("refresh_all", time.perf_counter() - start)
+
+
+def bench_sort(app, recorder, args):
+    """在指定檔數的分頁切換排序欄位；超過 VIRTUAL_LIST_THRESHOLD 的分頁會是虛擬清單"""
+    notebook = app.panes["left"]["notebook"]
+    for size in args.sort_sizes:
+        tab_id = f"sort_{size}.txt"
+        app.add_existing_tab("left", tab_id, f"sort_{size}", [f"X{size}S{j:05d}" for j in range(size)],
+                             "change_percent", True)
+        tab = app.panes["left"]["tabs"][tab_id]
+        notebook.select(tab)
+        pump(app, lambda: tab.materialized)
+        app.refresh_all()
+        pump(app, lambda: refresh_done(app))
+        render_dirty(app)
+        for _ in range(args.repeat):
+            for column in SORT_COLUMNS:
+                start = time.perf_counter()
+                tab.treeview_sort_column(column)
+                render_dirty(app)
+                recorder.add(f"sort.{size}", time.perf_counter() - start)
+
+
+def bench_move(app, recorder, args):
+    """選取一檔移到另一窗格再移回來，含兩個分頁的重繪"""
+    left, right = app.get_current_tab("left"), app.get_current_tab("right")
+    if not (left and right):
+        print("略過換位量測：需要左右窗格各有一個分頁（--tabs 至少 2）")
+        return
+    for run in range(args.repeat):
+        symbol = left.stocks[run % len(left.stocks)]
+        start = time.perf_counter()
+        left.tree.selection_set(symbol)
+        left.move_to_other_pane()
+        render_dirty(app)
+        right.tree.selection_set(symbol)
+        right.move_to_other_pane()
+        render_dirty(app)
+        recorder.add("move_round_trip", time.perf_counter() - start)
+        if symbol not in left.stocks:
+            raise RuntimeError(f"{symbol} 沒有移回原分頁")
+
+
+def bench_validate(app, recorder, args):
+    """新增股票的網路驗證：每次都是快取中沒有的代碼，另含一檔無效代碼"""
+    for run in range(args.repeat):
+        symbols = [f"V{run:02d}S{j:02d}" for j in range(args.validate_size)] + [f"ZZ{run:02d}"]
+        start = time.perf_counter()
+        valid, rejected = app.validate_add_stock(symbols)
+        recorder.add("validate_add_stock", time.perf_counter() - start)
+        if len(rejected) != 1:
+            print(f"驗證結果不如預期：{len(valid)} 檔有效、{len(rejected)} 檔無效")
+
+
+def bench_replay(ST03, recorder, args):
+    """以報價日誌全速驅動畫面（可重現的離線負載）：從第一次繪製到所有報價都套用並重繪完成
+
+    沒有指定 --replay 時使用前面幾項量測時錄下的日誌。
+    """
+    path = args.replay or JOURNAL_DIR
+    if not journal_files(path):
+        print(f"略過重播量測：{path} 沒有報價日誌")
+        return
+    for _ in range(args.repeat):
+        app = ST03.DualPaneStockApp(feed_mode="replay", replay_file=path, replay_speed=0)
+        try:
+            pump(app, lambda: "first_paint" in app.startup.marks)
+            start = time.perf_counter()
+            pump(app, lambda: app.feed.finished)
+            app._last_flush = 0
+            app.flush_ticks()  # 取出最後一批，不等下一個畫面週期
+            render_dirty(app)
+            recorder.add("replay", time.perf_counter() - start)
+            recorder.add("replay_per_1k_ticks", (time.perf_counter() - start) / max(app.feed.replayed, 1) * 1000)
+        finally:
+            app.on_close()
+
+
+def run(args):
+    server = FakeQuoteServer(latency=args.latency, error_rate=args.error_rate, seed=args.seed).start()
+    quote_service.QUOTE_SERVER_URL = server.url  # 報價引擎改抓本機假伺服器
+    recorder = Recorder()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="stockview_bench_")
+    try:
+        os.chdir(workdir)
+        prepare_directory(workdir)
+        start = time.perf_counter()
+        import ST03  # 匯入時間也算在量測內（yfinance 與 NumPy 在第一次繪製後才於背景載入）
+        recorder.add("import", time.perf_counter() - start)
+
+        bench_cold_start(ST03, recorder, args)
+
+        make_workspace(args.tabs, args.symbols)
+        app = ST03.DualPaneStockApp()
+        try:
+            pump(app, lambda: first_quotes(app) and refresh_done(app))
+            bench_refresh_all(app, recorder, args)
+            bench_move(app, recorder, args)
+            bench_validate(app, recorder, args)
+            bench_sort(app, recorder, args)
+            telemetry = app.telemetry.snapshot()  # 應用程式內部的分項統計，方便找出變慢的環節
+        finally:
+            app.on_close()
+        bench_replay(ST03, recorder, args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.shutdown()
+        server.server_close()
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {"tabs": args.tabs, "symbols": args.symbols, "latency": args.latency,
+                   "error_rate": args.error_rate, "repeat": args.repeat, "sort_sizes": args.sort_sizes,
+                   "validate_size": args.validate_size, "replay": args.replay},
+        "server": {"requests": server.requests, "failed": server.failed},
+        "results": recorder.summary(),
+        "telemetry": telemetry,
+    }
+
+
+def compare(report, baseline_file, ratio=REGRESSION_RATIO):
+    """列出各項中位數與基準的比值，回傳退步的項目"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != report["params"]:
+        print("注意：基準的量測參數不同，比較結果僅供參考")
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base["median"]:
+            print(f"{name:<26}{result['median']:>10.1f} ms  （基準沒有此項）")
+            continue
+        change = result["median"] / base["median"]
+        mark = "  退步" if change > ratio else ""
+        print(f"{name:<26}{result['median']:>10.1f} ms  基準 {base['median']:>8.1f} ms  x{change:.2f}{mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="雙窗看股系統效能量測")
+    parser.add_argument("--tabs", type=int, default=4, help="分頁數（左右窗格輪流放）")
+    parser.add_argument("--symbols", type=int, default=50, help="每個分頁的股票數")
+    parser.add_argument("--sort-sizes", type=lambda s: [int(v) for v in s.split(",")], default=[200, 2000],
+                        metavar="N,N", help="排序量測的分頁檔數")
+    parser.add_argument("--validate-size", type=int, default=10, help="每次驗證的新代碼數")
+    parser.add_argument("--repeat", type=int, default=5, help="每項重複次數")
+    parser.add_argument("--latency", type=float, default=0.05, help="假伺服器每個請求的延遲（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="假伺服器回應錯誤的比例")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=RESULT_FILE, help="結果 JSON 檔")
+    parser.add_argument("--compare", metavar="FILE", help="與先前的結果比較")
+    parser.add_argument("--replay", metavar="PATH", help="重播量測使用的報價日誌（目錄或 .bin 檔）")
+    args = parser.parse_args(argv)
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)  # 量測在暫存目錄進行
+
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        print(f"無法建立視窗，請在有顯示環境的機器執行（Linux 可用 xvfb-run）：{str(e)}", file=sys.stderr)
+        return 2
+
+    report = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {args.output}")
+    if args.compare:
+        return 1 if compare(report, args.compare) else 0
+    for name, result in report["results"].items():
+        print(f"{name:<26}{result['median']:>10.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
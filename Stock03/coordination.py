@@ -0,0 +1,308 @@
+"""同一台機器上多個視窗共用一個抓取者：檔案鎖選出 leader，報價經由記憶體對映的報價表分享給其他視窗
+
+leader 照常以內部的報價來源（輪詢或串流）抓取，並把收到的報價寫進報價表；
+其他視窗（follower）不連網，只把需要的代碼寫成興趣檔，再從報價表讀取自己的代碼。
+leader 關閉或當掉時檔案鎖自動釋放，下一個搶到鎖的 follower 接手抓取。
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from quote_engine import make_quote
+from quote_feeds import QuoteFeed
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SHARED_DIR = "stockview_shared"  # 鎖、報價表與興趣檔所在的目錄（與工作區同一目錄）
+TABLE_SLOTS = 4096  # 報價表容量（檔數），滿了時由 leader 清空重來
+INTEREST_TTL = 10  # 興趣檔超過幾秒沒更新視為該視窗已關閉
+INTEREST_REFRESH = 3  # follower 即使代碼沒變也每幾秒更新一次興趣檔
+
+_MAGIC = b"STKVQT01"
+_HEADER = struct.Struct("<8sIIQ")  # magic, 報價表代數（清空時加一）, slots, 寫入次數
+_HEADER_SIZE = 64
+# 每格：序號（寫入中為奇數）, 代碼, price, prev_close, 寫入時間, market_state
+_RECORD = struct.Struct("<Q24sddd16s")
+
+
+class LeaderLock:
+    """非阻塞的獨占檔案鎖；持有鎖的程式結束時由作業系統釋放"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        if self._file is not None:
+            return True
+        f = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))  # 方便查看目前由誰抓取
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if not fcntl:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()  # flock 隨檔案關閉釋放
+            self._file = None
+
+
+class QuoteTable:
+    """固定大小的報價表（代碼以 crc32 雜湊、線性探測），只有 leader 寫入
+
+    每格以序號做 seqlock：寫入前後各加一，讀取時前後序號相同且為偶數才算完整，
+    讀者不需要鎖，也不會讀到寫到一半的報價。
+    """
+
+    def __init__(self, path, slots=TABLE_SLOTS):
+        self.path = path
+        self.slots = slots
+        size = _HEADER_SIZE + slots * _RECORD.size
+        with open(path, "a+b") as f:
+            if os.path.getsize(path) < size:
+                f.truncate(size)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._index = {}  # symbol -> 格號（讀寫兩端各自快取）
+        self._epoch = None
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _header(self):
+        magic, epoch, slots, writes = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or slots != self.slots:
+            return None, 0
+        return epoch, writes
+
+    @property
+    def writes(self):
+        """累計寫入次數，沒變就不必掃描"""
+        return self._header()[1]
+
+    def reset(self):
+        """清空報價表並把代數加一，讀者發現代數改變時丟棄格號快取"""
+        epoch, _ = self._header()
+        self._map[:] = bytes(len(self._map))
+        _HEADER.pack_into(self._map, 0, _MAGIC, (epoch or 0) + 1, self.slots, 0)
+        self._index.clear()
+
+    def _check_epoch(self):
+        epoch, _ = self._header()
+        if epoch != self._epoch:
+            self._epoch = epoch
+            self._index.clear()
+        return epoch is not None
+
+    def _offset(self, slot):
+        return _HEADER_SIZE + slot * _RECORD.size
+
+    def _find(self, symbol, create=False):
+        slot = self._index.get(symbol)
+        if slot is not None:
+            return slot
+        key = symbol.encode("utf-8")[:24]
+        start = zlib.crc32(key) % self.slots
+        for i in range(self.slots):
+            slot = (start + i) % self.slots
+            stored = _RECORD.unpack_from(self._map, self._offset(slot))[1].rstrip(b"\0")
+            if stored == key or (not stored and create):
+                self._index[symbol] = slot
+                return slot
+            if not stored:
+                return None
+        return None
+
+    def write(self, quotes):
+        """leader 寫入一批報價（沒有價格的略過），回傳寫入的檔數"""
+        if self._header()[0] is None:
+            self.reset()
+        self._check_epoch()
+        count = 0
+        now = time.time()
+        for symbol, quote in quotes.items():
+            if not quote or quote.get('price') is None:
+                continue
+            slot = self._find(symbol, create=True)
+            if slot is None:
+                # 報價表已滿：清空重來，follower 發現代數改變後重新找格
+                self.reset()
+                self._epoch = self._header()[0]
+                slot = self._find(symbol, create=True)
+            offset = self._offset(slot)
+            seq = struct.unpack_from("<Q", self._map, offset)[0]
+            struct.pack_into("<Q", self._map, offset, seq + 1)
+            prev_close = quote.get('prev_close')
+            _RECORD.pack_into(self._map, offset, seq + 1, symbol.encode("utf-8")[:24], quote['price'],
+                              math.nan if prev_close is None else prev_close, now,
+                              (quote.get('market_state') or "").encode("ascii", "ignore")[:16])
+            struct.pack_into("<Q", self._map, offset, seq + 2)
+            count += 1
+        if count:
+            epoch, writes = self._header()
+            _HEADER.pack_into(self._map, 0, _MAGIC, epoch, self.slots, writes + 1)
+        return count
+
+    def read(self, symbols, seen=None):
+        """讀取代碼的最新報價；seen 為 {symbol: 序號}，只回傳序號改變的代碼並更新 seen"""
+        if not self._check_epoch():
+            return {}
+        if seen is not None and seen.get(None) != self._epoch:
+            seen.clear()
+            seen[None] = self._epoch
+        quotes = {}
+        for symbol in symbols:
+            slot = self._find(symbol)
+            if slot is None:
+                continue
+            offset = self._offset(slot)
+            for _ in range(10):
+                record = _RECORD.unpack_from(self._map, offset)
+                if record[0] % 2 == 0 and struct.unpack_from("<Q", self._map, offset)[0] == record[0]:
+                    break
+            else:
+                continue  # 一直在寫入中，下一輪再讀
+            seq, key, price, prev_close, _, state = record
+            if key.rstrip(b"\0") != symbol.encode("utf-8")[:24]:
+                self._index.pop(symbol, None)  # 報價表被清空重來
+                continue
+            if seen is not None:
+                if seen.get(symbol) == seq:
+                    continue
+                seen[symbol] = seq
+            quotes[symbol] = make_quote(symbol, price, None if math.isnan(prev_close) else prev_close,
+                                        state.rstrip(b"\0").decode("ascii") or None)
+        return quotes
+
+
+class SharedFeed(QuoteFeed):
+    """共用模式的報價來源：搶到檔案鎖就以 inner 抓取並發布到報價表，否則從報價表讀取
+
+    leader 的 inner 會同時追蹤所有 follower 興趣檔中的代碼；應用程式的批次抓取結果以 publish() 發布。
+    """
+    name = "shared"
+
+    def __init__(self, inner, directory=SHARED_DIR, tick=0.1, slots=TABLE_SLOTS):
+        super().__init__()
+        self.inner = inner
+        self.directory = directory
+        self.tick = tick
+        os.makedirs(directory, exist_ok=True)
+        self.lock = LeaderLock(os.path.join(directory, "leader.lock"))
+        self.table = QuoteTable(os.path.join(directory, "quotes.map"), slots)
+        self.interest_file = os.path.join(directory, f"interest-{os.getpid()}.json")
+        self._seen = {}
+        self._read_state = None  # 上次讀取時的 (寫入次數, 代碼)，都沒變就不必讀
+        self._interest = None  # 上次寫出的 (代碼, 時間)
+
+    @property
+    def leader(self):
+        return self.lock.held
+
+    @property
+    def remote(self):
+        return not self.leader
+
+    def publish(self, quotes):
+        """主執行緒收到報價時呼叫；只有 leader 寫入報價表"""
+        if self.leader:
+            self.table.write(quotes)
+
+    def run(self):
+        next_attempt = 0
+        while not self._stop.is_set():
+            if not self.leader and time.monotonic() >= next_attempt:
+                next_attempt = time.monotonic() + 1.0  # 每秒試一次能否接手
+                if self.lock.try_acquire():
+                    self._remove_interest()
+                    print("共用模式：由本視窗負責抓取報價")
+                    self.inner.start(self.sink)
+            if self.leader:
+                self.inner.subscribe(self.symbols | self.read_interests())
+                self._stop.wait(1.0)  # 興趣檔變動不頻繁，每秒彙整一次
+            else:
+                self.write_interest()
+                self.follow()
+                self._stop.wait(self.tick)
+        if self.leader:
+            self.inner.stop()
+        self.lock.release()
+        self._remove_interest()
+        self.table.close()
+
+    def follow(self):
+        symbols = sorted(self.symbols)
+        state = (self.table.writes, symbols)
+        if state == self._read_state:
+            return
+        self._read_state = state
+        if quotes := self.table.read(symbols, self._seen):
+            self.sink.put_many(quotes)
+
+    def write_interest(self):
+        symbols = sorted(self.symbols)
+        now = time.time()
+        if self._interest and self._interest[0] == symbols and now - self._interest[1] < INTEREST_REFRESH:
+            return
+        temp = f"{self.interest_file}.tmp"
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(symbols, f)
+            os.replace(temp, self.interest_file)  # 整檔替換，leader 不會讀到寫一半的內容
+            self._interest = (symbols, now)
+        except OSError as e:
+            print(f"興趣檔寫入失敗：{str(e)}")
+
+    def read_interests(self):
+        """所有仍在執行的 follower 需要的代碼；過期的興趣檔順便刪除"""
+        symbols = set()
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not (name.startswith("interest-") and name.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > INTEREST_TTL:
+                    os.remove(path)
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    symbols.update(json.load(f))
+            except (OSError, ValueError):
+                continue  # 剛好被替換或刪除，下一輪再讀
+        return symbols
+
+    def _remove_interest(self):
+        try:
+            os.remove(self.interest_file)
+        except OSError:
+            pass
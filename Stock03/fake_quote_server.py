@@ -0,0 +1,133 @@
+"""本機假報價伺服器：模擬 Yahoo v7 quote 端點，可設定延遲、錯誤率與限流，供離線測試抓取保護層
+
+    python fake_quote_server.py --port 8765 --latency 0.2 --error-rate 0.1 --rate-limit 5
+    set STOCKVIEW_QUOTE_URL=http://127.0.0.1:8765 後再執行 ST03.py 即改抓本機伺服器
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeMarket:
+    """每檔股票以隨機漫步產生價格；以 ZZ 開頭的代碼視為不存在"""
+
+    def __init__(self, seed=None, market_state="REGULAR"):
+        self.rng = random.Random(seed)
+        self.market_state = market_state
+        self.prev_close = {}
+        self.price = {}
+        self.open = {}
+        self._lock = threading.Lock()
+
+    def quote(self, symbol):
+        if symbol.startswith("ZZ"):
+            return None
+        with self._lock:
+            if symbol not in self.prev_close:
+                self.prev_close[symbol] = round(self.rng.uniform(10, 500), 2)
+                self.open[symbol] = round(self.prev_close[symbol] * (1 + self.rng.gauss(0, 0.01)), 2)
+                self.price[symbol] = self.open[symbol]
+            self.price[symbol] = round(self.price[symbol] * (1 + self.rng.gauss(0, 0.002)), 2)
+            return {
+                "symbol": symbol,
+                "regularMarketPrice": self.price[symbol],
+                "regularMarketPreviousClose": self.prev_close[symbol],
+                "regularMarketOpen": self.open[symbol],
+                "marketState": self.market_state,
+            }
+
+
+class FakeQuoteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, rate_limit=None, seed=None, market_state="REGULAR"):
+        super().__init__(("127.0.0.1", port), _QuoteHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit  # 每秒最多幾個請求，超過回 429
+        self.market = FakeMarket(seed, market_state)
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+        self._window = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def admit(self):
+        """回傳 HTTP 狀態碼：200 放行、429 限流、500 模擬錯誤"""
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit:
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    self.throttled += 1
+                    return 429
+                self._window.append(now)
+            if self.rng.random() < self.error_rate:
+                self.failed += 1
+                return 500
+        return 200
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-quote-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _QuoteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != "/v7/finance/quote":
+            self.send_error(404)
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        status = server.admit()
+        if status != 200:
+            self.send_error(status)
+            return
+
+        symbols = [s for s in parse_qs(url.query).get("symbols", [""])[0].split(",") if s]
+        result = [q for q in (server.market.quote(s) for s in symbols) if q]
+        body = json.dumps({"quoteResponse": {"result": result, "error": None}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不輸出每個請求的紀錄
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機假報價伺服器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求延遲秒數")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回應 500 的機率")
+    parser.add_argument("--rate-limit", type=int, default=None, help="每秒請求上限，超過回 429")
+    parser.add_argument("--market-state", default="REGULAR")
+    args = parser.parse_args()
+
+    server = FakeQuoteServer(args.port, args.latency, args.error_rate, args.rate_limit,
+                             market_state=args.market_state)
+    print(f"假報價伺服器：{server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,199 @@
+"""抓取保護層：限流、併發上限、指數退避重試與熔斷，避免被 Yahoo 限流時越抓越糟"""
+import random
+import threading
+import time
+
+
+class FetchError(Exception):
+    """整批抓取失敗"""
+
+
+class ThrottledError(FetchError):
+    """資料來源回應限流（HTTP 429 等）"""
+
+
+class TokenBucket:
+    """權杖桶限流：每秒補充 rate 個，最多累積 capacity 個"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n=1):
+        """不等待；權杖不足時回傳還需要等待的秒數，足夠時扣除並回傳 0"""
+        n = min(n, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0
+            return (n - self.tokens) / self.rate
+
+    def acquire(self, n=1):
+        while wait := self.try_acquire(n):
+            self.sleep(wait)
+
+
+class CircuitBreaker:
+    """連續失敗達門檻就斷開，冷卻後半開放行一次試探，成功才恢復"""
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True  # 只放行這一次試探
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+    def remaining(self):
+        """斷開中還要多久才會試探（秒）"""
+        if self.state != self.OPEN:
+            return 0
+        return max(0, self.reset_timeout - (self.clock() - self.opened_at))
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0, rng=random.random):
+    """指數退避加完整抖動：0 ~ min(cap, base * 2^attempt)"""
+    return rng() * min(cap, base * (2 ** attempt))
+
+
+def has_price(quote):
+    return bool(quote) and quote.get('price') is not None
+
+
+def failed_quote(symbol, error):
+    return {"symbol": symbol, "price": None, "prev_close": None, "change": None,
+            "change_percent": 'N/A', "market_state": None, "error": error}
+
+
+class GuardedFetcher:
+    """包住任何 fetcher(symbols) -> {symbol: quote}，外部介面不變
+
+    - 全域熔斷：整批連續失敗時暫停所有請求
+    - 個股熔斷：同一代碼連續抓不到就暫時略過
+    - 權杖桶限流與併發上限
+    - 整批失敗時以指數退避加抖動重試
+
+    valid(結果) 判斷單一代碼是否抓到（預設為有價格）；sibling() 建立共用限流與全域熔斷的另一個抓取器（如 K 線）。
+    """
+
+    def __init__(self, fetcher, rate=10, burst=100, per_symbol_cost=True, max_concurrency=2,
+                 retries=3, backoff_base=1.0, backoff_cap=30.0,
+                 symbol_failures=3, symbol_reset=300, global_failures=3, global_reset=60,
+                 clock=time.monotonic, sleep=time.sleep, rng=random.random, valid=has_price):
+        self.fetcher = fetcher
+        self.valid = valid
+        self.per_symbol_cost = per_symbol_cost  # yfinance 逐檔請求，依檔數扣權杖
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+        self.rng = rng
+        self.clock = clock
+        self.symbol_failures = symbol_failures
+        self.symbol_reset = symbol_reset
+        self.breaker = CircuitBreaker(global_failures, global_reset, clock=clock)
+        self.symbol_breakers = {}
+        self._lock = threading.Lock()
+
+    def sibling(self, fetcher, valid=has_price, per_symbol_cost=True):
+        """同一個資料來源的另一種請求：共用權杖桶、併發上限與全域熔斷，個股熔斷各自獨立"""
+        guard = GuardedFetcher(fetcher, per_symbol_cost=per_symbol_cost, retries=self.retries,
+                               backoff_base=self.backoff_base, backoff_cap=self.backoff_cap,
+                               symbol_failures=self.symbol_failures, symbol_reset=self.symbol_reset,
+                               clock=self.clock, sleep=self.sleep, rng=self.rng, valid=valid)
+        guard.bucket, guard.slots, guard.breaker = self.bucket, self.slots, self.breaker
+        return guard
+
+    def symbol_breaker(self, symbol):
+        with self._lock:
+            breaker = self.symbol_breakers.get(symbol)
+            if breaker is None:
+                breaker = self.symbol_breakers[symbol] = CircuitBreaker(
+                    self.symbol_failures, self.symbol_reset, clock=self.clock)
+            return breaker
+
+    def __call__(self, symbols):
+        if not symbols:
+            return {}
+        if not self.breaker.allow():
+            return {s: failed_quote(s, "資料來源暫停中") for s in symbols}
+
+        quotes = {}
+        allowed = []
+        for symbol in symbols:
+            if self.symbol_breaker(symbol).allow():
+                allowed.append(symbol)
+            else:
+                quotes[symbol] = failed_quote(symbol, "連續抓取失敗，暫停中")
+        if not allowed:
+            return quotes
+
+        fetched, error = self._fetch_with_retry(allowed)
+        for symbol in allowed:
+            quote = fetched.get(symbol)
+            if not self.valid(quote):
+                self.symbol_breaker(symbol).record_failure()
+                quotes[symbol] = failed_quote(symbol, error or "無報價")
+            else:
+                self.symbol_breaker(symbol).record_success()
+                quotes[symbol] = quote
+        return quotes
+
+    def _fetch_with_retry(self, symbols):
+        """回傳 (報價, 錯誤訊息)；整批失敗或全部沒有報價都視為失敗並退避重試"""
+        error = None
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire(len(symbols) if self.per_symbol_cost else 1)
+            try:
+                with self.slots:
+                    fetched = self.fetcher(symbols)
+                if any(self.valid(q) for q in fetched.values()):
+                    self.breaker.record_success()
+                    return fetched, None
+                if len(symbols) == 1:
+                    return fetched, "無報價"  # 單檔抓不到多半是代碼問題，交給個股熔斷
+                error = "整批無報價"
+            except ThrottledError as e:
+                error = f"限流：{str(e)}"
+            except Exception as e:
+                error = str(e)
+            self.breaker.record_failure()
+            if attempt == self.retries or not self.breaker.allow():
+                break
+            self.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap, self.rng))
+        print(f"獲取數據失敗：{len(symbols)} 檔 - {error}")
+        return {}, error
@@ -0,0 +1,197 @@
+"""持股與損益：每筆持股一列存成 NumPy 陣列，報價只更新價格欄，分頁與窗格合計以 bincount 一次算出
+
+金額一律換算成 BASE_CURRENCY；匯率來自報價快取中的 Yahoo 匯率代碼（與股票一起抓取、一起存進工作區）。
+"""
+import numpy as np
+
+BASE_CURRENCY = "TWD"
+FX_SYMBOLS = {"USD": "TWD=X"}  # 1 單位外幣 = ? TWD 的 Yahoo 代碼
+CURRENCY_SUFFIXES = {".TW": "TWD", ".TWO": "TWD"}  # 其餘代碼視為美元計價
+CURRENCIES = ("TWD", "USD")
+SIDES = ("left", "right")
+
+
+def currency_of(symbol):
+    for suffix, currency in CURRENCY_SUFFIXES.items():
+        if symbol.endswith(suffix):
+            return currency
+    return "USD"
+
+
+class PositionBook:
+    """(分頁, 代碼) 一筆持股；刪除時以最後一列補位，陣列保持緊密
+
+    update_quotes 只改價格並把版本加一，totals() 在版本改變後才重算，
+    因此一秒內多次 tick 只會做一次向量化加總。
+    """
+
+    def __init__(self, capacity=64):
+        self.keys = []  # 列號 -> (tab_id, symbol)
+        self.rows = {}  # (tab_id, symbol) -> 列號
+        self.symbol_rows = {}  # symbol -> 列號集合（同一檔可出現在多個分頁）
+        self.tab_ids = {}  # tab_id -> 分組編號
+        self.tab_side = []  # 分組編號 -> 窗格編號
+        self.shares = np.zeros(capacity)
+        self.cost = np.zeros(capacity)  # 每股平均成本（原幣）
+        self.price = np.full(capacity, np.nan)
+        self.prev_close = np.full(capacity, np.nan)
+        self.group = np.zeros(capacity, dtype=np.int64)
+        self.currency = np.zeros(capacity, dtype=np.int64)
+        self.fx = np.array([1.0 if c == BASE_CURRENCY else np.nan for c in CURRENCIES])  # 幣別 -> 本位幣匯率
+        self.version = 0
+        self._totals = None
+        self._totals_version = -1
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _grow(self):
+        capacity = len(self.shares) * 2
+        for name, fill in (("shares", 0.0), ("cost", 0.0), ("price", np.nan), ("prev_close", np.nan),
+                           ("group", 0), ("currency", 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def set_tab(self, tab_id, side):
+        """登記分頁所在的窗格（移動分頁或建立新分頁時呼叫）"""
+        group = self.tab_ids.get(tab_id)
+        if group is None:
+            group = self.tab_ids[tab_id] = len(self.tab_side)
+            self.tab_side.append(SIDES.index(side))
+        else:
+            self.tab_side[group] = SIDES.index(side)
+        self.version += 1
+
+    def remove_tab(self, tab_id):
+        for tab, symbol in [key for key in self.keys if key[0] == tab_id]:
+            self.set(tab, symbol, None)
+
+    def get(self, tab_id, symbol):
+        """回傳 (股數, 每股成本)，沒有持股時回傳 None"""
+        row = self.rows.get((tab_id, symbol))
+        return None if row is None else (float(self.shares[row]), float(self.cost[row]))
+
+    def set(self, tab_id, symbol, shares, cost=0.0, quote=None):
+        """新增或修改一筆持股；shares 為 None 或 0 時刪除。quote 為目前報價（新增時用來填入價格）"""
+        key = (tab_id, symbol)
+        row = self.rows.get(key)
+        if not shares:
+            if row is not None:
+                self._remove(row)
+                self.version += 1
+            return
+        if row is None:
+            if tab_id not in self.tab_ids:
+                raise KeyError(f"未登記的分頁：{tab_id}")
+            if len(self.keys) == len(self.shares):
+                self._grow()
+            row = self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            self.symbol_rows.setdefault(symbol, set()).add(row)
+            self.group[row] = self.tab_ids[tab_id]
+            self.currency[row] = CURRENCIES.index(currency_of(symbol))
+            self.price[row] = self.prev_close[row] = np.nan
+            if quote:
+                self._set_price(row, quote)
+        self.shares[row] = shares
+        self.cost[row] = cost or 0.0
+        self.version += 1
+
+    def _remove(self, row):
+        key = self.keys[row]
+        last = len(self.keys) - 1
+        del self.rows[key]
+        self._discard(key[1], row)
+        if row != last:
+            # 最後一列搬到被刪除的位置
+            moved = self.keys[last]
+            for array in (self.shares, self.cost, self.price, self.prev_close, self.group, self.currency):
+                array[row] = array[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+            self._discard(moved[1], last)
+            self.symbol_rows.setdefault(moved[1], set()).add(row)
+        self.keys.pop()
+
+    def _discard(self, symbol, row):
+        rows = self.symbol_rows[symbol]
+        rows.discard(row)
+        if not rows:
+            del self.symbol_rows[symbol]
+
+    def fx_symbols(self):
+        """目前持股需要的匯率代碼"""
+        used = {CURRENCIES[i] for i in np.unique(self.currency[:len(self.keys)])}
+        return [FX_SYMBOLS[c] for c in used if c in FX_SYMBOLS]
+
+    def _set_price(self, row, quote):
+        price, prev_close = quote.get('price'), quote.get('prev_close')
+        self.price[row] = np.nan if price is None else price
+        self.prev_close[row] = np.nan if prev_close is None else prev_close
+
+    def update_quotes(self, quotes):
+        """套用一批報價（含匯率代碼），回傳是否影響持股"""
+        changed = False
+        for currency, fx_symbol in FX_SYMBOLS.items():
+            quote = quotes.get(fx_symbol)
+            if quote and quote.get('price'):
+                self.fx[CURRENCIES.index(currency)] = quote['price']
+                changed = True
+        if len(quotes) < len(self.symbol_rows):
+            symbols = [s for s in quotes if s in self.symbol_rows]
+        else:
+            symbols = [s for s in self.symbol_rows if s in quotes]
+        for symbol in symbols:
+            if quotes[symbol] and quotes[symbol].get('price') is not None:
+                for row in self.symbol_rows[symbol]:
+                    self._set_price(row, quotes[symbol])
+                changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def totals(self):
+        """回傳 {"tabs": {tab_id: 合計}, "panes": {side: 合計}, "total": 合計}，金額為本位幣
+
+        合計包含 value、day_pnl、day_pct、unrealized、cost、weight（占上一層市值的比例）、
+        missing（缺價格或匯率的筆數）與 currency；顯示字串由 view_model.format_totals 產生。
+        """
+        if self._totals_version == self.version:
+            return self._totals
+        n = len(self.keys)
+        shares, fx = self.shares[:n], self.fx[self.currency[:n]]
+        price, prev_close = self.price[:n], self.prev_close[:n]
+        value = shares * price * fx
+        priced = ~np.isnan(value)
+        day = np.where(priced & ~np.isnan(prev_close), shares * (price - prev_close) * fx, 0.0)
+        cost = np.where(priced, shares * self.cost[:n] * fx, 0.0)
+        value = np.where(priced, value, 0.0)
+        unrealized = np.where(priced & (self.cost[:n] > 0), value - cost, 0.0)
+
+        groups = len(self.tab_side)
+        group = self.group[:n]
+        sums = np.vstack([np.bincount(group, weights=w, minlength=groups)
+                          for w in (value, day, unrealized, cost, (~priced).astype(float))])
+        sides = np.array(self.tab_side, dtype=np.int64)
+        pane_sums = np.vstack([np.bincount(sides, weights=row, minlength=len(SIDES)) for row in sums])
+        total = pane_sums.sum(axis=1)
+
+        def summary(column, parent_value):
+            value, day, unrealized, cost, missing = column
+            return {"value": value, "day_pnl": day, "unrealized": unrealized, "cost": cost,
+                    "currency": BASE_CURRENCY, "weight": value / parent_value if parent_value else None, "missing": int(missing),
+                    "day_pct": day / (value - day) * 100 if value - day else None}
+
+        counts = np.bincount(group, minlength=groups)
+        self._totals = {
+            "tabs": {tab_id: summary(sums[:, g], pane_sums[0, sides[g]])
+                     for tab_id, g in self.tab_ids.items() if counts[g]},
+            "panes": {side: summary(pane_sums[:, i], total[0]) for i, side in enumerate(SIDES)
+                      if np.any(counts[sides == i])},
+            "total": summary(total, total[0]),
+        }
+        self._totals_version = self.version
+        return self._totals
+
@@ -0,0 +1,318 @@
+"""報價引擎：跨分頁去重股票代碼，每輪只批次抓取一次"""
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.error import HTTPError
+from urllib.parse import quote as url_quote
+from urllib.request import urlopen
+
+from fetch_guard import FetchError, ThrottledError
+
+# yf.download 內部共用全域暫存，同一時間只允許一個批次下載
+_download_lock = threading.Lock()
+
+
+def make_quote(symbol, price, prev_close, market_state=None, volume=None, time=None, day_open=None):
+    """由現價與昨收組出分頁使用的報價資料；volume 為當日累計量，time 為價格的時間戳，day_open 為當日開盤價"""
+    change = None
+    change_percent = None
+    if price and prev_close:
+        change = round(price - prev_close, 2)
+        change_percent = f"{(change/prev_close)*100:+.2f}%"
+
+    return {
+        "symbol": symbol,
+        "price": price,
+        "prev_close": prev_close,
+        "change": change,  # 保留用於顏色標記
+        "change_percent": change_percent or 'N/A',
+        "market_state": market_state,  # 資料來源有提供時才有值，供排程判斷盤別
+        "volume": volume,
+        "time": time,
+        "open": day_open  # 資料來源有提供時才有值，跳空警示用
+    }
+
+
+def _bar_timestamp(index_value):
+    """K 線索引轉時間戳；沒有時區的日K以當天 UTC 正午代表，換回各交易所當地仍是同一天"""
+    if index_value.tzinfo is not None:
+        return index_value.timestamp()
+    return datetime(index_value.year, index_value.month, index_value.day, 12, tzinfo=timezone.utc).timestamp()
+
+
+def fetch_quotes(symbols):
+    """以單次 yf.download 批次抓取多檔股票，只取現價與昨收；整批失敗時拋出例外交給保護層處理"""
+    if not symbols:
+        return {}
+
+    import yfinance as yf  # 延遲匯入：連帶載入 pandas 要數百毫秒，不該拖慢開窗
+    with _download_lock:
+        frame = yf.download(
+            list(symbols), period="5d", interval="1d",
+            group_by="ticker", auto_adjust=False,
+            threads=True, progress=False
+        )
+
+    multi = getattr(frame.columns, "nlevels", 1) > 1
+    quotes = {}
+    for symbol in symbols:
+        price = prev_close = volume = bar_time = day_open = None
+        try:
+            # 各交易所日曆不同，需逐檔去除空值
+            bars = (frame[symbol] if multi else frame).dropna(subset=["Close"])
+            if len(bars) >= 1:
+                price = float(bars["Close"].iloc[-1])
+                volume = float(bars["Volume"].iloc[-1])
+                day_open = float(bars["Open"].iloc[-1])
+                bar_time = _bar_timestamp(bars.index[-1])
+            if len(bars) >= 2:
+                prev_close = float(bars["Close"].iloc[-2])
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"獲取數據失敗：{symbol} - {str(e)}")
+        quotes[symbol] = make_quote(symbol, price, prev_close, volume=volume, time=bar_time, day_open=day_open)
+    return quotes
+
+
+def has_bars(bars):
+    """fetch_bars 的單檔結果是否有 K 線（抓取保護層以此判斷成敗）"""
+    return bool(bars) and len(bars.get("close", ())) > 0
+
+
+def fetch_bars(symbols, period, interval):
+    """批次抓取 K 線，回傳 {symbol: {"time", "high", "low", "close", "volume"}}（NumPy 陣列）"""
+    if not symbols:
+        return {}
+    import yfinance as yf
+    with _download_lock:
+        frame = yf.download(
+            list(symbols), period=period, interval=interval,
+            group_by="ticker", auto_adjust=False,
+            threads=True, progress=False
+        )
+
+    multi = getattr(frame.columns, "nlevels", 1) > 1
+    result = {}
+    for symbol in symbols:
+        try:
+            bars = (frame[symbol] if multi else frame).dropna(subset=["Close"])
+        except KeyError:
+            continue
+        if bars.empty:
+            continue
+        result[symbol] = {
+            "time": [_bar_timestamp(t) for t in bars.index],
+            "high": bars["High"].to_numpy(dtype=float),
+            "low": bars["Low"].to_numpy(dtype=float),
+            "close": bars["Close"].to_numpy(dtype=float),
+            "volume": bars["Volume"].to_numpy(dtype=float),
+        }
+    return result
+
+
+def make_http_fetcher(base_url, timeout=10):
+    """抓取 Yahoo v7 quote 格式的 HTTP 端點（例如本機的 fake_quote_server）"""
+    base_url = base_url.rstrip("/")
+
+    def fetch_quotes_http(symbols):
+        if not symbols:
+            return {}
+        url = f"{base_url}/v7/finance/quote?symbols={url_quote(','.join(symbols))}"
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                payload = json.load(response)
+        except HTTPError as e:
+            if e.code == 429:
+                raise ThrottledError(f"HTTP {e.code}")
+            raise FetchError(f"HTTP {e.code}")
+
+        quotes = {}
+        for item in payload["quoteResponse"]["result"]:
+            symbol = item["symbol"]
+            quotes[symbol] = make_quote(symbol, item.get("regularMarketPrice"),
+                                        item.get("regularMarketPreviousClose"), item.get("marketState"),
+                                        item.get("regularMarketVolume"), item.get("regularMarketTime"),
+                                        item.get("regularMarketOpen"))
+        return quotes
+
+    return fetch_quotes_http
+
+
+class QuoteCache:
+    """全程式共用的報價快取：每筆附時間戳，超過 TTL 視為過期，容量滿時淘汰最久未用的代碼"""
+
+    def __init__(self, ttl=30, max_size=2000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # symbol -> (timestamp, quote)
+        self._lock = threading.Lock()  # 背景工作池寫入、主執行緒讀取
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, symbols, now=None):
+        """回傳 (快取中的報價, 需要重新抓取的代碼)；過期的報價仍會回傳供先行顯示"""
+        now = now or time.time()
+        quotes, stale = {}, []
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry is None:
+                    self.misses += 1
+                    stale.append(symbol)
+                    continue
+                self._entries.move_to_end(symbol)
+                timestamp, quote = entry
+                quotes[symbol] = quote
+                if now - timestamp > self.ttl:
+                    self.misses += 1
+                    stale.append(symbol)
+                else:
+                    self.hits += 1
+        return quotes, stale
+
+    def peek(self, symbols):
+        """不論是否過期、不影響命中統計與 LRU 順序，回傳快取中的報價"""
+        with self._lock:
+            return {s: self._entries[s][1] for s in symbols if s in self._entries}
+
+    def entries(self):
+        """複製目前所有快取項目 {symbol: (timestamp, quote)}"""
+        with self._lock:
+            return dict(self._entries)
+
+    def restore(self, entries):
+        """載入快照；保留原時間戳，因此會被視為過期並在背景重新抓取"""
+        with self._lock:
+            for symbol, (timestamp, quote) in entries.items():
+                current = self._entries.get(symbol)
+                if current is None or current[0] < timestamp:
+                    self._entries[symbol] = (timestamp, quote)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def put_many(self, quotes, timestamp=None):
+        timestamp = timestamp or time.time()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                if quote is None or quote.get('price') is None or quote.get('error') or quote.get('stale'):
+                    continue  # 抓取失敗不覆蓋先前的有效報價；附 error/stale 的是舊數值，不可刷新時間戳
+                self._entries[symbol] = (timestamp, quote)
+                self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class QuoteEngine:
+    """彙整所有分頁的股票代碼，一次抓取後分送給各分頁"""
+
+    def __init__(self, fetcher=fetch_quotes, cache=None):
+        self.fetcher = fetcher
+        self.cache = cache if cache is not None else QuoteCache()
+
+    @staticmethod
+    def collect_symbols(tabs):
+        """依出現順序去除重複代碼"""
+        symbols = {}
+        for tab in tabs:
+            for symbol in tab.stocks:
+                symbols.setdefault(symbol, None)
+        return list(symbols)
+
+    def fetch(self, symbols):
+        """從網路抓取並寫入快取（在背景工作池執行）
+
+        抓取失敗的代碼改回傳快取中最後一筆有效報價並附上 error，畫面保留數值只加上錯誤標記。
+        """
+        quotes = self.fetcher(list(dict.fromkeys(symbols)))
+        self.cache.put_many(quotes)
+        failed = [s for s, q in quotes.items() if q is None or q.get('price') is None]
+        if failed:
+            last_good = self.cache.peek(failed)
+            for symbol in failed:
+                error = (quotes[symbol] or {}).get('error') or "無報價"
+                quotes[symbol] = dict(last_good.get(symbol) or make_quote(symbol, None, None), error=error)
+        return quotes
+
+    def cached(self, symbols):
+        """不連網，回傳 (快取報價, 過期或缺少的代碼)"""
+        return self.cache.lookup(list(dict.fromkeys(symbols)))
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+
+class RefreshWorker:
+    """背景工作池：只做網路抓取，結果放入佇列由 Tk 主執行緒取出
+
+    回呼函式一律在 drain() 中執行，因此不會在背景執行緒操作任何元件。
+    """
+
+    def __init__(self, engine, max_workers=2, batch_size=100):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.jobs = queue.PriorityQueue()
+        self.results = queue.Queue()
+        self._seq = itertools.count()  # 同優先順序時維持先進先出
+        self._outstanding = 0  # 已送出但尚未在主執行緒處理完的工作數
+        self._threads = []
+        for i in range(max_workers):
+            thread = threading.Thread(target=self._run, name=f"quote-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args, callback=None, errback=None, priority=PRIORITY_NORMAL):
+        """在工作池執行 func(*args)，完成後於主執行緒呼叫 callback(result)"""
+        self._outstanding += 1
+        self.jobs.put((priority, next(self._seq), func, args, callback, errback))
+
+    def submit_quotes(self, symbols, callback, priority=PRIORITY_NORMAL):
+        """依批次大小分批抓取報價，每批完成即回傳，讓畫面逐步更新"""
+        symbols = list(dict.fromkeys(symbols))
+        for start in range(0, len(symbols), self.batch_size):
+            batch = symbols[start:start + self.batch_size]
+            self.submit(self.engine.fetch, batch, callback=callback, priority=priority)
+
+    def pending(self):
+        return self._outstanding
+
+    def _run(self):
+        while True:
+            priority, _, func, args, callback, errback = self.jobs.get()
+            if func is None:
+                break
+            try:
+                result = func(*args)
+            except Exception as e:
+                self.results.put((errback, e))
+            else:
+                self.results.put((callback, result))
+
+    def drain(self, budget=0.008):
+        """在主執行緒取出結果並執行回呼，超過時間預算就留到下一輪"""
+        deadline = time.perf_counter() + budget
+        handled = 0
+        while time.perf_counter() < deadline:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            handled += 1
+            self._outstanding -= 1
+            if callback is None:
+                if isinstance(result, Exception):
+                    print(f"背景工作失敗：{str(result)}")
+                continue
+            callback(result)
+        return handled
+
+    def shutdown(self):
+        for _ in self._threads:
+            self.jobs.put((PRIORITY_LOW + 1, next(self._seq), None, (), None, None))
@@ -0,0 +1,287 @@
+"""推播式報價來源：各來源在自己的執行緒把 tick 推進 TickBuffer，主執行緒依畫面更新率取出"""
+import json
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from quote_engine import make_quote
+
+
+def encode_message(message):
+    """常駐程式協定：每行一個 JSON"""
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class TickBuffer:
+    """同一檔在一個畫面週期內的多筆 tick 只保留最新一筆"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.received = 0  # 累計收到的 tick 數（含被合併掉的）
+
+    def put(self, symbol, quote):
+        with self._lock:
+            self._pending[symbol] = quote
+            self.received += 1
+
+    def put_many(self, quotes):
+        with self._lock:
+            self._pending.update(quotes)
+            self.received += len(quotes)
+
+    def take(self):
+        """取出並清空目前累積的最新報價"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+class QuoteFeed(ABC):
+    """報價來源介面：start(sink) 後持續把 tick 推入 sink，subscribe 決定要追蹤哪些代碼"""
+    name = "feed"
+    remote = False  # 報價來自別處（重播檔、常駐程式）時應用程式不自行抓取
+
+    def __init__(self):
+        self.sink = None
+        self.symbols = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, sink):
+        self.sink = sink
+        self._thread = threading.Thread(target=self.run, name=f"{self.name}-feed", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, symbols):
+        self.symbols = set(symbols)
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self, quotes):
+        """應用程式抓到的報價；共用模式用來分享給其他視窗"""
+
+    @abstractmethod
+    def run(self):
+        """在背景執行緒中持續推送報價，直到 stop()"""
+
+
+class PollingFeed(QuoteFeed):
+    """以 yfinance 輪詢模擬推播：依排程只抓取到期的代碼"""
+    name = "poll"
+
+    def __init__(self, engine, scheduler, tick=1.0):
+        super().__init__()
+        self.engine = engine
+        self.scheduler = scheduler
+        self.tick = tick
+
+    def run(self):
+        while not self._stop.is_set():
+            if due := self.scheduler.due(sorted(self.symbols)):
+                quotes = self.engine.fetch(due)
+                self.scheduler.observe(quotes)
+                self.sink.put_many(quotes)
+            self._stop.wait(self.tick)
+
+
+# Yahoo 串流的 marketHours 對應到 marketState
+_STREAM_MARKET_HOURS = {
+    0: "PRE", 1: "REGULAR", 2: "POST", 3: "POST",
+    "PRE_MARKET": "PRE", "REGULAR_MARKET": "REGULAR",
+    "POST_MARKET": "POST", "EXTENDED_HOURS_MARKET": "POST",
+}
+
+
+class YahooStreamFeed(QuoteFeed):
+    """Yahoo 的 websocket 串流（yfinance.WebSocket），斷線時以遞增間隔重連"""
+    name = "stream"
+
+    def __init__(self, max_backoff=60):
+        super().__init__()
+        self.max_backoff = max_backoff
+        self._ws = None
+        self._subscribed = set()
+        self._ws_lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        try:
+            from yfinance import WebSocket  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def subscribe(self, symbols):
+        super().subscribe(symbols)
+        self._sync_subscriptions()
+
+    def _sync_subscriptions(self):
+        with self._ws_lock:
+            if self._ws is None:
+                return
+            added = sorted(self.symbols - self._subscribed)
+            removed = sorted(self._subscribed - self.symbols)
+            if added:
+                self._ws.subscribe(added)
+            if removed:
+                self._ws.unsubscribe(removed)
+            self._subscribed = set(self.symbols)
+
+    def on_message(self, message):
+        symbol = message.get("id")
+        price = message.get("price")
+        if not symbol or price is None:
+            return
+        change = message.get("change")
+        prev_close = message.get("previous_close") or (price - change if change is not None else None)
+        market_state = _STREAM_MARKET_HOURS.get(message.get("market_hours"))
+        self.sink.put(symbol, make_quote(symbol, float(price), prev_close, market_state,
+                                         day_open=message.get("open_price") or None))
+
+    def run(self):
+        from yfinance import WebSocket
+
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                with WebSocket(verbose=False) as ws:
+                    with self._ws_lock:
+                        self._ws = ws
+                        self._subscribed = set()
+                    self._sync_subscriptions()
+                    backoff = 1
+                    ws.listen(self.on_message)
+            except Exception as e:
+                print(f"串流中斷：{str(e)}，{backoff} 秒後重連")
+            finally:
+                with self._ws_lock:
+                    self._ws = None
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def stop(self):
+        super().stop()
+        with self._ws_lock:
+            if self._ws is not None:
+                self._ws.close()
+
+
+class DaemonFeed(QuoteFeed):
+    """連到 stockview_cli.py daemon 接收推送，同一台機器上的多個視窗共用一個抓取迴圈"""
+    name = "daemon"
+    remote = True
+
+    def __init__(self, address, max_backoff=30):
+        super().__init__()
+        self.address = address
+        self.max_backoff = max_backoff
+        self._sock = None
+        self._sock_lock = threading.Lock()
+
+    def subscribe(self, symbols):
+        changed = set(symbols) != self.symbols
+        super().subscribe(symbols)
+        if changed:
+            self._send_subscription()
+
+    def _send_subscription(self):
+        with self._sock_lock:
+            if self._sock is None:
+                return
+            try:
+                self._sock.sendall(encode_message({"op": "subscribe", "symbols": sorted(self.symbols)}))
+            except OSError:
+                pass  # 由 run 偵測斷線後重連並重新訂閱
+
+    def run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection(self.address, timeout=5) as sock:
+                    sock.settimeout(1.0)  # 定期檢查是否該停止
+                    with self._sock_lock:
+                        self._sock = sock
+                    self._send_subscription()
+                    backoff = 1
+                    self._receive(sock)
+            except (OSError, ValueError) as e:
+                print(f"常駐程式連線中斷：{str(e)}，{backoff} 秒後重連")
+            finally:
+                with self._sock_lock:
+                    self._sock = None
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _receive(self, sock):
+        pending = b""
+        while not self._stop.is_set():
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not data:
+                raise ConnectionError("常駐程式已關閉連線")
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if quotes := json.loads(line).get("quotes"):
+                    self.sink.put_many(quotes)
+
+
+class ReplayFeed(QuoteFeed):
+    """從檔案重播錄下的 tick，供離線測試；speed 為倍速，0 表示不等待全速播放
+
+    檔案每行一筆 JSON：{"t": 時間戳, "symbol": ..., "price": ..., "prev_close": ..., "market_state": ...}
+    """
+    name = "replay"
+    remote = True
+
+    def __init__(self, path, speed=1.0, loop=False):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+
+    def ticks(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def run(self):
+        while not self._stop.is_set():
+            first_t = start = None
+            for tick in self.ticks():
+                if self._stop.is_set():
+                    return
+                if self.speed:
+                    if first_t is None:
+                        first_t, start = tick["t"], time.perf_counter()
+                    delay = (tick["t"] - first_t) / self.speed - (time.perf_counter() - start)
+                    if delay > 0 and self._stop.wait(delay):
+                        return
+                symbol = tick["symbol"]
+                self.sink.put(symbol, make_quote(symbol, tick["price"], tick.get("prev_close"),
+                                                 tick.get("market_state")))
+            if not self.loop:
+                return
+
+
+class TickRecorder:
+    """把收到的報價逐筆附加到檔案，格式與 ReplayFeed 相同"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def record(self, quotes, timestamp=None):
+        timestamp = round(timestamp or time.time(), 3)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for symbol, quote in quotes.items():
+                if quote and quote.get('price') is not None and not (quote.get('error') or quote.get('stale')):
+                    f.write(json.dumps({
+                        "t": timestamp, "symbol": symbol, "price": quote['price'],
+                        "prev_close": quote.get('prev_close'), "market_state": quote.get('market_state')
+                    }, separators=(",", ":")) + "\n")
@@ -0,0 +1,258 @@
+"""報價日誌：應用程式收到的每筆報價以二進位格式附加到每日的日誌檔，可離線重播
+
+每個檔案以 MAGIC 開頭，之後是兩種紀錄：
+  代碼定義  <B H B> + 代碼（類型 1、代碼編號、長度），同一檔案內每個代碼只寫一次
+  報價      <B d H d d d B>（類型 2、收到時間、代碼編號、price、prev_close、volume、盤別編號）
+一筆報價 36 bytes（JSON 約 120 bytes）；缺少的數值存成 NaN。程式中斷留下的不完整紀錄在讀取時略過。
+檔案依日期輪替，單檔超過上限的四分之一也換新檔；總大小超過上限時從最舊的檔案刪除。
+"""
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from itertools import groupby
+
+from quote_engine import make_quote
+from quote_feeds import QuoteFeed
+
+JOURNAL_DIR = "journal"
+JOURNAL_MAX_BYTES = 256 * 1024 * 1024  # 日誌目錄的總大小上限
+JOURNAL_FLUSH_INTERVAL = 5  # 緩衝區最長多久寫到磁碟一次（秒）
+REPLAY_MAX_GAP = 5  # 重播時相鄰兩筆超過幾秒（日誌時間）就直接跳過，不照實等待
+
+MAGIC = b"STKVJN01"
+STATES = (None, "PREPRE", "PRE", "REGULAR", "POST", "POSTPOST", "CLOSED")
+_SYMBOL = struct.Struct("<BHB")
+_QUOTE = struct.Struct("<BdHdddB")
+_SYMBOL_RECORD = 1
+_QUOTE_RECORD = 2
+_MAX_SYMBOLS = 65535
+
+
+def _number(value):
+    return math.nan if value is None else value
+
+
+def _optional(value):
+    return None if math.isnan(value) else value
+
+
+class QuoteJournal:
+    """在主執行緒呼叫 record()：只是打包後寫進檔案緩衝區，每 JOURNAL_FLUSH_INTERVAL 秒才落到磁碟"""
+
+    def __init__(self, directory=JOURNAL_DIR, max_bytes=JOURNAL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.path = None
+        self.records = 0  # 本次執行寫入的報價筆數
+        self._file = None
+        self._day = None
+        self._ids = {}
+        self._part = 0
+        self._last_flush = 0
+
+    def _open(self, timestamp):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        now = datetime.fromtimestamp(timestamp)
+        self._day = now.date()
+        while True:  # 同一秒內換檔時以遞增的序號區分，檔名排序即時間順序
+            self.path = os.path.join(self.directory, f"quotes-{now:%Y%m%d-%H%M%S}-{self._part:03d}.bin")
+            self._part += 1
+            if not os.path.exists(self.path):
+                break
+        self._file = open(self.path, "wb")
+        self._file.write(MAGIC)
+        self._ids = {}
+        self.enforce_limit()
+
+    def record(self, quotes, timestamp=None):
+        timestamp = timestamp or time.time()
+        if (self._file is None or datetime.fromtimestamp(timestamp).date() != self._day
+                or self._file.tell() > self.max_bytes // 4 or len(self._ids) + len(quotes) > _MAX_SYMBOLS):
+            self._open(timestamp)
+        write = self._file.write
+        for symbol, quote in quotes.items():
+            if not quote or quote.get('price') is None or quote.get('error') or quote.get('stale'):
+                continue  # 附 error/stale 的是最後一筆有效報價，不是新的成交
+            symbol_id = self._ids.get(symbol)
+            if symbol_id is None:
+                symbol_id = self._ids[symbol] = len(self._ids)
+                name = symbol.encode("utf-8")[:255]
+                write(_SYMBOL.pack(_SYMBOL_RECORD, symbol_id, len(name)) + name)
+            state = quote.get('market_state')
+            write(_QUOTE.pack(_QUOTE_RECORD, timestamp, symbol_id, quote['price'], _number(quote.get('prev_close')),
+                              _number(quote.get('volume')), STATES.index(state) if state in STATES else 0))
+            self.records += 1
+        if timestamp - self._last_flush >= JOURNAL_FLUSH_INTERVAL:
+            self._last_flush = timestamp
+            self._file.flush()
+
+    def enforce_limit(self):
+        """總大小超過上限時刪除最舊的日誌（目前寫入中的檔案除外）"""
+        files = journal_files(self.directory)
+        sizes = {path: os.path.getsize(path) for path in files}
+        total = sum(sizes.values())
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            if os.path.abspath(path) == os.path.abspath(self.path or ""):
+                continue
+            try:
+                os.remove(path)
+                total -= sizes[path]
+            except OSError as e:
+                print(f"刪除舊日誌失敗：{str(e)}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def journal_files(path=JOURNAL_DIR):
+    """目錄中的日誌檔（依時間排序）；path 為檔案時只回傳它"""
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, name) for name in sorted(os.listdir(path))
+            if name.startswith("quotes-") and name.endswith(".bin")]
+
+
+def is_journal(path):
+    """重播檔是二進位日誌（或日誌目錄）而不是 JSON lines 的 tick 檔"""
+    if os.path.isdir(path):
+        return True
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_journal(path):
+    """依收到時間產生 (收到時間, symbol, 報價)；path 可以是檔案或日誌目錄
+
+    共用模式換手時前後兩個視窗的檔案時間會重疊，因此同一天的檔案依時間合併，不是照檔名逐檔讀取。
+    """
+    for _, day in groupby(journal_files(path), key=lambda file: os.path.basename(file)[:len("quotes-YYYYmmdd")]):
+        yield from heapq.merge(*(_read_file(file) for file in day), key=lambda record: record[0])
+
+
+def _read_file(file):
+    """單一日誌檔的紀錄（檔內已依時間排序），以 mmap 讀取，合併多檔時不必全部載入記憶體"""
+    with open(file, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(MAGIC)] != MAGIC:
+                print(f"略過不是報價日誌的檔案：{file}")
+                return
+            yield from _records(data)
+
+
+def _records(data):
+    names = {}
+    offset, end = len(MAGIC), len(data)
+    while offset < end:
+        kind = data[offset]
+        if kind == _SYMBOL_RECORD:
+            if offset + _SYMBOL.size > end:
+                break
+            _, symbol_id, length = _SYMBOL.unpack_from(data, offset)
+            offset += _SYMBOL.size
+            names[symbol_id] = data[offset:offset + length].decode("utf-8")
+            offset += length
+        elif kind == _QUOTE_RECORD and offset + _QUOTE.size <= end:
+            _, timestamp, symbol_id, price, prev_close, volume, state = _QUOTE.unpack_from(data, offset)
+            offset += _QUOTE.size
+            symbol = names[symbol_id]
+            yield timestamp, symbol, make_quote(symbol, price, _optional(prev_close),
+                                                STATES[state] if state < len(STATES) else None,
+                                                _optional(volume), timestamp)
+        else:
+            break  # 寫到一半中斷的尾端
+
+
+def parse_start(text, first_timestamp):
+    """--replay-start 的 HH:MM[:SS]，以日誌第一筆的日期為準；也接受 YYYY-MM-DD HH:MM[:SS]"""
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    day = datetime.fromtimestamp(first_timestamp)
+    parts = [int(p) for p in text.split(":")]
+    hour, minute, second = (parts + [0, 0])[:3]
+    return day.replace(hour=hour, minute=minute, second=second, microsecond=0).timestamp()
+
+
+class JournalFeed(QuoteFeed):
+    """以日誌驅動畫面：speed 為倍速（0 表示全速，可當作可重現的離線負載），可暫停與調整速度
+
+    start 之前的報價全速套用（畫面直接跳到那個時間點）；position 為目前重播到的日誌時間。
+    """
+    name = "replay"
+    remote = True
+
+    def __init__(self, path, speed=1.0, start=None, loop=False):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.start_text = start
+        self.loop = loop
+        self.paused = False
+        self.position = None
+        self.finished = False
+        self.replayed = 0
+        self._anchor = None  # (日誌時間, perf_counter)，改變速度或暫停後重新對齊
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self._anchor = None
+
+    def set_paused(self, paused):
+        self.paused = paused
+        self._anchor = None
+
+    def run(self):
+        while not self._stop.is_set():
+            start = None
+            last = None
+            for timestamp, symbol, quote in read_journal(self.path):
+                if self.start_text and start is None:
+                    start = parse_start(self.start_text, timestamp)
+                if start is None or timestamp >= start:
+                    if last is not None and timestamp - last > REPLAY_MAX_GAP:
+                        self._anchor = None  # 跳過收盤或程式關閉期間的空檔
+                    if not self._wait_until(timestamp):
+                        return
+                last = timestamp
+                self.sink.put(symbol, quote)
+                self.position = timestamp
+                self.replayed += 1
+            if not self.loop:
+                break
+        self.finished = True
+
+    def _wait_until(self, timestamp):
+        """等到這一筆該出現的時間；停止時回傳 False"""
+        while not self._stop.is_set():
+            if self.paused:
+                self._anchor = None
+                self._stop.wait(0.1)
+                continue
+            if not self.speed:
+                return True
+            if self._anchor is None:
+                self._anchor = (timestamp, time.perf_counter())
+            journal_time, started = self._anchor
+            delay = (timestamp - journal_time) / self.speed - (time.perf_counter() - started)
+            if delay <= 0:
+                return True
+            self._stop.wait(min(delay, 0.1))  # 分段等待，暫停或改速度能馬上生效
+        return False
@@ -0,0 +1,321 @@
+"""多個報價來源：依代碼後綴分派到不同後端，抓不到時改用下一個來源，另可同時向兩個來源請求取先回來的
+
+後端：yahoo（yfinance）、twse（證交所基本市況報導，.TW/.TWO）、csv（本機檔案，測試與離線用）。
+ProviderRouter 本身就是 fetcher(symbols) -> {symbol: quote}，外面照常包 GuardedFetcher。
+"""
+import csv
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from urllib.error import HTTPError
+from urllib.parse import quote as url_quote
+from urllib.request import Request, urlopen
+
+from fetch_guard import FetchError, ThrottledError
+from quote_engine import fetch_quotes, make_quote
+from telemetry import RollingStat
+
+# 各後綴依序嘗試的來源（設定中沒有的來源略過）；csv 只處理檔案中有的代碼，放在最前面當作覆寫
+ROUTES = {".TW": ("csv", "twse", "yahoo"), ".TWO": ("csv", "twse", "yahoo")}
+DEFAULT_ROUTE = ("csv", "yahoo")
+HEDGE_DELAY = None  # 同時請求模式中第二個來源延遲幾秒才送出；None 依主要來源的 p90 延遲決定，0 為同時送出
+HEDGE_DEFAULT_DELAY = 0.3  # 主要來源還沒有足夠樣本時的延遲
+MIN_SAMPLES = 5  # 延遲樣本數達到才用來排序來源
+DEMOTE_FAILURE_RATE = 0.5  # 最近失敗比例超過此值的來源排到後面
+TWSE_URL = "https://mis.twse.com.tw/stock/api/getStockInfo.jsp"
+TWSE_BATCH_SIZE = 50  # 證交所每個請求的檔數（網址長度限制）
+
+
+def valid(quote):
+    return bool(quote) and quote.get('price') is not None
+
+
+class QuoteProvider(ABC):
+    """報價來源後端：fetch(symbols) -> {symbol: quote}，整批失敗時拋出例外"""
+    name = "provider"
+
+    def supports(self, symbol):
+        return True
+
+    @abstractmethod
+    def fetch(self, symbols):
+        """回傳 {symbol: quote}"""
+
+
+class YahooProvider(QuoteProvider):
+    name = "yahoo"
+
+    def fetch(self, symbols):
+        return fetch_quotes(symbols)
+
+
+class TwseProvider(QuoteProvider):
+    """證交所 MIS 即時報價：上市 tse_、上櫃 otc_；尚未成交時以最佳買價代替"""
+    name = "twse"
+
+    def __init__(self, url=TWSE_URL, timeout=5, batch_size=TWSE_BATCH_SIZE):
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+    def supports(self, symbol):
+        return symbol.endswith((".TW", ".TWO"))
+
+    @staticmethod
+    def channel(symbol):
+        code, _, suffix = symbol.rpartition(".")
+        return f"{'otc' if suffix == 'TWO' else 'tse'}_{code.lower()}.tw"
+
+    def fetch(self, symbols):
+        quotes = {}
+        for start in range(0, len(symbols), self.batch_size):
+            quotes.update(self._fetch_batch(symbols[start:start + self.batch_size]))
+        return quotes
+
+    def _fetch_batch(self, symbols):
+        channels = "|".join(self.channel(s) for s in symbols)
+        request = Request(f"{self.url}?ex_ch={url_quote(channels, safe='|_.')}&json=1&delay=0",
+                          headers={"User-Agent": "Mozilla/5.0"})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except HTTPError as e:
+            if e.code == 429:
+                raise ThrottledError(f"HTTP {e.code}")
+            raise FetchError(f"HTTP {e.code}")
+        wanted = {s.rpartition(".")[0].upper(): s for s in symbols}
+        quotes = {}
+        for item in payload.get("msgArray", []):
+            symbol = wanted.get(str(item.get("c", "")).upper())
+            if symbol is None:
+                continue
+            price = self._number(item.get("z")) or self._number(str(item.get("b", "")).split("_")[0])
+            volume = self._number(item.get("v"))
+            tlong = self._number(item.get("tlong"))
+            quotes[symbol] = make_quote(symbol, price, self._number(item.get("y")),
+                                        volume=volume * 1000 if volume is not None else None,  # 張 -> 股
+                                        time=tlong / 1000 if tlong else None, day_open=self._number(item.get("o")))
+        return quotes
+
+    @staticmethod
+    def _number(text):
+        try:
+            return float(text)
+        except (TypeError, ValueError):
+            return None  # "-" 表示尚無成交
+
+
+class CsvProvider(QuoteProvider):
+    """本機 CSV（symbol,price,prev_close[,volume]），檔案修改後自動重新讀取；只處理檔案中有的代碼"""
+    name = "csv"
+
+    def __init__(self, path):
+        self.path = path
+        self._quotes = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                quotes = {}
+                with open(self.path, "r", encoding="utf-8", newline="") as f:
+                    for row in csv.DictReader(f):
+                        symbol = (row.get("symbol") or "").strip().upper()
+                        if symbol:
+                            quotes[symbol] = (self._number(row.get("price")), self._number(row.get("prev_close")),
+                                              self._number(row.get("volume")))
+                self._quotes, self._mtime = quotes, mtime
+            return self._quotes
+
+    @staticmethod
+    def _number(text):
+        try:
+            return float(text)
+        except (TypeError, ValueError):
+            return None
+
+    def supports(self, symbol):
+        return symbol in self._load()
+
+    def fetch(self, symbols):
+        rows = self._load()
+        now = time.time()
+        return {s: make_quote(s, rows[s][0], rows[s][1], volume=rows[s][2], time=now) for s in symbols if s in rows}
+
+
+class ProviderStats:
+    """單一來源最近的請求延遲（秒）、成功與失敗次數，以及先回來而被採用的檔數"""
+
+    def __init__(self):
+        self.latency = RollingStat()
+        self.outcomes = deque(maxlen=self.latency.samples.maxlen)  # 最近的成功（True）/失敗（False）
+        self.served = 0
+
+    def record(self, seconds, ok):
+        self.latency.add(seconds)
+        self.outcomes.append(ok)
+
+    def failure_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ProviderRouter:
+    """依路由表與各來源的延遲統計決定順序；hedge 時主要來源超過延遲門檻還沒回來就同時問下一個來源"""
+
+    def __init__(self, providers, routes=ROUTES, default_route=DEFAULT_ROUTE, hedge=False, hedge_delay=HEDGE_DELAY,
+                 max_workers=4):
+        self.providers = {p.name: p for p in providers}
+        self.routes = routes
+        self.default_route = default_route
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.stats = {name: ProviderStats() for name in self.providers}
+        self.hedged = 0  # 送出第二個請求的次數
+        self._lock = threading.Lock()
+        # 分組與個別來源的請求用不同的執行緒池，巢狀等待不會把池子卡死
+        self._groups = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quote-route")
+        self._calls = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="quote-provider")
+
+    def __call__(self, symbols):
+        return self.fetch(symbols)
+
+    def candidates(self, symbol):
+        """這檔依序要嘗試的來源：路由表的順序，再依延遲與失敗率調整"""
+        route = next((r for suffix, r in self.routes.items() if symbol.endswith(suffix)), self.default_route)
+        providers = [self.providers[name] for name in route
+                     if name in self.providers and self.providers[name].supports(symbol)]
+        with self._lock:
+            def key(item):
+                index, provider = item
+                stats = self.stats[provider.name]
+                enough = stats.latency.count >= MIN_SAMPLES
+                # 失敗率過高的排後面；樣本足夠的依中位數延遲，否則維持路由表順序
+                return (stats.failure_rate() > DEMOTE_FAILURE_RATE,
+                        stats.latency.percentile(50) if enough else 0.0, index)
+            return [provider for _, provider in sorted(enumerate(providers), key=key)]
+
+    def fetch(self, symbols):
+        groups = {}
+        for symbol in symbols:
+            groups.setdefault(tuple(self.candidates(symbol)), []).append(symbol)
+        if len(groups) == 1:
+            (candidates, group), = groups.items()
+            return self._resolve(list(candidates), group)
+        # 不同來源的分組同時抓取
+        futures = [self._groups.submit(self._resolve, list(candidates), group)
+                   for candidates, group in groups.items()]
+        quotes, error = {}, None
+        for future in futures:
+            try:
+                quotes.update(future.result())
+            except Exception as e:
+                error = e
+        if error is not None and not any(valid(q) for q in quotes.values()):
+            raise error
+        return quotes
+
+    def _resolve(self, candidates, symbols):
+        """依序嘗試來源，已拿到報價的代碼不再往下問；全部來源都整批失敗時拋出最後的例外"""
+        quotes = {}
+        remaining = list(symbols)
+        error = None
+        i = 0
+        while remaining and i < len(candidates):
+            provider = candidates[i]
+            i += 1
+            backup = candidates[i] if self.hedge and i < len(candidates) else None
+            if backup is not None:
+                got, errors, used_backup = self._race(provider, backup, remaining)
+                if used_backup:
+                    i += 1
+            else:
+                got, failure = self._call(provider, remaining)
+                errors = [failure] if failure else []
+                with self._lock:
+                    self.stats[provider.name].served += sum(1 for s in remaining if valid(got.get(s)))
+            error = errors[-1] if errors else error
+            for symbol in remaining:
+                if symbol in got:
+                    quotes[symbol] = got[symbol]
+            remaining = [s for s in remaining if not valid(quotes.get(s))]
+        if error is not None and not any(valid(q) for q in quotes.values()):
+            raise error
+        return quotes
+
+    def _call(self, provider, symbols):
+        """回傳 (報價, 例外)，並記錄這個來源的延遲與成敗"""
+        start = time.perf_counter()
+        try:
+            quotes = provider.fetch(symbols)
+        except Exception as e:
+            self._record(provider, time.perf_counter() - start, False)
+            return {}, e
+        self._record(provider, time.perf_counter() - start, any(valid(q) for q in quotes.values()))
+        return quotes, None
+
+    def _record(self, provider, seconds, ok):
+        with self._lock:
+            self.stats[provider.name].record(seconds, ok)
+
+    def _delay(self, provider):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            latency = self.stats[provider.name].latency
+            if latency.count < MIN_SAMPLES:
+                return HEDGE_DEFAULT_DELAY
+            return latency.percentile(90)
+
+    def _race(self, provider, backup, symbols):
+        """主要來源超過延遲門檻還沒回來就同時問備用來源，每檔採用先回來的有效報價
+
+        回傳 (報價, 例外清單, 是否送出備用請求)；落後的請求在背景完成，只用來更新延遲統計。
+        """
+        futures = {self._calls.submit(self._call, provider, symbols): provider}
+        done, _ = wait(futures, timeout=self._delay(provider), return_when=FIRST_COMPLETED)
+        if not done:
+            futures[self._calls.submit(self._call, backup, symbols)] = backup
+            with self._lock:
+                self.hedged += 1
+        quotes, errors = {}, []
+        remaining = set(symbols)
+        for future in as_completed(futures):
+            got, error = future.result()
+            if error is not None:
+                errors.append(error)
+            won = [s for s in remaining if valid(got.get(s))]
+            for symbol in remaining:
+                if symbol in got and (symbol in won or symbol not in quotes):
+                    quotes[symbol] = got[symbol]
+            remaining.difference_update(won)
+            with self._lock:
+                self.stats[futures[future].name].served += len(won)
+            if not remaining:
+                break
+        return quotes, errors, len(futures) > 1
+
+    def snapshot(self):
+        """{"providers": {名稱: 毫秒統計與失敗率}, "hedged": 次數}，供統計面板顯示"""
+        with self._lock:
+            providers = {}
+            for name, stats in self.stats.items():
+                latency = stats.latency
+                if not latency.samples:
+                    continue
+                providers[name] = {"count": latency.count, "p50": latency.percentile(50) * 1000,
+                                   "p95": latency.percentile(95) * 1000, "failure_rate": stats.failure_rate(),
+                                   "served": stats.served}
+            return {"providers": providers, "hedged": self.hedged}
+
+    def shutdown(self):
+        self._groups.shutdown(wait=False)
+        self._calls.shutdown(wait=False)
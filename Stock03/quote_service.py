@@ -0,0 +1,199 @@
+"""不依賴 Tk 的報價服務：建立受保護的抓取器與報價引擎，以及在本機 socket 提供報價的常駐程式
+
+GUI（ST03.py）與命令列（stockview_cli.py）都由這裡建立報價引擎，抓取設定只有一份。
+"""
+import json
+import os
+import select
+import socketserver
+import threading
+
+from fetch_guard import GuardedFetcher
+from quote_engine import QuoteCache, QuoteEngine, make_http_fetcher
+from quote_feeds import PollingFeed, TickBuffer, encode_message
+from quote_providers import CsvProvider, ProviderRouter, TwseProvider, YahooProvider
+from refresh_scheduler import RefreshScheduler
+
+QUOTE_SERVER_URL = os.environ.get("STOCKVIEW_QUOTE_URL")  # 設定後改抓 Yahoo quote 格式的端點（如 fake_quote_server）
+QUOTE_CSV = os.environ.get("STOCKVIEW_QUOTE_CSV")  # 本機報價檔（symbol,price,prev_close[,volume]），檔中的代碼優先採用
+HEDGE_REQUESTS = os.environ.get("STOCKVIEW_HEDGE") == "1"  # 主要來源太慢時同時向下一個來源請求
+FETCH_RATE = 10  # 每秒最多抓取幾檔（權杖桶）
+FETCH_BURST = 100  # 權杖桶容量
+FETCH_CONCURRENCY = 2  # 同時進行的抓取數
+FETCH_RETRIES = 3  # 整批失敗時的重試次數（指數退避加抖動）
+QUOTE_BATCH_SIZE = 100  # 每個批次的股票數
+QUOTE_CACHE_TTL = 30  # 報價快取有效秒數，過期仍先顯示再背景更新
+QUOTE_CACHE_SIZE = 2000  # 快取上限，超過時淘汰最久未用的代碼
+DAEMON_ADDRESS = os.environ.get("STOCKVIEW_DAEMON", "127.0.0.1:8766")  # 常駐程式的本機位址
+DAEMON_PUSH_INTERVAL = 0.1  # 常駐程式推送累積報價的間隔（秒）
+
+
+def create_router(hedge=HEDGE_REQUESTS, csv_path=QUOTE_CSV):
+    """依代碼後綴分派的多來源抓取器：.TW/.TWO 先問證交所，其餘問 Yahoo；csv_path 的代碼優先"""
+    providers = [TwseProvider(), YahooProvider()]
+    if csv_path:
+        providers.insert(0, CsvProvider(csv_path))
+    return ProviderRouter(providers, hedge=hedge)
+
+
+def create_fetcher(url=None, telemetry=None, router=None):
+    """telemetry 為 Telemetry 時記錄每批實際抓取的延遲（限流與重試的等待不計入）
+
+    沒有設定 HTTP 端點時經由 router（ProviderRouter，預設由 create_router 建立）抓取。
+    """
+    url = url or QUOTE_SERVER_URL
+    raw = make_http_fetcher(url) if url else (router or create_router())
+    if telemetry:
+        raw = telemetry.timed_fetcher(raw)
+    if url:
+        # HTTP 端點一次請求抓整批，權杖依請求數計算
+        return GuardedFetcher(raw, rate=FETCH_RATE, burst=FETCH_BURST,
+                              per_symbol_cost=False, max_concurrency=FETCH_CONCURRENCY, retries=FETCH_RETRIES)
+    return GuardedFetcher(raw, rate=FETCH_RATE, burst=FETCH_BURST,
+                          max_concurrency=FETCH_CONCURRENCY, retries=FETCH_RETRIES)
+
+
+def create_engine(fetcher=None, telemetry=None, router=None):
+    return QuoteEngine(fetcher or create_fetcher(telemetry=telemetry, router=router),
+                       cache=QuoteCache(QUOTE_CACHE_TTL, QUOTE_CACHE_SIZE))
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class QuoteDaemon(socketserver.ThreadingTCPServer):
+    """常駐報價服務：一個輪詢迴圈供多個 GUI 共用，每個連線只收到自己訂閱的代碼
+
+    協定為每行一個 JSON：
+      {"op": "subscribe", "symbols": [...]}  先回覆快取，之後持續推送 {"quotes": {...}}
+      {"op": "quote", "symbols": [...]}      回覆一次 {"quotes": {...}}，過期的代碼會先抓取
+      {"op": "status"}                       回覆 {"status": {...}}
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=None, engine=None, tick=1.0):
+        super().__init__(address or parse_address(DAEMON_ADDRESS), _DaemonHandler)
+        self.engine = engine or create_engine()
+        self.scheduler = RefreshScheduler()
+        self.feed = PollingFeed(self.engine, self.scheduler, tick=tick)
+        self.clients = set()
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        return f"{self.server_address[0]}:{self.server_address[1]}"
+
+    def put(self, symbol, quote):
+        self.put_many({symbol: quote})
+
+    def put_many(self, quotes):
+        """輪詢來源的 sink：分送給訂閱了這些代碼的連線"""
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            wanted = {s: q for s, q in quotes.items() if s in client.symbols}
+            if wanted:
+                client.buffer.put_many(wanted)
+
+    def add_client(self, client):
+        with self._lock:
+            self.clients.add(client)
+
+    def remove_client(self, client):
+        with self._lock:
+            self.clients.discard(client)
+        self.update_subscriptions()
+
+    def update_subscriptions(self):
+        """輪詢所有連線訂閱代碼的聯集，同一代碼只抓一次"""
+        with self._lock:
+            symbols = set().union(*(client.symbols for client in self.clients))
+        self.feed.subscribe(symbols)
+
+    def start(self):
+        """在背景執行緒服務（測試與效能量測用）"""
+        self.feed.start(self)
+        threading.Thread(target=self.serve_forever, name="quote-daemon", daemon=True).start()
+        return self
+
+    def serve(self):
+        self.feed.start(self)
+        try:
+            self.serve_forever()
+        finally:
+            self.feed.stop()
+            self.server_close()
+
+    def stop(self):
+        self.feed.stop()
+        self.shutdown()
+        self.server_close()
+
+
+class _DaemonHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.symbols = set()
+        self.buffer = TickBuffer()
+        self.server.add_client(self)
+
+    def finish(self):
+        self.server.remove_client(self)
+
+    def handle(self):
+        pending = b""
+        while True:
+            readable, _, _ = select.select([self.request], [], [], DAEMON_PUSH_INTERVAL)
+            if readable:
+                try:
+                    data = self.request.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        self.respond(line)
+            if quotes := self.buffer.take():
+                if not self.send({"quotes": quotes}):
+                    return
+
+    def respond(self, line):
+        engine = self.server.engine
+        try:
+            request = json.loads(line)
+            op = request.get("op")
+            symbols = [s for s in request.get("symbols", []) if isinstance(s, str)]
+        except (ValueError, AttributeError) as e:
+            self.send({"error": f"無法解析請求：{str(e)}"})
+            return
+        if op == "subscribe":
+            self.symbols = set(symbols)
+            self.server.update_subscriptions()
+            quotes, _ = engine.cached(symbols)
+            self.send({"quotes": quotes})  # 新代碼由輪詢來源在下一輪抓取
+        elif op == "quote":
+            quotes, stale = engine.cached(symbols)
+            if stale:
+                quotes.update(engine.fetch(stale))
+            self.send({"quotes": quotes})
+        elif op == "status":
+            cache = engine.cache
+            self.send({"status": {
+                "clients": len(self.server.clients),
+                "symbols": len(self.server.feed.symbols),
+                "cache_hits": cache.hits, "cache_misses": cache.misses,
+            }})
+        else:
+            self.send({"error": f"未知的指令：{op}"})
+
+    def send(self, message):
+        try:
+            self.request.sendall(encode_message(message))
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,84 @@
+"""UI 動作的刷新請求匯流排：重繪（從資料模型）與重抓（從網路）分開排隊
+
+重繪請求每個畫面週期取出一次；重抓請求從第一個請求起等 window 秒，期間同一分頁的請求合併成一次
+（優先順序取最高、任一請求 force 就 force）。抓取中的代碼不會再送出，連點刷新或快速切換分頁也只抓一次。
+"""
+import time
+
+from quote_engine import PRIORITY_NORMAL
+
+REFRESH_COALESCE = 0.05  # 合併重抓請求的時間窗（秒）
+INFLIGHT_TIMEOUT = 30  # 送出後超過幾秒沒有結果就不再視為抓取中（抓取失敗時）
+
+
+class RefreshBus:
+    """只在主執行緒使用，不需要鎖"""
+
+    def __init__(self, window=REFRESH_COALESCE, inflight_timeout=INFLIGHT_TIMEOUT):
+        self.window = window
+        self.inflight_timeout = inflight_timeout
+        self._dirty = set()  # 待重繪的分頁
+        self._requests = {}  # 分頁（None 表示不屬於分頁，如匯率）-> [優先順序, force]
+        self._deadline = None
+        self._inflight = {}  # symbol -> 送出時間
+        self.requested = 0  # 累計收到的重抓請求
+        self.dispatched = 0  # 合併後實際處理的次數
+        self.skipped = 0  # 因為已在抓取中而略過的代碼數
+
+    # ---- 重繪 ----
+
+    def render(self, tab):
+        self._dirty.add(tab)
+
+    def take_render(self):
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    # ---- 重抓 ----
+
+    def fetch(self, tabs, priority=PRIORITY_NORMAL, force=False, now=None):
+        now = time.monotonic() if now is None else now
+        for tab in tabs or [None]:
+            if request := self._requests.get(tab):
+                request[0] = min(request[0], priority)
+                request[1] = request[1] or force
+            else:
+                self._requests[tab] = [priority, force]
+        self.requested += 1
+        if self._deadline is None:
+            self._deadline = now + self.window
+
+    def pending(self):
+        return bool(self._requests)
+
+    def take_fetch(self, now=None):
+        """時間窗結束時取出合併後的請求 [(優先順序, force, [分頁])]，高優先順序在前"""
+        now = time.monotonic() if now is None else now
+        if self._deadline is None or now < self._deadline:
+            return []
+        groups = {}
+        for tab, (priority, force) in self._requests.items():
+            tabs = groups.setdefault((priority, force), [])
+            if tab is not None:
+                tabs.append(tab)
+        self._requests.clear()
+        self._deadline = None
+        self.dispatched += 1
+        return [(priority, force, tabs) for (priority, force), tabs in sorted(groups.items())]
+
+    def claim(self, symbols, now=None):
+        """回傳不在抓取中的代碼，並把它們標記為抓取中"""
+        now = time.monotonic() if now is None else now
+        claimed = []
+        for symbol in symbols:
+            sent = self._inflight.get(symbol)
+            if sent is not None and now - sent < self.inflight_timeout:
+                self.skipped += 1
+                continue
+            self._inflight[symbol] = now
+            claimed.append(symbol)
+        return claimed
+
+    def release(self, symbols):
+        for symbol in symbols:
+            self._inflight.pop(symbol, None)
@@ -0,0 +1,183 @@
+"""依交易所與盤別決定每檔股票的刷新頻率：盤中快、盤前盤後慢、休市不抓"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# 各交易所交易時段（當地時間）；pre/post 為 None 表示沒有盤前/盤後
+EXCHANGES = {
+    "US": {"tz": "America/New_York", "utc_offset": -5, "pre": (4, 0), "open": (9, 30), "close": (16, 0), "post": (20, 0)},
+    "TW": {"tz": "Asia/Taipei", "utc_offset": 8, "pre": None, "open": (9, 0), "close": (13, 30), "post": (14, 30)},
+    "HK": {"tz": "Asia/Hong_Kong", "utc_offset": 8, "pre": None, "open": (9, 30), "close": (16, 0), "post": None},
+    "JP": {"tz": "Asia/Tokyo", "utc_offset": 9, "pre": None, "open": (9, 0), "close": (15, 30), "post": None},
+    "CN": {"tz": "Asia/Shanghai", "utc_offset": 8, "pre": None, "open": (9, 30), "close": (15, 0), "post": None},
+    "UK": {"tz": "Europe/London", "utc_offset": 0, "pre": None, "open": (8, 0), "close": (16, 30), "post": None},
+}
+
+SUFFIX_EXCHANGE = {
+    ".TW": "TW", ".TWO": "TW",
+    ".HK": "HK", ".T": "JP",
+    ".SS": "CN", ".SZ": "CN",
+    ".L": "UK",
+}
+
+# 各盤別的刷新間隔（秒）
+CADENCE = {"REGULAR": 15, "PRE": 60, "POST": 60}
+CLOSED_RECHECK = 1800  # 報價顯示休市但日曆顯示開盤（例如假日）時，隔多久再確認一次
+
+# Yahoo marketState 對應到排程用的盤別
+_REPORTED_STATES = {
+    "PREPRE": "CLOSED", "PRE": "PRE", "REGULAR": "REGULAR",
+    "POST": "POST", "POSTPOST": "CLOSED", "CLOSED": "CLOSED",
+}
+
+_tz_cache = {}
+
+
+def _timezone(exchange):
+    """優先使用 zoneinfo，Windows 沒有 tzdata 時改用 pytz，都沒有就用固定時差"""
+    if exchange in _tz_cache:
+        return _tz_cache[exchange]
+    info = EXCHANGES[exchange]
+    tz = None
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(info["tz"])
+    except Exception:
+        try:
+            import pytz
+            tz = pytz.timezone(info["tz"])
+        except Exception:
+            tz = timezone(timedelta(hours=info["utc_offset"]))
+    _tz_cache[exchange] = tz
+    return tz
+
+
+def exchange_of(symbol):
+    """依代碼後綴判斷交易所；加密貨幣與外匯全天交易"""
+    if symbol.endswith("-USD"):
+        return "CRYPTO"
+    if symbol.endswith("=X"):
+        return "FX"
+    for suffix, exchange in SUFFIX_EXCHANGE.items():
+        if symbol.endswith(suffix):
+            return exchange
+    return "US"
+
+
+def local_date(symbol, timestamp=None):
+    """代碼所屬交易所當地的日期序號（date.toordinal），用於判斷是否換了交易日"""
+    exchange = exchange_of(symbol)
+    tz = timezone.utc if exchange in ("CRYPTO", "FX") else _timezone(exchange)
+    return datetime.fromtimestamp(timestamp or time.time(), tz).date().toordinal()
+
+
+def _at(day, hm):
+    return day.replace(hour=hm[0], minute=hm[1], second=0, microsecond=0)
+
+
+def market_state(exchange, now=None):
+    """依交易日曆回傳 PRE/REGULAR/POST/CLOSED（不含國定假日）"""
+    if exchange == "CRYPTO":
+        return "REGULAR"
+    if exchange == "FX":
+        weekday = datetime.fromtimestamp(now or time.time(), timezone.utc).weekday()
+        return "REGULAR" if weekday < 5 else "CLOSED"
+
+    info = EXCHANGES[exchange]
+    local = datetime.fromtimestamp(now or time.time(), _timezone(exchange))
+    if local.weekday() >= 5:
+        return "CLOSED"
+    if info["pre"] and _at(local, info["pre"]) <= local < _at(local, info["open"]):
+        return "PRE"
+    if _at(local, info["open"]) <= local < _at(local, info["close"]):
+        return "REGULAR"
+    if info["post"] and _at(local, info["close"]) <= local < _at(local, info["post"]):
+        return "POST"
+    return "CLOSED"
+
+
+def next_session_start(exchange, now=None):
+    """下一個交易時段（含盤前）開始的時間戳"""
+    if exchange in ("CRYPTO", "FX"):
+        local = datetime.fromtimestamp(now or time.time(), timezone.utc)
+        days = (7 - local.weekday()) % 7 or 7
+        return (local + timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    info = EXCHANGES[exchange]
+    local = datetime.fromtimestamp(now or time.time(), _timezone(exchange))
+    start = info["pre"] or info["open"]
+    for days in range(8):
+        day = local + timedelta(days=days)
+        if day.weekday() >= 5:
+            continue
+        candidate = _at(day, start)
+        if candidate > local:
+            return candidate.timestamp()
+    return (local + timedelta(days=1)).timestamp()
+
+
+class RefreshScheduler:
+    """記錄每檔股票下次應刷新的時間；不同交易所各自獨立排程
+
+    主執行緒與推播來源的執行緒都會呼叫，所有狀態變更都在鎖內進行。
+    """
+
+    def __init__(self, cadence=None, closed_recheck=CLOSED_RECHECK):
+        self.cadence = dict(CADENCE, **(cadence or {}))
+        self.closed_recheck = closed_recheck
+        self.next_due = {}  # symbol -> timestamp
+        self.reported = {}  # symbol -> 報價帶回的 marketState
+        self._lock = threading.Lock()
+
+    def state_of(self, symbol, now=None):
+        """報價有帶盤別就以報價為準，否則依交易日曆"""
+        reported = self.reported.get(symbol)
+        if reported:
+            return reported
+        return market_state(exchange_of(symbol), now)
+
+    def _schedule(self, symbol, now):
+        state = self.state_of(symbol, now)
+        if state != "CLOSED":
+            self.next_due[symbol] = now + self.cadence[state]
+            return
+        exchange = exchange_of(symbol)
+        if market_state(exchange, now) == "CLOSED":
+            self.next_due[symbol] = next_session_start(exchange, now)
+        else:
+            # 日曆顯示開盤但報價顯示休市，多半是假日
+            self.next_due[symbol] = now + self.closed_recheck
+
+    def mark(self, symbols, now=None):
+        """這些代碼剛送出抓取，排定下一次時間"""
+        now = now or time.time()
+        with self._lock:
+            for symbol in symbols:
+                self._schedule(symbol, now)
+
+    def due(self, symbols, now=None):
+        """回傳到期的代碼並同時排定下一次，避免抓取中被重複送出"""
+        now = now or time.time()
+        with self._lock:
+            due = [symbol for symbol in symbols if self.next_due.get(symbol, 0) <= now]
+            for symbol in due:
+                self._schedule(symbol, now)
+        return due
+
+    def observe(self, quotes, now=None):
+        """記下報價帶回的盤別；盤別改變時重新排程"""
+        now = now or time.time()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                reported = _REPORTED_STATES.get((quote or {}).get('market_state'))
+                if reported and reported != self.reported.get(symbol):
+                    self.reported[symbol] = reported
+                    self._schedule(symbol, now)
+
+    def describe(self, symbols, now=None):
+        """各交易所目前盤別，供狀態列顯示"""
+        now = now or time.time()
+        states = {}
+        for symbol in symbols:
+            states.setdefault(exchange_of(symbol), self.state_of(symbol, now))
+        return states
@@ -0,0 +1,69 @@
+"""盤中走勢小圖：由 BarStore 的價位產生 PhotoImage，依 (代碼, 資料版本) 快取，資料沒變就不重畫"""
+import tkinter as tk
+from collections import OrderedDict
+
+import numpy as np
+
+SPARK_WIDTH = 64
+SPARK_HEIGHT = 18
+SPARK_COLORS = {"rise": "#33FF77", "fall": "#FF1919"}
+
+
+def sparkline_mask(prices, width=SPARK_WIDTH, height=SPARK_HEIGHT):
+    """把價位縮放到 width x height 的布林點陣；相鄰兩欄以垂直線段相連"""
+    x = np.linspace(0, len(prices) - 1, width)
+    y = np.interp(x, np.arange(len(prices)), prices)
+    low, high = y.min(), y.max()
+    if high > low:
+        scaled = np.rint((high - y) / (high - low) * (height - 1)).astype(int)
+    else:
+        scaled = np.full(width, height // 2)
+    previous = np.concatenate(([scaled[0]], scaled[:-1]))
+    top, bottom = np.minimum(scaled, previous), np.maximum(scaled, previous)
+    rows = np.arange(height)[:, None]
+    return (rows >= top) & (rows <= bottom)
+
+
+def sparkline_data(mask, color, background):
+    """轉成 PhotoImage.put 一次寫入整張圖的字串"""
+    pixels = np.where(mask, color, background)
+    return " ".join("{" + " ".join(row) + "}" for row in pixels)
+
+
+class SparklineCache:
+    """每檔一張 PhotoImage；版本改變時就地重畫同一張圖，Treeview 不必重新設定 image"""
+
+    def __init__(self, master, width=SPARK_WIDTH, height=SPARK_HEIGHT, background="black", max_size=2000):
+        self.master = master
+        self.width = width
+        self.height = height
+        self.background = background
+        self.max_size = max_size
+        self._images = OrderedDict()  # symbol -> [version, 目前的結果（PhotoImage 或空字串）, PhotoImage]
+        self.renders = 0  # 實際重畫次數
+
+    def get(self, symbol, version, prices):
+        """prices 為可呼叫物件，只有需要重畫時才取出價位；少於兩點回傳空字串"""
+        entry = self._images.get(symbol)
+        if entry is not None:
+            self._images.move_to_end(symbol)
+            if entry[0] == version:
+                return entry[1]
+        values = prices()
+        values = values[~np.isnan(values)]
+        if entry is None:
+            entry = self._images[symbol] = [version, '', None]
+            if len(self._images) > self.max_size:
+                self._images.popitem(last=False)
+        entry[0] = version
+        if len(values) < 2:
+            entry[1] = ''  # 空結果也依版本快取，盤前與新代碼不會每個畫面都重新取價位
+            return ''
+        if entry[2] is None:
+            entry[2] = tk.PhotoImage(master=self.master, width=self.width, height=self.height)
+        color = SPARK_COLORS["rise" if values[-1] >= values[0] else "fall"]
+        entry[2].put(sparkline_data(sparkline_mask(values, self.width, self.height), color, self.background),
+                     to=(0, 0))
+        entry[1] = entry[2]
+        self.renders += 1
+        return entry[1]
@@ -0,0 +1,144 @@
+"""不開視窗的命令列入口：依工作區抓取報價輸出成表格、JSON 或 CSV，或作為常駐程式在本機 socket 提供報價
+
+    python stockview_cli.py quotes                          # 工作區所有分頁
+    python stockview_cli.py quotes --tab L1 --format json   # 指定分頁
+    python stockview_cli.py quotes AAPL 2330.TW --format csv
+    python stockview_cli.py quotes --daemon                 # 向常駐程式查詢，不自行連網
+    python stockview_cli.py daemon                          # 常駐，GUI 以 --feed daemon 連線共用
+"""
+import argparse
+import csv
+import json
+import socket
+import sys
+
+from quote_feeds import encode_message
+from quote_service import DAEMON_ADDRESS, QUOTE_BATCH_SIZE, QuoteDaemon, create_engine, parse_address
+from workspace_store import LEGACY_CONFIG_FILE, WORKSPACE_FILE, WorkspaceStore
+
+FIELDS = ("tab", "symbol", "price", "prev_close", "change", "change_percent", "market_state", "error")
+
+
+def collect(workspace, tabs=None):
+    """工作區中的 (分頁名稱, 代碼)；tabs 指定分頁名稱時只取這些分頁"""
+    store = WorkspaceStore(workspace)
+    try:
+        if store.is_empty():
+            store.import_legacy(LEGACY_CONFIG_FILE)
+        layout = store.load_tabs()
+    finally:
+        store.close()
+    return [(tab["name"], symbol)
+            for side in ["left", "right"] for tab in layout.get(side, [])
+            if not tabs or tab["name"] in tabs
+            for symbol in tab["symbols"]]
+
+
+def fetch(symbols, batch_size=QUOTE_BATCH_SIZE):
+    """以與 GUI 相同的報價引擎（限流、重試、熔斷）分批抓取"""
+    engine = create_engine()
+    quotes = {}
+    for start in range(0, len(symbols), batch_size):
+        quotes.update(engine.fetch(symbols[start:start + batch_size]))
+    return quotes
+
+
+def query_daemon(address, symbols, timeout=60):
+    """向常駐程式查詢一次"""
+    with socket.create_connection(address, timeout=timeout) as sock:
+        sock.sendall(encode_message({"op": "quote", "symbols": symbols}))
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    message = json.loads(data)
+    if "error" in message:
+        raise RuntimeError(message["error"])
+    return message["quotes"]
+
+
+def build_rows(pairs, quotes):
+    rows = []
+    for tab, symbol in pairs:
+        quote = quotes.get(symbol) or {}
+        row = {field: quote.get(field) for field in FIELDS}
+        row.update(tab=tab, symbol=symbol)
+        rows.append(row)
+    return rows
+
+
+def write_table(rows, out):
+    columns = ("tab", "symbol", "price", "change_percent", "market_state", "error")
+    cells = [[_cell(row[c]) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(line[i]) for line in cells]) for i, c in enumerate(columns)]
+    out.write("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip() + "\n")
+    for line in cells:
+        out.write("  ".join(v.ljust(w) for v, w in zip(line, widths)).rstrip() + "\n")
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def write_json(rows, out):
+    json.dump(rows, out, ensure_ascii=False, indent=2)
+    out.write("\n")
+
+
+def write_csv(rows, out):
+    writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+WRITERS = {"table": write_table, "json": write_json, "csv": write_csv}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="雙窗看股系統（命令列）")
+    parser.add_argument("--workspace", default=WORKSPACE_FILE, help="工作區檔案")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quotes_cmd = commands.add_parser("quotes", help="抓取一次並輸出")
+    quotes_cmd.add_argument("symbols", nargs="*", help="指定代碼；省略時使用工作區的分頁")
+    quotes_cmd.add_argument("--tab", action="append", help="只輸出指定分頁（可重複）")
+    quotes_cmd.add_argument("--format", choices=sorted(WRITERS), default="table")
+    quotes_cmd.add_argument("--daemon", nargs="?", const=DAEMON_ADDRESS, metavar="HOST:PORT",
+                            help="向常駐程式查詢而不自行連網")
+
+    daemon_cmd = commands.add_parser("daemon", help="常駐並在本機 socket 提供報價")
+    daemon_cmd.add_argument("--address", default=DAEMON_ADDRESS, metavar="HOST:PORT")
+
+    args = parser.parse_args(argv)
+    if args.command == "daemon":
+        server = QuoteDaemon(parse_address(args.address))
+        print(f"報價常駐程式：{server.address}")
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.symbols:
+        pairs = [("", symbol) for symbol in dict.fromkeys(s.upper() for s in args.symbols)]
+    else:
+        pairs = collect(args.workspace, args.tab)
+    symbols = list(dict.fromkeys(symbol for _, symbol in pairs))
+    if not symbols:
+        print("沒有可抓取的代碼", file=sys.stderr)
+        return 1
+    try:
+        quotes = query_daemon(parse_address(args.daemon), symbols) if args.daemon else fetch(symbols)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"獲取數據失敗：{str(e)}", file=sys.stderr)
+        return 1
+    WRITERS[args.format](build_rows(pairs, quotes), sys.stdout)
+    return 0 if any((q or {}).get('price') is not None for q in quotes.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""本機股票代碼索引：排序清單加二分搜尋，新增股票時即時驗證與自動完成，不必連網"""
+import csv
+import io
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from urllib.request import Request, urlopen
+
+BUNDLED_FILE = "symbols.csv"  # 隨程式附帶的常用代碼
+CACHE_FILE = "symbols_cache.csv"  # 定期下載的完整清單與驗證過的新代碼
+REFRESH_DAYS = 7  # 清單超過幾天就在背景重新下載
+
+NASDAQ_LISTED_URL = "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt"
+OTHER_LISTED_URL = "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt"
+TWSE_URL = "https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL"
+TPEX_URL = "https://www.tpex.org.tw/openapi/v1/tpex_mainboard_daily_close_quotes"
+
+
+class SymbolIndex:
+    """代碼與名稱各一份排序清單，前綴查詢為 O(log n + k)"""
+
+    def __init__(self):
+        self.names = {}  # symbol -> name
+        self._symbols = []  # 排序後的代碼
+        self._by_name = []  # 排序後的 (大寫名稱, symbol)
+        self._lock = threading.Lock()  # 背景下載完成時會合併進來
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, symbol):
+        return symbol in self.names
+
+    def add(self, symbol, name=""):
+        with self._lock:
+            self._add(symbol, name)
+
+    def _add(self, symbol, name):
+        if symbol in self.names:
+            return
+        self.names[symbol] = name
+        insort(self._symbols, symbol)
+        if name:
+            insort(self._by_name, (name.upper(), symbol))
+
+    def update(self, entries):
+        """一次合併大量 (symbol, name)，最後才排序"""
+        with self._lock:
+            for symbol, name in entries:
+                if symbol and symbol not in self.names:
+                    self.names[symbol] = name
+                    self._symbols.append(symbol)
+                    if name:
+                        self._by_name.append((name.upper(), symbol))
+            self._symbols.sort()
+            self._by_name.sort()
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                entries = [(row["symbol"].strip().upper(), row.get("name", "").strip()) for row in csv.DictReader(f)]
+        except (OSError, KeyError, csv.Error) as e:
+            print(f"代碼清單讀取失敗：{path} - {str(e)}")
+            return 0
+        self.update(entries)
+        return len(entries)
+
+    def market(self, suffix):
+        """某市場的所有代碼（排序後）；suffix 為 .TW、.TWO 等，空字串表示美股"""
+        with self._lock:
+            if suffix:
+                return [s for s in self._symbols if s.endswith(suffix)]
+            return [s for s in self._symbols
+                    if not any(c in s for c in ".=^") and not s.endswith("-USD")]
+
+    def complete(self, prefix, limit=8):
+        """先列出代碼前綴相符者，不足再以公司名稱前綴補足"""
+        prefix = prefix.strip().upper()
+        if not prefix:
+            return []
+        with self._lock:
+            results = []
+            start = bisect_left(self._symbols, prefix)
+            for symbol in self._symbols[start:start + limit]:
+                if not symbol.startswith(prefix):
+                    break
+                results.append((symbol, self.names[symbol]))
+            start = bisect_left(self._by_name, (prefix, ""))
+            for name, symbol in self._by_name[start:start + limit]:
+                if len(results) >= limit or not name.startswith(prefix):
+                    break
+                if all(symbol != s for s, _ in results):
+                    results.append((symbol, self.names[symbol]))
+            return results
+
+
+def parse_symbols(text):
+    """把輸入或貼上的文字拆成代碼清單（空白、逗號、分號或換行分隔），去除重複"""
+    return list(dict.fromkeys(s for s in re.split(r"[\s,;]+", text.upper()) if s))
+
+
+def append_cache(path, entries):
+    """把網路驗證通過的新代碼記下來，下次啟動就不必再連網驗證"""
+    new_file = not os.path.exists(path)
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["symbol", "name"])
+        writer.writerows(entries)
+
+
+def cache_is_stale(path, days=REFRESH_DAYS):
+    return not os.path.exists(path) or time.time() - os.path.getmtime(path) > days * 86400
+
+
+def _get(url, timeout=30):
+    request = Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    with urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def _nasdaq_entries(text, symbol_field):
+    """解析 nasdaqtrader 的直線分隔清單；類股代碼的 '.' 改成 Yahoo 使用的 '-'"""
+    rows = csv.DictReader(io.StringIO(text), delimiter="|")
+    for row in rows:
+        symbol = (row.get(symbol_field) or "").strip()
+        if not symbol or symbol.startswith("File Creation Time") or row.get("Test Issue") == "Y":
+            continue
+        yield symbol.replace(".", "-"), (row.get("Security Name") or "").strip()
+
+
+def download_symbol_lists():
+    """下載美股與台股上市櫃清單；任一來源失敗就略過該來源"""
+    entries = []
+    sources = [
+        (NASDAQ_LISTED_URL, lambda raw: _nasdaq_entries(raw.decode("utf-8", "replace"), "Symbol")),
+        (OTHER_LISTED_URL, lambda raw: _nasdaq_entries(raw.decode("utf-8", "replace"), "ACT Symbol")),
+        (TWSE_URL, lambda raw: ((f"{r['Code']}.TW", r.get("Name", "")) for r in json.loads(raw))),
+        (TPEX_URL, lambda raw: ((f"{r['SecuritiesCompanyCode']}.TWO", r.get("CompanyName", ""))
+                                for r in json.loads(raw))),
+    ]
+    for url, parse in sources:
+        try:
+            entries.extend(parse(_get(url)))
+        except Exception as e:
+            print(f"代碼清單下載失敗：{url} - {str(e)}")
+    return entries
+
+
+def refresh_cache(path=CACHE_FILE):
+    """背景下載完整清單並以暫存檔取代舊快取，保留先前驗證通過的代碼"""
+    entries = download_symbol_lists()
+    if not entries:
+        return []
+    known = {symbol for symbol, _ in entries}
+    if os.path.exists(path):
+        previous = SymbolIndex()
+        previous.load(path)
+        entries.extend((s, n) for s, n in previous.names.items() if s not in known)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "name"])
+        writer.writerows(entries)
+    os.replace(tmp_path, path)
+    return entries
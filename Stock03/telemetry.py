@@ -0,0 +1,200 @@
+"""效能統計：抓取延遲、快取命中率、佇列深度、Treeview 更新時間與主迴圈卡頓，另可選擇以 cProfile 剖析主執行緒
+
+量測本身只是 perf_counter 與 deque 附加，一直開著；統計面板只在顯示時每秒整理一次。
+"""
+import cProfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+STATS_WINDOW = 200  # 每項統計保留最近幾筆樣本
+STALL_THRESHOLD = 0.1  # 主迴圈比預定晚超過幾秒算一次卡頓
+SLOW_SYMBOLS = 5  # 面板列出最慢的幾檔
+PROFILE_FILE = "stockview.prof"  # 剖析結果，可用 python -m pstats 或 snakeviz 開啟
+
+
+class RollingStat:
+    """最近 window 筆樣本（秒），另記累計次數與歷史最大值"""
+
+    def __init__(self, window=STATS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.peak = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.peak = max(self.peak, value)
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+
+class Telemetry:
+    """各執行緒都可以記錄；snapshot() 取出目前的統計"""
+
+    def __init__(self, window=STATS_WINDOW, stall_threshold=STALL_THRESHOLD):
+        self.window = window
+        self.stall_threshold = stall_threshold
+        self.stats = {}  # 名稱 -> RollingStat
+        self.gauges = {}  # 名稱 -> 最近一次的值（佇列深度等）
+        self.symbol_latency = {}  # symbol -> 最近一次所在批次的抓取秒數
+        self.stalls = 0
+        self._last_beat = None
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = RollingStat(self.window)
+            stat.add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def timed_fetcher(self, fetcher):
+        """包住 fetcher(symbols)：記錄每批的網路延遲（不含限流等待）、平均每檔延遲與各代碼最近一次延遲"""
+        def fetch(symbols):
+            start = time.perf_counter()
+            try:
+                return fetcher(symbols)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.record("fetch", elapsed)
+                if symbols:
+                    self.record("fetch_per_symbol", elapsed / len(symbols))
+                with self._lock:
+                    for symbol in symbols:
+                        self.symbol_latency[symbol] = elapsed
+        return fetch
+
+    def heartbeat(self, interval):
+        """主迴圈的定期回呼每次呼叫一次：實際間隔超出 interval 的部分就是事件迴圈被卡住的時間"""
+        now = time.perf_counter()
+        if self._last_beat is not None:
+            lag = max(0.0, now - self._last_beat - interval)
+            self.record("loop_lag", lag)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                self.record("stall", lag)
+        self._last_beat = now
+
+    def slowest(self, n=SLOW_SYMBOLS):
+        with self._lock:
+            items = sorted(self.symbol_latency.items(), key=lambda item: item[1], reverse=True)
+        return items[:n]
+
+    def snapshot(self):
+        """{"timings": {名稱: 毫秒統計}, "gauges", "stalls", "slowest"}"""
+        with self._lock:
+            stats = list(self.stats.items())
+        timings = {}
+        for name, stat in stats:
+            if stat.samples:
+                timings[name] = {"count": stat.count, "mean": stat.mean() * 1000,
+                                 "p50": stat.percentile(50) * 1000, "p95": stat.percentile(95) * 1000,
+                                 "max": stat.peak * 1000}
+        return {"timings": timings, "gauges": dict(self.gauges), "stalls": self.stalls,
+                "slowest": [(symbol, seconds * 1000) for symbol, seconds in self.slowest()]}
+
+
+STAT_LABELS = {
+    "fetch": "抓取/批",
+    "fetch_per_symbol": "抓取/檔",
+    "refresh_request": "刷新請求",
+    "auto_refresh": "自動刷新",
+    "drain": "結果處理",
+    "render": "Treeview 更新",
+    "loop_lag": "主迴圈延遲",
+}
+
+
+def format_stats(snapshot, cache=None, providers=None):
+    """統計面板的多行文字；cache 為 QuoteCache 時附上命中率，providers 為 ProviderRouter.snapshot() 時附上各來源延遲"""
+    lines = []
+    timings = snapshot["timings"]
+    for name, label in STAT_LABELS.items():
+        if t := timings.get(name):
+            lines.append(f"{label}：平均 {t['mean']:.1f} / p95 {t['p95']:.1f} / 最大 {t['max']:.1f} ms（{t['count']} 次）")
+    gauges = snapshot["gauges"]
+    parts = [f"佇列 {gauges.get('queue', 0)}", f"未完成 {gauges.get('outstanding', 0)}",
+             f"待處理結果 {gauges.get('results', 0)}", f"卡頓 {snapshot['stalls']} 次",
+             f"合併刷新請求 {gauges.get('coalesced', 0)} 次", f"略過抓取中 {gauges.get('inflight_skipped', 0)} 檔"]
+    if cache is not None and cache.hits + cache.misses:
+        parts.append(f"快取命中 {cache.hits / (cache.hits + cache.misses):.0%}")
+    lines.append("，".join(parts))
+    if providers and providers["providers"]:
+        lines.append("來源：" + "  ".join(
+            f"{name} p50 {p['p50']:.0f}/p95 {p['p95']:.0f}ms 失敗 {p['failure_rate']:.0%} 採用 {p['served']}"
+            for name, p in providers["providers"].items()) + f"，加發請求 {providers['hedged']} 次")
+    if snapshot["slowest"]:
+        lines.append("最慢：" + "  ".join(f"{symbol} {ms:.0f}ms" for symbol, ms in snapshot["slowest"]))
+    return "\n".join(lines)
+
+
+STARTUP_LABELS = {
+    "imports": "匯入模組",
+    "widgets": "建立元件",
+    "workspace": "載入分頁與快取報價",
+    "first_paint": "第一次繪製",
+    "data_stack": "載入 NumPy/yfinance",
+    "first_quotes": "第一批報價",
+}
+
+
+class StartupTimer:
+    """啟動各階段距離起點的秒數，同一階段只記第一次"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = {}
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+
+    def report(self):
+        return "\n".join(f"{STARTUP_LABELS.get(name, name)}：{seconds * 1000:.0f} ms"
+                         for name, seconds in sorted(self.marks.items(), key=lambda item: item[1]))
+
+
+class Profiler:
+    """cProfile 只剖析啟動它的執行緒（UI 主執行緒）；背景抓取的耗時由 Telemetry 記錄"""
+
+    def __init__(self, path=PROFILE_FILE):
+        self.path = path
+        self._profile = None
+
+    @property
+    def running(self):
+        return self._profile is not None
+
+    def start(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        """停止並寫出結果檔，回傳檔名；沒有在剖析時回傳 None"""
+        if self._profile is None:
+            return None
+        self._profile.disable()
+        self._profile.dump_stats(self.path)
+        self._profile = None
+        return self.path
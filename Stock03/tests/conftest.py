@@ -0,0 +1,20 @@
+"""模組以平面匯入（from quote_engine import ...），測試從 Stock03 目錄匯入"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """可手動推進的時鐘，sleep 直接推進時間"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bar_store import BarStore, rsi  # noqa: E402
+from quote_engine import make_quote  # noqa: E402
+
+
+def append(store, ticks, timestamp):
+    for price, volume in ticks:
+        store.append_quotes({"X": make_quote("X", float(price), 100.0, volume=float(volume), time=timestamp)})
+
+
+def expected_vwap(ticks):
+    turnover = traded = last = 0.0
+    for price, volume in ticks:
+        turnover += price * (volume - last)
+        traded += volume - last
+        last = volume
+    return turnover / traded
+
+
+def vwap_of(store):
+    rows, indicators = store.indicators()
+    return indicators["vwap"][rows["X"]]
+
+
+def test_vwap_uses_volume_increments():
+    store = BarStore(intraday_points=16)
+    ticks = [(100, 100), (110, 200), (105, 300)]
+    append(store, ticks, time.time())
+    assert vwap_of(store) == pytest.approx(expected_vwap(ticks))
+
+
+def test_vwap_survives_intraday_rollover():
+    store = BarStore(intraday_points=8)
+    ticks = [(100 + i % 7, 100 * (i + 1)) for i in range(20)]
+    append(store, ticks, time.time())
+    assert store.tick_count[store.rows["X"]] < len(ticks)  # 確實丟掉過舊的盤中價位
+    assert vwap_of(store) == pytest.approx(expected_vwap(ticks))
+
+
+def test_new_day_resets_intraday_and_shifts_daily_bars():
+    store = BarStore(intraday_points=8)
+    day = 86400
+    now = time.time()
+    append(store, [(100, 100), (101, 200)], now - day)
+    append(store, [(50, 10)], now)
+    row = store.rows["X"]
+    assert store.tick_count[row] == 1
+    assert vwap_of(store) == pytest.approx(50)
+    assert store.close[row, -2] == 101 and store.close[row, -1] == 50
+
+
+def test_fallback_quotes_are_not_appended():
+    store = BarStore()
+    store.append_quotes({"X": dict(make_quote("X", 1.0, 1.0), error="逾時"),
+                         "Y": dict(make_quote("Y", 1.0, 1.0), stale=True)})
+    assert store.size == 0
+
+
+def test_rsi_bounds_and_insufficient_history():
+    rising = np.arange(1.0, 31.0)[None, :]
+    short = np.full((1, 30), np.nan)
+    short[0, -5:] = [1, 2, 3, 2, 1]
+    result = rsi(np.vstack([rising, short]))
+    assert result[0] == 100.0
+    assert np.isnan(result[1])
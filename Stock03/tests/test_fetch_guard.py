@@ -0,0 +1,155 @@
+import pytest
+
+from conftest import FakeClock
+from fake_quote_server import FakeQuoteServer
+from fetch_guard import CircuitBreaker, FetchError, GuardedFetcher, TokenBucket, backoff_delay
+from quote_engine import QuoteEngine, make_http_fetcher, make_quote
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=4, capacity=4, clock=clock, sleep=clock.sleep)
+    assert bucket.try_acquire(4) == 0
+    assert bucket.try_acquire(1) == pytest.approx(0.25)
+    clock.now += 0.5
+    assert bucket.try_acquire(2) == 0
+    assert bucket.try_acquire(1) > 0
+
+
+def test_token_bucket_acquire_sleeps_until_enough_tokens():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    bucket.acquire(2)
+    bucket.acquire(2)
+    assert sum(clock.slept) == pytest.approx(1.0)
+
+
+def test_token_bucket_caps_request_at_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=3, clock=clock, sleep=clock.sleep)
+    assert bucket.try_acquire(10) == 0  # 超過容量的請求只扣到容量，不會永遠等不到
+
+
+def test_backoff_delay_grows_exponentially_and_is_capped():
+    assert backoff_delay(0, base=1, cap=30, rng=lambda: 1.0) == 1
+    assert backoff_delay(3, base=1, cap=30, rng=lambda: 1.0) == 8
+    assert backoff_delay(10, base=1, cap=30, rng=lambda: 1.0) == 30
+    assert backoff_delay(3, base=1, cap=30, rng=lambda: 0.5) == 4
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.remaining() == 60
+    clock.now += 60
+    assert breaker.allow()  # 半開只放行一次試探
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def make_guard(fetcher, clock, **kwargs):
+    options = dict(rate=100, burst=100, retries=2, global_failures=3, clock=clock, sleep=clock.sleep,
+                   rng=lambda: 1.0)
+    options.update(kwargs)
+    return GuardedFetcher(fetcher, **options)
+
+
+def test_guard_retries_with_backoff_then_succeeds():
+    clock = FakeClock()
+    calls = []
+
+    def flaky(symbols):
+        calls.append(list(symbols))
+        if len(calls) < 3:
+            raise FetchError("boom")
+        return {s: make_quote(s, 10.0, 9.0) for s in symbols}
+
+    quotes = make_guard(flaky, clock, global_failures=5)(["A", "B"])
+    assert len(calls) == 3
+    assert clock.slept == [1.0, 2.0]
+    assert quotes["A"]["price"] == 10.0
+
+
+def test_guard_opens_global_breaker_and_short_circuits():
+    clock = FakeClock()
+    calls = []
+
+    def down(symbols):
+        calls.append(symbols)
+        raise FetchError("down")
+
+    guard = make_guard(down, clock, retries=5, global_failures=2, global_reset=60)
+    quotes = guard(["A"])
+    assert len(calls) == 2  # 熔斷後不再重試
+    assert quotes["A"]["price"] is None and quotes["A"]["error"] == "down"
+    assert guard(["A"])["A"]["error"] == "資料來源暫停中"
+    assert len(calls) == 2
+
+
+def test_guard_trips_symbol_breaker_for_missing_symbol():
+    clock = FakeClock()
+    calls = []
+
+    def partial(symbols):
+        calls.append(list(symbols))
+        return {s: make_quote(s, None if s == "BAD" else 1.0, 1.0) for s in symbols}
+
+    guard = make_guard(partial, clock, symbol_failures=2)
+    for _ in range(2):
+        guard(["GOOD", "BAD"])
+    quotes = guard(["GOOD", "BAD"])
+    assert calls[-1] == ["GOOD"]
+    assert quotes["BAD"]["error"] == "連續抓取失敗，暫停中"
+    assert quotes["GOOD"]["price"] == 1.0
+
+
+@pytest.fixture
+def server():
+    server = FakeQuoteServer(seed=1).start()
+    yield server
+    server.stop()
+
+
+def test_engine_against_fake_quote_server(server):
+    engine = QuoteEngine(GuardedFetcher(make_http_fetcher(server.url), per_symbol_cost=False, retries=0))
+    quotes = engine.fetch(["AAA", "BBB", "ZZTOP"])
+    assert quotes["AAA"]["price"] is not None and quotes["AAA"]["open"] is not None
+    assert quotes["ZZTOP"]["price"] is None and quotes["ZZTOP"]["error"]
+    cached, stale = engine.cached(["AAA", "ZZTOP"])
+    assert set(cached) == {"AAA"} and stale == ["ZZTOP"]
+
+
+def test_guard_reports_throttling_from_fake_quote_server(server):
+    server.rate_limit = 1
+    clock = FakeClock()
+    guard = GuardedFetcher(make_http_fetcher(server.url), per_symbol_cost=False, retries=1,
+                           sleep=clock.sleep, rng=lambda: 0.0)
+    assert guard(["AAA"])["AAA"]["price"] is not None
+    quote = guard(["AAA"])["AAA"]
+    assert quote["price"] is None and quote["error"].startswith("限流")
+    assert server.throttled == 2
+
+
+def test_sibling_guard_shares_global_breaker():
+    clock = FakeClock()
+
+    def down(symbols):
+        raise FetchError("down")
+
+    guard = make_guard(down, clock, retries=1, global_failures=1, global_reset=60)
+    bars = guard.sibling(lambda symbols: {s: {"close": [1.0]} for s in symbols},
+                         valid=lambda bars: bool(bars.get("close")))
+    assert bars(["A"])["A"]["close"] == [1.0]
+    guard(["A"])
+    assert bars.breaker is guard.breaker and bars.bucket is guard.bucket
+    assert bars(["A"])["A"]["error"] == "資料來源暫停中"
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from positions import PositionBook  # noqa: E402
+from quote_engine import make_quote  # noqa: E402
+
+
+@pytest.fixture
+def book():
+    book = PositionBook(capacity=2)
+    book.set_tab("tw.txt", "left")
+    book.set_tab("us.txt", "right")
+    book.set("tw.txt", "2330.TW", 1000, cost=500.0)
+    book.set("tw.txt", "2317.TW", 2000, cost=100.0)
+    book.set("us.txt", "AAPL", 10, cost=150.0)  # 超過初始容量
+    book.update_quotes({"2330.TW": make_quote("2330.TW", 600.0, 590.0),
+                        "2317.TW": make_quote("2317.TW", 110.0, 100.0),
+                        "AAPL": make_quote("AAPL", 200.0, 190.0),
+                        "TWD=X": make_quote("TWD=X", 30.0, 30.0)})
+    return book
+
+
+def test_totals_by_tab_pane_and_overall(book):
+    totals = book.totals()
+    tw = totals["tabs"]["tw.txt"]
+    assert tw["value"] == pytest.approx(600_000 + 220_000)
+    assert tw["day_pnl"] == pytest.approx(10_000 + 20_000)
+    assert tw["unrealized"] == pytest.approx(100_000 + 20_000)
+    us = totals["panes"]["right"]
+    assert us["value"] == pytest.approx(10 * 200 * 30)  # 美元換算成台幣
+    assert totals["total"]["value"] == pytest.approx(820_000 + 60_000)
+    assert totals["panes"]["left"]["weight"] == pytest.approx(820_000 / 880_000)
+    assert totals["total"]["missing"] == 0
+
+
+def test_missing_fx_or_price_is_counted_not_summed():
+    book = PositionBook()
+    book.set_tab("us.txt", "left")
+    book.set("us.txt", "AAPL", 10, quote=make_quote("AAPL", 200.0, 190.0))
+    book.set("us.txt", "MSFT", 5)
+    totals = book.totals()
+    assert totals["total"]["value"] == 0 and totals["total"]["missing"] == 2
+
+
+def test_remove_moves_last_row_and_totals_follow(book):
+    book.set("tw.txt", "2330.TW", None)
+    assert book.get("tw.txt", "2330.TW") is None
+    assert book.get("us.txt", "AAPL") == (10.0, 150.0)
+    assert book.totals()["tabs"]["tw.txt"]["value"] == pytest.approx(220_000)
+    book.remove_tab("us.txt")
+    assert "right" not in book.totals()["panes"]
+
+
+def test_totals_cached_until_version_changes(book):
+    first = book.totals()
+    assert book.totals() is first
+    book.update_quotes({"2330.TW": make_quote("2330.TW", 610.0, 590.0)})
+    assert book.totals() is not first
@@ -0,0 +1,46 @@
+from quote_engine import QuoteCache, QuoteEngine, make_quote
+
+
+def quote(symbol, price=10.0):
+    return make_quote(symbol, price, 9.0)
+
+
+def test_cache_ttl_marks_old_entries_stale_but_still_returns_them():
+    cache = QuoteCache(ttl=30)
+    cache.put_many({"A": quote("A")}, timestamp=100)
+    quotes, stale = cache.lookup(["A", "B"], now=120)
+    assert set(quotes) == {"A"} and stale == ["B"]
+    quotes, stale = cache.lookup(["A"], now=131)
+    assert quotes["A"]["price"] == 10.0 and stale == ["A"]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = QuoteCache(ttl=30, max_size=2)
+    cache.put_many({"A": quote("A"), "B": quote("B")}, timestamp=100)
+    cache.lookup(["A"], now=100)  # A 變成最近使用
+    cache.put_many({"C": quote("C")}, timestamp=100)
+    assert set(cache.lookup(["A", "B", "C"], now=100)[0]) == {"A", "C"}
+
+
+def test_cache_skips_failed_and_fallback_quotes():
+    cache = QuoteCache(ttl=30)
+    cache.put_many({"A": quote("A")}, timestamp=100)
+    cache.put_many({"A": dict(quote("A", 11.0), error="逾時"), "B": quote("B", None),
+                    "C": dict(quote("C"), stale=True)}, timestamp=200)
+    assert cache.entries() == {"A": (100, quote("A"))}
+
+
+def test_cache_restore_keeps_newer_entries():
+    cache = QuoteCache(ttl=30)
+    cache.put_many({"A": quote("A", 12.0)}, timestamp=200)
+    cache.restore({"A": (100, quote("A")), "B": (100, quote("B"))})
+    assert cache.entries()["A"][0] == 200 and "B" in cache.entries()
+
+
+def test_engine_falls_back_to_last_good_quote_on_failure():
+    results = [{"A": quote("A")}, {"A": make_quote("A", None, None)}]
+    engine = QuoteEngine(lambda symbols: results.pop(0), cache=QuoteCache(ttl=30))
+    engine.fetch(["A"])
+    quotes = engine.fetch(["A", "A"])
+    assert quotes["A"]["price"] == 10.0 and quotes["A"]["error"] == "無報價"
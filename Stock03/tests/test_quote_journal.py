@@ -0,0 +1,56 @@
+import os
+
+from quote_engine import make_quote
+from quote_journal import MAGIC, QuoteJournal, journal_files, read_journal
+
+START = 1760000000.0
+
+
+def test_round_trip_keeps_values_and_skips_fallback_quotes(tmp_path):
+    journal = QuoteJournal(str(tmp_path))
+    journal.record({"2330.TW": make_quote("2330.TW", 600.0, 590.0, "REGULAR", 1000.0),
+                    "AAPL": make_quote("AAPL", 200.0, None),
+                    "OLD": dict(make_quote("OLD", 1.0, 1.0), error="逾時"),
+                    "SNAP": dict(make_quote("SNAP", 1.0, 1.0), stale=True)}, START)
+    journal.record({"AAPL": make_quote("AAPL", 201.0, 199.0)}, START + 1)
+    journal.close()
+    records = list(read_journal(str(tmp_path)))
+    assert [(t - START, symbol) for t, symbol, _ in records] == [(0, "2330.TW"), (0, "AAPL"), (1, "AAPL")]
+    quote = records[0][2]
+    assert (quote["price"], quote["prev_close"], quote["market_state"], quote["volume"]) == (
+        600.0, 590.0, "REGULAR", 1000.0)
+    assert records[1][2]["prev_close"] is None
+    assert journal.records == 3
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    journal = QuoteJournal(str(tmp_path))
+    journal.record({"A": make_quote("A", 1.0, 1.0)}, START)
+    journal.record({"A": make_quote("A", 2.0, 1.0)}, START + 1)
+    journal.close()
+    with open(journal.path, "r+b") as f:
+        f.truncate(os.path.getsize(journal.path) - 5)
+    assert [q["price"] for _, _, q in read_journal(journal.path)] == [1.0]
+
+
+def test_overlapping_parts_replay_in_time_order(tmp_path):
+    leader, follower = QuoteJournal(str(tmp_path)), QuoteJournal(str(tmp_path))
+    leader.record({"A": make_quote("A", 1.0, 1.0)}, START)
+    follower.record({"B": make_quote("B", 2.0, 1.0)}, START + 0.5)
+    leader.record({"A": make_quote("A", 1.1, 1.0)}, START + 1)
+    follower.record({"B": make_quote("B", 2.1, 1.0)}, START + 1.5)
+    leader.close()
+    follower.close()
+    assert len(journal_files(str(tmp_path))) == 2
+    assert [t - START for t, _, _ in read_journal(str(tmp_path))] == [0, 0.5, 1, 1.5]
+
+
+def test_size_limit_removes_oldest_files(tmp_path):
+    journal = QuoteJournal(str(tmp_path), max_bytes=4000)
+    for i in range(200):
+        journal.record({f"S{i}": make_quote(f"S{i}", 1.0, 1.0)}, START + i)
+    journal.close()
+    files = journal_files(str(tmp_path))
+    assert sum(os.path.getsize(f) for f in files) <= 4000 + 4000 // 4 + 64
+    with open(files[0], "rb") as f:
+        assert f.read(len(MAGIC)) == MAGIC
@@ -0,0 +1,44 @@
+from quote_engine import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from refresh_bus import RefreshBus
+
+
+def test_fetch_requests_coalesce_within_window():
+    bus = RefreshBus(window=0.05)
+    bus.fetch(["a", "b"], PRIORITY_LOW, now=0)
+    bus.fetch(["a"], PRIORITY_HIGH, now=0.01)
+    bus.fetch(["b"], PRIORITY_LOW, force=True, now=0.02)
+    bus.fetch(None, PRIORITY_NORMAL, now=0.03)  # 不屬於分頁的請求（如匯率）
+    assert bus.take_fetch(now=0.04) == []
+    assert bus.pending()
+    assert bus.take_fetch(now=0.05) == [(PRIORITY_HIGH, False, ["a"]), (PRIORITY_NORMAL, False, []),
+                                        (PRIORITY_LOW, True, ["b"])]
+    assert not bus.pending()
+    assert (bus.requested, bus.dispatched) == (4, 1)
+
+
+def test_new_window_starts_after_take():
+    bus = RefreshBus(window=0.05)
+    bus.fetch(["a"], now=0)
+    bus.take_fetch(now=0.05)
+    bus.fetch(["a"], now=1.0)
+    assert bus.take_fetch(now=1.04) == []
+    assert bus.take_fetch(now=1.05) == [(PRIORITY_NORMAL, False, ["a"])]
+
+
+def test_render_requests_are_deduplicated():
+    bus = RefreshBus()
+    bus.render("a")
+    bus.render("a")
+    bus.render("b")
+    assert bus.take_render() == {"a", "b"}
+    assert bus.take_render() == set()
+
+
+def test_claim_skips_inflight_until_release_or_timeout():
+    bus = RefreshBus(inflight_timeout=30)
+    assert bus.claim(["A", "B"], now=0) == ["A", "B"]
+    assert bus.claim(["A", "C"], now=1) == ["C"]
+    assert bus.skipped == 1
+    bus.release(["A"])
+    assert bus.claim(["A", "B"], now=2) == ["A"]
+    assert bus.claim(["B"], now=31) == ["B"]  # 抓取失敗沒有回來，逾時後可再送出
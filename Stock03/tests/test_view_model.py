@@ -0,0 +1,44 @@
+from quote_engine import make_quote
+from view_model import RowModel, SORT_COLUMNS, SortedIndex
+
+
+def test_sorted_index_puts_missing_values_last_in_both_directions():
+    index = SortedIndex()
+    for symbol, key in (("A", 3.0), ("B", None), ("C", 1.0), ("D", 2.0)):
+        index.insert(symbol, key)
+    assert index.order() == ["C", "D", "A", "B"]
+    assert index.order(reverse=True) == ["A", "D", "C", "B"]
+    index.remove("D", 2.0)
+    index.remove("B", None)
+    assert index.order() == ["C", "A"]
+
+
+def model_with(prices):
+    model = RowModel()
+    model.set_symbols(list(prices))
+    for symbol, price in prices.items():
+        if price is not None:
+            model.update(symbol, make_quote(symbol, price, 100.0))
+    return model
+
+
+def test_row_model_orders_every_sort_column():
+    model = model_with({"A": 101.0, "B": 99.0, "C": 100.0})
+    assert set(model.indexes) >= set(SORT_COLUMNS)
+    assert model.order("symbol") == ["A", "B", "C"]
+    assert model.order("price") == ["B", "C", "A"]
+    assert model.order("change_percent", reverse=True) == ["A", "C", "B"]
+
+
+def test_row_model_reindexes_on_update_and_skips_rows_without_quotes():
+    model = model_with({"A": 101.0, "B": 99.0, "C": None})
+    assert model.order("price") == ["B", "A"]
+    assert model.update("B", make_quote("B", 105.0, 100.0))
+    assert model.order("price") == ["A", "B"]
+    assert not model.update("B", make_quote("B", 105.0, 100.0))  # 顯示沒變
+
+
+def test_row_model_set_symbols_removes_rows_from_indexes():
+    model = model_with({"A": 101.0, "B": 99.0})
+    model.set_symbols(["B"])
+    assert model.order("price") == ["B"] and "A" not in model.rows
@@ -0,0 +1,86 @@
+import sqlite3
+import time
+
+import pytest
+
+import workspace_store
+from quote_engine import make_quote
+from workspace_store import WorkspaceStore, merge_symbols
+
+
+@pytest.mark.parametrize("base, ours, theirs, expected", [
+    (["A", "B"], ["A", "B", "C"], ["A", "B", "D"], ["A", "B", "C", "D"]),  # 雙方新增都保留
+    (["A", "B", "C"], ["A", "C"], ["A", "B", "C", "D"], ["A", "C", "D"]),  # 本方刪除
+    (["A", "B", "C"], ["C", "A", "B", "E"], ["A", "C"], ["C", "A", "E"]),  # 對方刪除，順序以本方為準
+    (["A"], ["A"], ["A"], ["A"]),
+])
+def test_merge_symbols(base, ours, theirs, expected):
+    assert merge_symbols(base, ours, theirs) == expected
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "workspace.db")
+
+
+def test_store_round_trip(path):
+    store = WorkspaceStore(path, debounce=0)
+    store.save_layout({"left": [("a.txt", "A")], "right": [("b.txt", "B")]})
+    store.set_symbols("a.txt", ["X", "Y"])
+    store.set_sort("a.txt", "price", False)
+    store.close()
+    layout = WorkspaceStore(path).load_tabs()
+    assert layout["left"] == [{"tab_id": "a.txt", "name": "A", "symbols": ["X", "Y"],
+                               "sort_column": "price", "sort_reverse": False}]
+    assert layout["right"][0]["tab_id"] == "b.txt"
+
+
+def test_two_windows_merge_symbol_edits(path):
+    first, second = WorkspaceStore(path, debounce=0), WorkspaceStore(path, debounce=0)
+    first.save_layout({"left": [("a.txt", "A")], "right": []})
+    first.set_symbols("a.txt", ["A", "B"])
+    first.flush()
+    first.load_tabs()
+    second.load_tabs()
+    first.set_symbols("a.txt", ["A", "B", "C"])
+    first.flush()
+    second.set_symbols("a.txt", ["B", "D"])
+    second.flush()
+    assert first.external_changes()
+    assert first.load_tabs()["left"][0]["symbols"] == ["B", "D", "C"]
+    first.close()
+    second.close()
+
+
+def test_failed_write_is_retried_not_dropped(path, monkeypatch):
+    monkeypatch.setattr(workspace_store, "WRITE_RETRY_DELAY", 0.05)
+    store = WorkspaceStore(path, debounce=0)
+    store.save_layout({"left": [("a.txt", "A")], "right": []})
+    store.flush()
+    store._conn.execute("PRAGMA busy_timeout = 50")
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")  # 另一個視窗持有寫入鎖
+    store.set_symbols("a.txt", ["X"])
+    assert not store.flush(timeout=0.5)
+    assert store.write_error and store.failures
+    other.execute("COMMIT")
+    assert store.flush(timeout=5)
+    assert store.write_error is None
+    assert store.load_tabs()["left"][0]["symbols"] == ["X"]
+    assert store.close() == 0
+    other.close()
+
+
+def test_quote_snapshots_keep_newer_quote_per_symbol(path):
+    first, second = WorkspaceStore(path, debounce=0), WorkspaceStore(path, debounce=0)
+    now = time.time()
+    first.save_quotes({"A": (now, make_quote("A", 2.0, 1.0)), "B": (now, make_quote("B", 5.0, 5.0))})
+    first.flush()
+    second.save_quotes({"A": (now - 60, make_quote("A", 1.5, 1.0)), "C": (now, make_quote("C", 3.0, 3.0)),
+                        "OLD": (now - workspace_store.QUOTE_SNAPSHOT_MAX_AGE - 1, make_quote("OLD", 1.0, 1.0))})
+    second.flush()
+    quotes = first.load_quotes()
+    assert sorted(quotes) == ["A", "B", "C"]
+    assert quotes["A"][1]["price"] == 2.0 and quotes["A"][1]["stale"]
+    first.close()
+    second.close()
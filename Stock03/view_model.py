@@ -0,0 +1,300 @@
+"""分頁的列模型：以股票代碼作為 Treeview 的固定 iid，只更新有變動的部分"""
+import math
+from bisect import bisect_left, insort
+
+SORT_COLUMNS = ("symbol", "price", "change_percent")
+INDICATOR_COLUMNS = ("vwap", "day_range", "chg5", "chg20", "rsi")  # 來自 BarStore 的選用欄位
+
+
+def format_indicators(values):
+    """把一檔的指標數值轉成 {欄位: (排序值, 顯示字串)}；NaN 顯示為空白"""
+    def number(value):
+        return None if value is None or math.isnan(value) else float(value)
+
+    def text(value, fmt):
+        return format(value, fmt) if value is not None else ''
+
+    vwap, low, high = number(values.get("vwap")), number(values.get("day_low")), number(values.get("day_high"))
+    chg5, chg20, rsi = number(values.get("chg5")), number(values.get("chg20")), number(values.get("rsi"))
+    # 日區間以現價在區間中的位置排序
+    position = (values["price"] - low) / (high - low) if None not in (low, high) and high > low and values.get("price") else None
+    return {
+        "vwap": (vwap, text(vwap, ".1f")),
+        "day_range": (position, f"{low:.1f}-{high:.1f}" if None not in (low, high) else ''),
+        "chg5": (chg5, text(chg5, "+.1f") + ('%' if chg5 is not None else '')),
+        "chg20": (chg20, text(chg20, "+.1f") + ('%' if chg20 is not None else '')),
+        "rsi": (rsi, text(rsi, ".0f")),
+    }
+
+
+def format_totals(totals, weight_label=None):
+    """持股合計（PositionBook.totals 的一項）的顯示字串；沒有持股時為空字串"""
+    if not totals:
+        return ''
+    text = (f"市值 {totals['value']:,.0f} {totals['currency']}  今日 {totals['day_pnl']:+,.0f}"
+            + (f"（{totals['day_pct']:+.2f}%）" if totals['day_pct'] is not None else '')
+            + f"  未實現 {totals['unrealized']:+,.0f}")
+    if weight_label and totals['weight'] is not None:
+        text += f"  {weight_label} {totals['weight']:.0%}"
+    if totals['missing']:
+        text += f"  （{totals['missing']} 筆缺報價或匯率）"
+    return text
+
+
+class QuoteRow:
+    """單列資料：原始數值與顯示字串並存，排序只看數值不再解析字串"""
+    __slots__ = ("symbol", "quote", "price", "change", "change_pct",
+                 "price_text", "change_text", "tags", "error", "extras")
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.quote = None
+        self.price = self.change = self.change_pct = None
+        self.price_text = self.change_text = 'N/A'
+        self.tags = ()
+        self.error = None
+        self.extras = {}  # 指標欄位 -> (排序值, 顯示字串)
+
+    def update(self, quote):
+        """套用新報價，回傳顯示內容是否改變"""
+        old = (self.quote is None, self.price_text, self.change_text, self.tags, self.error)
+        self.error = quote.get('error')  # 抓取失敗時數值為最後一筆有效報價
+        self.quote = quote
+        price = quote.get('price')
+        self.price = price if isinstance(price, float) else None
+        self.change = quote.get('change')
+        prev_close = quote.get('prev_close')
+        # 與顯示字串相同取到小數兩位，顏色判斷才會和畫面一致
+        self.change_pct = round(self.change / prev_close * 100, 2) if self.change is not None and prev_close else None
+
+        self.price_text = f"{self.price:.1f}" if self.price is not None else 'N/A'
+        self.change_text = quote.get('change_percent') or 'N/A'
+        if self.change_pct is not None:
+            # 僅當漲跌幅超過0.5%時標記顏色
+            if self.change_pct > 0.5:
+                self.tags = ('rise',)
+            elif self.change_pct < -0.5:
+                self.tags = ('fall',)
+            else:
+                self.tags = ('neutral',)
+        elif isinstance(self.change, float):
+            self.tags = ('rise',) if self.change >= 0 else ('fall',)
+        else:
+            self.tags = ()
+        if quote.get('stale'):
+            self.tags += ('stale',)  # 來自上次快照，尚未更新
+        return old != (False, self.price_text, self.change_text, self.tags, self.error)
+
+    def sort_key(self, column):
+        if column == "price":
+            return self.price
+        if column == "change_percent":
+            return self.change_pct
+        if column in INDICATOR_COLUMNS:
+            return self.extras.get(column, (None, ''))[0]
+        return self.symbol
+
+    def values(self):
+        symbol = f"{self.symbol} ⚠" if self.error else self.symbol  # 錯誤標記
+        return (symbol, self.price_text, self.change_text) + tuple(
+            self.extras.get(column, (None, ''))[1] for column in INDICATOR_COLUMNS)
+
+
+class SortedIndex:
+    """單一欄位的已排序索引，更新一檔只需二分搜尋；無數值的列不論升降冪都排最後"""
+
+    def __init__(self):
+        self.entries = []  # 已排序的 (key, symbol)
+        self.missing = {}  # 沒有數值的代碼，保持加入順序
+
+    def insert(self, symbol, key):
+        if key is None:
+            self.missing[symbol] = None
+        else:
+            insort(self.entries, (key, symbol))
+
+    def remove(self, symbol, key):
+        if key is None:
+            self.missing.pop(symbol, None)
+        else:
+            del self.entries[bisect_left(self.entries, (key, symbol))]
+
+    def order(self, reverse=False):
+        symbols = [symbol for _, symbol in self.entries]
+        if reverse:
+            symbols.reverse()
+        return symbols + list(self.missing)
+
+
+class RowModel:
+    """分頁的資料模型：symbol -> QuoteRow，並為每個可排序欄位維護索引"""
+
+    def __init__(self, columns=SORT_COLUMNS + INDICATOR_COLUMNS):
+        self.rows = {}
+        self.indexes = {column: SortedIndex() for column in columns}
+
+    def set_symbols(self, symbols):
+        """同步分頁的股票清單（新增/刪除/移動後呼叫）"""
+        wanted = set(symbols)
+        for symbol in [s for s in self.rows if s not in wanted]:
+            row = self.rows.pop(symbol)
+            for column, index in self.indexes.items():
+                index.remove(symbol, row.sort_key(column))
+        for symbol in symbols:
+            if symbol not in self.rows:
+                row = self.rows[symbol] = QuoteRow(symbol)
+                for column, index in self.indexes.items():
+                    index.insert(symbol, row.sort_key(column))
+
+    def update(self, symbol, quote):
+        """更新一檔報價，只重新定位數值有變動的索引，回傳顯示是否改變"""
+        row = self.rows.get(symbol)
+        if row is None:
+            return False
+        return self._reindex(row, row.update, quote)
+
+    def update_extras(self, symbol, extras):
+        """套用指標欄位，回傳顯示是否改變"""
+        row = self.rows.get(symbol)
+        if row is None or row.extras == extras:
+            return False
+
+        def apply(extras):
+            row.extras = extras
+            return True
+        return self._reindex(row, apply, extras)
+
+    def _reindex(self, row, apply, value):
+        old_keys = {column: row.sort_key(column) for column in self.indexes}
+        changed = apply(value)
+        for column, index in self.indexes.items():
+            new_key = row.sort_key(column)
+            if new_key != old_keys[column]:
+                index.remove(row.symbol, old_keys[column])
+                index.insert(row.symbol, new_key)
+        return changed
+
+    def order(self, column, reverse=False):
+        """依排序欄位輸出已有報價的代碼"""
+        return [s for s in self.indexes[column].order(reverse) if self.rows[s].quote is not None]
+
+
+class TreeRows:
+    """記住每列目前顯示的內容，重繪時只對差異呼叫 Treeview"""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}  # iid -> (values, tags)
+        self.order = []  # 目前顯示順序，Treeview 只經由本類別修改
+        self.images = {}  # iid -> 目前設定的圖片（#0 欄）
+
+    def sync(self, rows, images=None):
+        """rows 為依顯示順序排列的 (iid, values, tags)；images 為 iid -> 圖片，None 表示不處理圖片"""
+        wanted = {iid for iid, _, _ in rows}
+        removed = [iid for iid in self.rows if iid not in wanted]
+        if removed:
+            self.tree.delete(*removed)
+            for iid in removed:
+                del self.rows[iid]
+                self.images.pop(iid, None)
+            self.order = [iid for iid in self.order if iid in wanted]
+
+        for index, (iid, values, tags) in enumerate(rows):
+            values, tags = tuple(values), tuple(tags)
+            old = self.rows.get(iid)
+            if old is None:
+                self.tree.insert("", index, iid=iid, values=values, tags=tags)
+                self.order.insert(index, iid)
+            elif old != (values, tags):
+                # 只改有變動的列，不影響選取與捲動位置
+                self.tree.item(iid, values=values, tags=tags)
+            self.rows[iid] = (values, tags)
+
+        self.reorder([iid for iid, _, _ in rows])
+        if images is not None:
+            for iid in self.order:
+                image = images.get(iid, '')
+                if self.images.get(iid, '') is not image:
+                    self.tree.item(iid, image=image)
+                    self.images[iid] = image
+
+    def reorder(self, order):
+        """以 tree.move 只搬動位置不對的列"""
+        current = self.order
+        if current == order:
+            return
+        for index, iid in enumerate(order):
+            if current[index] != iid:
+                self.tree.move(iid, "", index)
+                current.remove(iid)
+                current.insert(index, iid)
+
+    def clear(self):
+        self.tree.delete(*self.tree.get_children())
+        self.rows.clear()
+        self.images.clear()
+        self.order = []
+
+
+class VirtualRows:
+    """虛擬清單：Treeview 只放可視範圍加上少量預留列，捲動時由 TreeRows 只增刪進出畫面的幾列
+
+    捲軸由本類別控制，Treeview 本身永遠不捲動；資料列數不影響 Treeview 的大小。
+    """
+
+    def __init__(self, tree, scrollbar, overscan=5):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.tree_rows = TreeRows(tree)
+        self.overscan = overscan
+        self.offset = 0  # 可視範圍第一列在完整順序中的位置
+        self.visible = 1  # 可視列數，依 Treeview 高度計算
+        self.order = []  # 上次的完整顯示順序
+        self.selected = None  # 捲出畫面時仍記住選取的代碼
+
+    def window(self, order):
+        """記下完整順序並切出要放進 Treeview 的代碼，同時更新捲軸"""
+        self.order = order
+        self.offset = max(0, min(self.offset, len(order) - self.visible))
+        if order:
+            self.scrollbar.set(self.offset / len(order), min(1.0, (self.offset + self.visible) / len(order)))
+        else:
+            self.scrollbar.set(0, 1)
+        return order[self.offset:self.offset + self.visible + self.overscan]
+
+    def sync(self, rows, images=None):
+        self.tree_rows.sync(rows, images)
+        if self.selected in self.tree_rows.rows and self.tree.selection() != (self.selected,):
+            self.tree.selection_set(self.selected)  # 捲回畫面時恢復選取
+
+    def resize(self, height, row_height):
+        """回傳可視列數是否改變；扣掉一列給標題"""
+        visible = max(1, height // row_height - 1)
+        changed, self.visible = visible != self.visible, visible
+        return changed
+
+    def scroll(self, rows):
+        self.offset = max(0, self.offset + rows)
+
+    def scroll_to(self, fraction):
+        self.offset = max(0, int(fraction * len(self.order)))
+
+    def step_selection(self, step):
+        """鍵盤上下移動選取，必要時捲動讓選取列保持可見"""
+        if not self.order:
+            return
+        try:
+            index = self.order.index(self.selected) + step
+        except ValueError:
+            index = self.offset
+        index = max(0, min(index, len(self.order) - 1))
+        self.selected = self.order[index]
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible:
+            self.offset = index - self.visible + 1
+
+    def clear(self):
+        self.tree_rows.clear()
+        self.order = []
+        self.offset = 0
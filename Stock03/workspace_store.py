@@ -0,0 +1,313 @@
+"""工作區存放：分頁、股票清單與順序、排序狀態、持股與快取報價集中在一個 SQLite 檔
+
+UI 只把變更排入佇列，背景寫入執行緒等待 debounce 秒合併同一目標的連續變更後，一次交易寫入。
+多個視窗共用同一個工作區時，股票清單以三方合併寫入（雙方的新增都保留、任一方刪除就刪除），
+分頁只新增或更新、不會把別的視窗刪掉的分頁寫回來；external_changes() 告訴 UI 何時該重新載入。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from quote_engine import make_quote
+
+WORKSPACE_FILE = "workspace.db"
+LEGACY_CONFIG_FILE = "portfolio_config.json"  # 舊版設定，工作區為空時匯入（連同各分頁的 txt 檔）
+WRITE_DEBOUNCE = 0.5  # 連續變更合併的等待秒數
+WRITE_RETRY_DELAY = 0.5  # 寫入失敗（如其他視窗持有寫入鎖）後第一次重試的等待秒數，之後加倍
+WRITE_RETRY_MAX = 30  # 重試等待的上限
+CLOSE_TIMEOUT = 10  # 關閉時最多等待幾秒把變更寫完
+QUOTE_SNAPSHOT_MAX_AGE = 7 * 86400  # 快照中超過幾秒沒更新的報價刪除
+SCHEMA_VERSION = 2  # 2：新增 positions
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tabs (
+    tab_id TEXT PRIMARY KEY, side TEXT NOT NULL, name TEXT NOT NULL, position INTEGER NOT NULL,
+    sort_column TEXT NOT NULL DEFAULT 'change_percent', sort_reverse INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS tab_symbols (
+    tab_id TEXT NOT NULL, symbol TEXT NOT NULL, position INTEGER NOT NULL,
+    PRIMARY KEY (tab_id, symbol)
+);
+CREATE TABLE IF NOT EXISTS quotes (symbol TEXT PRIMARY KEY, ts REAL, price REAL, prev_close REAL);
+CREATE TABLE IF NOT EXISTS positions (
+    tab_id TEXT NOT NULL, symbol TEXT NOT NULL, shares REAL NOT NULL, cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (tab_id, symbol)
+);
+"""
+
+
+def merge_symbols(base, ours, theirs):
+    """三方合併股票清單：base 為上次讀到的版本，ours 為本視窗的新版本，theirs 為資料庫中目前的版本
+
+    任一方刪除的代碼就刪除，雙方新增的都保留；順序以本視窗為準，另一方新增的接在後面。
+    """
+    removed = (set(base) - set(ours)) | (set(base) - set(theirs))
+    merged = [s for s in ours if s not in removed]
+    seen = set(merged)
+    return merged + [s for s in theirs if s not in seen and s not in removed]
+
+
+class WorkspaceStore:
+    """讀取在呼叫端同步進行；寫入一律經由背景執行緒，同一目標未寫入前的舊變更會被新的取代"""
+
+    def __init__(self, path=WORKSPACE_FILE, debounce=WRITE_DEBOUNCE):
+        self.path = path
+        self.debounce = debounce
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")  # 寫到一半中斷也不會損壞，讀寫可同時進行
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        self._db_lock = threading.Lock()
+        self._base = {}  # tab_id -> 上次讀到或寫入的股票清單（三方合併的基準）
+        self._known_tabs = set()  # 本視窗讀到或寫入過的分頁
+        self._data_version = None  # 其他連線寫入後 PRAGMA data_version 會改變
+        self._pending = OrderedDict()  # key -> (函式, 參數)，依最後變更的順序寫入
+        self._cond = threading.Condition()
+        self._urgent = False
+        self._writing = False
+        self._closed = False
+        self._abandoned = False  # 關閉逾時，放棄尚未寫入的變更
+        self.writes = 0  # 已完成的寫入交易數
+        self.failures = 0  # 連續失敗的寫入次數
+        self.write_error = None  # 最近一次寫入失敗的原因，寫入成功後清除（供狀態列顯示）
+        self.merged = 0  # 被後來變更取代而省下的寫入數
+        self._thread = threading.Thread(target=self._run, name="workspace-writer", daemon=True)
+        self._thread.start()
+
+    # ---- 讀取 ----
+
+    def is_empty(self):
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tabs").fetchone()[0] == 0
+
+    def load_tabs(self):
+        """回傳 {side: [{"tab_id", "name", "symbols", "sort_column", "sort_reverse"}]}，依位置排序"""
+        with self._db_lock:
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            tabs = self._conn.execute(
+                "SELECT tab_id, side, name, sort_column, sort_reverse FROM tabs ORDER BY side, position").fetchall()
+            rows = self._conn.execute("SELECT tab_id, symbol FROM tab_symbols ORDER BY tab_id, position").fetchall()
+            symbols = {}
+            for tab_id, symbol in rows:
+                symbols.setdefault(tab_id, []).append(symbol)
+            self._known_tabs = {tab[0] for tab in tabs}
+            self._base = {tab_id: list(symbols.get(tab_id, [])) for tab_id in self._known_tabs}
+        layout = {"left": [], "right": []}
+        for tab_id, side, name, sort_column, sort_reverse in tabs:
+            layout.setdefault(side, []).append({
+                "tab_id": tab_id, "name": name, "symbols": symbols.get(tab_id, []),
+                "sort_column": sort_column, "sort_reverse": bool(sort_reverse),
+            })
+        return layout
+
+    def external_changes(self):
+        """上次 load_tabs 之後其他視窗寫入過工作區時回傳 True（本視窗自己的寫入不算）"""
+        with self._db_lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return self._data_version is not None and version != self._data_version
+
+    def has_pending(self):
+        """還有變更尚未寫入；此時重新載入會蓋掉本視窗剛做的修改"""
+        with self._cond:
+            return bool(self._pending) or self._writing
+
+    def load_positions(self):
+        """回傳 [(tab_id, symbol, 股數, 每股成本)]"""
+        with self._db_lock:
+            return self._conn.execute("SELECT tab_id, symbol, shares, cost FROM positions").fetchall()
+
+    def load_quotes(self):
+        """上次的快取報價 {symbol: (timestamp, quote)}，報價標記為 stale"""
+        with self._db_lock:
+            rows = self._conn.execute("SELECT symbol, ts, price, prev_close FROM quotes").fetchall()
+        entries = {}
+        for symbol, timestamp, price, prev_close in rows:
+            quote = make_quote(symbol, price, prev_close)
+            quote['stale'] = True
+            entries[symbol] = (timestamp, quote)
+        return entries
+
+    # ---- 寫入（排入佇列） ----
+
+    def save_layout(self, layout):
+        """layout 為 {side: [(tab_id, 名稱), ...]}，依順序寫入位置"""
+        self._enqueue(("layout",), self._save_layout, layout)
+
+    def set_symbols(self, tab_id, symbols):
+        self._enqueue(("symbols", tab_id), self._set_symbols, tab_id, list(symbols))
+
+    def set_sort(self, tab_id, column, reverse):
+        self._enqueue(("sort", tab_id), self._set_sort, tab_id, column, reverse)
+
+    def set_position(self, tab_id, symbol, shares, cost=0.0):
+        """shares 為 None 或 0 時刪除該筆持股"""
+        self._enqueue(("position", tab_id, symbol), self._set_position, tab_id, symbol, shares, cost)
+
+    def delete_tab(self, tab_id):
+        self._enqueue(("delete", tab_id), self._delete_tab, tab_id)
+
+    def save_quotes(self, entries):
+        self._enqueue(("quotes",), self._save_quotes, entries)
+
+    def _save_layout(self, layout):
+        existing = {row[0] for row in self._conn.execute("SELECT tab_id FROM tabs")}
+        for side, tabs in layout.items():
+            # 讀到過卻已不在資料庫的分頁是被其他視窗刪除的，不寫回來
+            rows = [(tab_id, side, name, position) for position, (tab_id, name) in enumerate(tabs)
+                    if tab_id in existing or tab_id not in self._known_tabs]
+            self._conn.executemany(
+                "INSERT INTO tabs (tab_id, side, name, position) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(tab_id) DO UPDATE SET side = excluded.side, name = excluded.name, "
+                "position = excluded.position", rows)
+            self._known_tabs.update(row[0] for row in rows)
+
+    def _set_symbols(self, tab_id, symbols):
+        theirs = [row[0] for row in self._conn.execute(
+            "SELECT symbol FROM tab_symbols WHERE tab_id = ? ORDER BY position", (tab_id,))]
+        base = self._base.get(tab_id)
+        if base is not None and theirs != base:
+            symbols = merge_symbols(base, symbols, theirs)  # 其他視窗在這之間改過
+        self._conn.execute("DELETE FROM tab_symbols WHERE tab_id = ?", (tab_id,))
+        self._conn.executemany("INSERT OR IGNORE INTO tab_symbols VALUES (?, ?, ?)",
+                               [(tab_id, symbol, position) for position, symbol in enumerate(symbols)])
+        self._base[tab_id] = list(symbols)
+
+    def _set_sort(self, tab_id, column, reverse):
+        self._conn.execute("UPDATE tabs SET sort_column = ?, sort_reverse = ? WHERE tab_id = ?",
+                           (column, int(reverse), tab_id))
+
+    def _set_position(self, tab_id, symbol, shares, cost):
+        if shares:
+            self._conn.execute("INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?)",
+                               (tab_id, symbol, shares, cost or 0.0))
+        else:
+            self._conn.execute("DELETE FROM positions WHERE tab_id = ? AND symbol = ?", (tab_id, symbol))
+
+    def _delete_tab(self, tab_id):
+        self._known_tabs.discard(tab_id)
+        self._base.pop(tab_id, None)
+        self._conn.execute("DELETE FROM positions WHERE tab_id = ?", (tab_id,))
+        self._conn.execute("DELETE FROM tab_symbols WHERE tab_id = ?", (tab_id,))
+        self._conn.execute("DELETE FROM tabs WHERE tab_id = ?", (tab_id,))
+
+    def _save_quotes(self, entries):
+        # 多個視窗共用快照：逐檔保留時間較新的報價，只刪除過舊的，不會抹掉其他視窗的代碼
+        self._conn.executemany(
+            "INSERT INTO quotes VALUES (?, ?, ?, ?) ON CONFLICT(symbol) DO UPDATE SET "
+            "ts = excluded.ts, price = excluded.price, prev_close = excluded.prev_close WHERE excluded.ts > ts",
+            [(symbol, round(timestamp, 1), quote['price'], quote.get('prev_close'))
+             for symbol, (timestamp, quote) in entries.items() if quote.get('price') is not None])
+        self._conn.execute("DELETE FROM quotes WHERE ts < ?", (time.time() - QUOTE_SNAPSHOT_MAX_AGE,))
+
+    # ---- 背景寫入 ----
+
+    def _enqueue(self, key, func, *args):
+        with self._cond:
+            if self._pending.pop(key, None) is not None:
+                self.merged += 1
+            self._pending[key] = (func, args)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                # 等待 debounce 秒收集後續變更，關閉或 flush 時立即寫入
+                self._cond.wait_for(lambda: self._urgent or self._closed, timeout=self.debounce)
+                pending, self._pending = self._pending, OrderedDict()
+                self._urgent = False
+                self._writing = True
+            error = self._write(pending)
+            with self._cond:
+                self._writing = False
+                if error is None:
+                    self.failures = 0
+                    self.write_error = None
+                elif not self._abandoned:
+                    # 整批放回佇列；同一目標在這期間有新變更的以新的為準，並排在舊變更之後
+                    retry = OrderedDict((key, item) for key, item in pending.items() if key not in self._pending)
+                    retry.update(self._pending)
+                    self._pending = retry
+                    self.failures += 1
+                    self.write_error = error
+                    delay = min(WRITE_RETRY_MAX, WRITE_RETRY_DELAY * 2 ** (self.failures - 1))
+                    self._cond.wait_for(lambda: self._abandoned, timeout=delay)
+                self._cond.notify_all()
+
+    def _write(self, pending):
+        """所有變更在同一個交易內完成，失敗時整批回復並回傳錯誤訊息"""
+        base, known_tabs = dict(self._base), set(self._known_tabs)
+        try:
+            with self._db_lock, self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")  # 先取得寫入鎖，合併時讀到的內容不會被其他視窗改掉
+                for func, args in pending.values():
+                    func(*args)
+            self.writes += 1
+            return None
+        except sqlite3.Error as e:
+            self._base, self._known_tabs = base, known_tabs  # 合併基準也要回復，重試時才不會誤判刪除
+            return str(e)
+
+    def flush(self, timeout=None):
+        """立即寫入尚未寫入的變更並等待完成；逾時回傳 False"""
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """寫完變更後關閉；回傳在 timeout 秒內仍無法寫入而放棄的變更數"""
+        lost = 0
+        if not self.flush(timeout):
+            with self._cond:
+                lost = len(self._pending)
+                self._pending.clear()
+                self._abandoned = True
+                self._cond.notify_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._conn.close()
+        return lost
+
+    # ---- 匯入舊格式 ----
+
+    def import_legacy(self, config_file, base_dir="."):
+        """匯入 portfolio_config.json 與各分頁的 txt 檔；舊檔保留不刪除，回傳匯入的分頁數"""
+        config_path = os.path.join(base_dir, config_file)
+        if not os.path.exists(config_path):
+            return 0
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"舊設定匯入失敗：{str(e)}")
+            return 0
+
+        layout = {}
+        count = 0
+        for side in ["left", "right"]:
+            layout[side] = list(config.get(side, {}).items())
+            for tab_id, _ in layout[side]:
+                path = os.path.join(base_dir, tab_id)
+                symbols = []
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        symbols = [line.strip() for line in f if line.strip()]
+                self.set_symbols(tab_id, symbols)
+                count += 1
+        self.save_layout(layout)
+        self._enqueue(("meta", "imported"), self._set_meta, "imported_from", config_file)
+        self.flush()
+        return count
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))